@@ -52,10 +52,18 @@ setup(
     url="https://github.com/ajkxyz/cuda4py",
     download_url="https://github.com/ajkxyz/cuda4py",
     packages=["cuda4py", "cuda4py._impl", "cuda4py._impl.cudnn",
-              "cuda4py.blas", "cuda4py.cudnn", "cuda4py.cufft"],
+              "cuda4py.blas", "cuda4py.cudnn", "cuda4py.cufft",
+              "cuda4py.nvrtc"],
     install_requires=["cffi"],
+    setup_requires=["cffi"],
+    # prebuilt out-of-line ffi modules to skip parsing at runtime
+    cffi_modules=["src/cuda4py/_ffi_build.py:%s" % name for name in (
+        "cuda", "cublas", "cufft", "nvrtc",
+        "cudnn_v2", "cudnn_v4", "cudnn_v5")],
     package_dir={"cuda4py": "src/cuda4py"},
-    keywords=["CUDA", "CUBLAS", "CUDNN", "CUFFT", "cuda4py"],
+    # source of the stub backend compiled on demand
+    package_data={"cuda4py": ["_stub.c"]},
+    keywords=["CUDA", "CUBLAS", "CUDNN", "CUFFT", "NVRTC", "cuda4py"],
     classifiers=[
         "Development Status :: 4 - Beta",
         "Environment :: Console",
@@ -39,6 +39,9 @@ Init module.
 
 from cuda4py import _cffi
 from cuda4py._cffi import (initialize,
+                           enable_stats,
+                           stats,
+                           reset_stats,
 
                            CU_CTX_SCHED_AUTO,
                            CU_CTX_SCHED_SPIN,
@@ -51,10 +54,45 @@ from cuda4py._cffi import (initialize,
                            CU_MEMHOSTALLOC_DEVICEMAP,
                            CU_MEMHOSTALLOC_WRITECOMBINED,
 
+                           CU_MEMHOSTREGISTER_PORTABLE,
+                           CU_MEMHOSTREGISTER_DEVICEMAP,
+                           CU_MEMHOSTREGISTER_IOMEMORY,
+                           CU_MEMHOSTREGISTER_READ_ONLY,
+
                            CU_MEM_ATTACH_GLOBAL,
                            CU_MEM_ATTACH_HOST,
                            CU_MEM_ATTACH_SINGLE,
 
+                           CU_STREAM_DEFAULT,
+                           CU_STREAM_NON_BLOCKING,
+
+                           CU_EVENT_DEFAULT,
+                           CU_EVENT_BLOCKING_SYNC,
+                           CU_EVENT_DISABLE_TIMING,
+                           CU_EVENT_INTERPROCESS,
+
+                           CU_DEVICE_P2P_ATTRIBUTE_PERFORMANCE_RANK,
+                           CU_DEVICE_P2P_ATTRIBUTE_ACCESS_SUPPORTED,
+                           CU_DEVICE_P2P_ATTRIBUTE_NATIVE_ATOMIC_SUPPORTED,
+                           CU_DEVICE_P2P_ATTRIBUTE_CUDA_ARRAY_ACCESS_SUPPORTED,
+
+                           CU_STREAM_CAPTURE_MODE_GLOBAL,
+                           CU_STREAM_CAPTURE_MODE_THREAD_LOCAL,
+                           CU_STREAM_CAPTURE_MODE_RELAXED,
+
+                           CU_STREAM_CAPTURE_STATUS_NONE,
+                           CU_STREAM_CAPTURE_STATUS_ACTIVE,
+                           CU_STREAM_CAPTURE_STATUS_INVALIDATED,
+
+                           CU_GRAPH_NODE_TYPE_KERNEL,
+                           CU_GRAPH_NODE_TYPE_MEMCPY,
+                           CU_GRAPH_NODE_TYPE_MEMSET,
+                           CU_GRAPH_NODE_TYPE_HOST,
+                           CU_GRAPH_NODE_TYPE_GRAPH,
+                           CU_GRAPH_NODE_TYPE_EMPTY,
+
+                           CUDA_GRAPH_INSTANTIATE_FLAG_AUTO_FREE_ON_LAUNCH,
+
                            CUDA_SUCCESS,
                            CUDA_ERROR_INVALID_VALUE,
                            CUDA_ERROR_OUT_OF_MEMORY,
@@ -118,15 +156,31 @@ from cuda4py._py import (CUDARuntimeError,
                          CU,
                          Memory,
                          MemAlloc,
+                         PooledMemAlloc,
+                         MemoryPool,
                          MemAllocManaged,
                          MemHostAlloc,
+                         PooledMemHostAlloc,
+                         HostMemoryPool,
+                         HostRegistered,
+                         Stream,
+                         Event,
+                         Graph,
+                         GraphExec,
                          skip,
                          Function,
+                         PreparedFunction,
+                         LaunchBatch,
                          Module,
                          Context,
                          Device,
                          Devices)
 
+from cuda4py._cache import CompilationCache
+from cuda4py._transfer import TransferEngine
+from cuda4py._array import DeviceArray
+from cuda4py._scheduler import MultiDeviceScheduler, DeviceWorker
+
 
 def get_ffi():
     """Returns CFFI() instance for the loaded shared library.
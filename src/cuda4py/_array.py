@@ -0,0 +1,439 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+Typed n-dimensional arrays in the device memory.
+"""
+from cuda4py._py import CU, MemAllocManaged, MemHostAlloc, MemPtr
+
+
+class DeviceArray(object):
+    """N-dimensional array of the fixed dtype in the device memory.
+
+    Converts to int as the address of the first element,
+    so it can be passed directly to Function, CUBLAS, CUFFT etc.
+
+    Attributes:
+        mem: Memory instance holding the data.
+        offset: offset of the first element from mem base in bytes.
+        shape: tuple of dimensions.
+        dtype: numpy dtype.
+        strides: tuple of steps in bytes for each dimension.
+    """
+    def __init__(self, context, shape, dtype=None, strides=None,
+                 mem=None, offset=0):
+        """Allocates new array or wraps the existing memory.
+
+        Parameters:
+            context: Context instance.
+            shape: tuple of dimensions (or int).
+            dtype: numpy dtype (defaults to numpy.float32).
+            strides: steps in bytes for each dimension
+                     (defaults to C-contiguous).
+            mem: Memory instance to use (None - allocate new one
+                 with context.mem_alloc()).
+            offset: offset of the first element from mem base in bytes.
+        """
+        import numpy
+        self._context = context
+        self._dtype = numpy.dtype(numpy.float32 if dtype is None else dtype)
+        if not hasattr(shape, "__len__"):
+            shape = (shape,)
+        self._shape = tuple(int(x) for x in shape)
+        if strides is None:
+            strides = DeviceArray.c_strides(self._shape, self._dtype.itemsize)
+        elif len(strides) != len(self._shape):
+            raise ValueError("strides should have the same length as shape")
+        self._strides = tuple(int(x) for x in strides)
+        if any(x < 0 for x in self._strides):
+            raise ValueError("Negative strides are not supported")
+        if mem is None:
+            mem = context.mem_alloc(max(self.nbytes, 1))
+        self._mem = mem
+        self._offset = int(offset)
+
+    @staticmethod
+    def c_strides(shape, itemsize):
+        """Returns strides of C-contiguous array.
+        """
+        strides = []
+        step = itemsize
+        for n in reversed(shape):
+            strides.append(step)
+            step *= n
+        return tuple(reversed(strides))
+
+    @staticmethod
+    def from_cuda_array_interface(context, obj):
+        """Wraps object exporting __cuda_array_interface__ without copying.
+
+        The returned array holds the reference to obj.
+
+        Parameters:
+            context: Context the memory belongs to.
+            obj: object with __cuda_array_interface__ attribute
+                 (or the interface dictionary itself).
+        """
+        import numpy
+        interface = getattr(obj, "__cuda_array_interface__", obj)
+        if interface.get("mask") is not None:
+            raise ValueError("Masked arrays are not supported")
+        dtype = numpy.dtype(interface["typestr"])
+        shape = tuple(interface["shape"])
+        strides = interface.get("strides")
+        if strides is None:
+            strides = DeviceArray.c_strides(shape, dtype.itemsize)
+        stream = interface.get("stream")
+        if stream is not None:
+            # the producer may have pending work on the stream
+            err = context._lib.cuStreamSynchronize(stream)
+            if err:
+                raise CU.error("cuStreamSynchronize", err)
+        ptr = interface["data"][0]
+        mem = MemPtr(context, ptr or 0, owner=obj, size=DeviceArray.span(
+            shape, strides, dtype.itemsize))
+        return DeviceArray(context, shape, dtype, strides, mem)
+
+    @staticmethod
+    def from_dlpack(context, obj):
+        """Wraps DLPack tensor without copying.
+
+        Parameters:
+            context: Context the memory belongs to.
+            obj: object with __dlpack__ method or "dltensor" PyCapsule.
+        """
+        from cuda4py import _dlpack
+        capsule = obj.__dlpack__() if hasattr(obj, "__dlpack__") else obj
+        ptr, shape, strides, dtype, device_type, device_id, owner = \
+            _dlpack.from_dlpack(capsule)
+        if device_type not in (_dlpack.kDLCUDA, _dlpack.kDLCUDAHost,
+                               _dlpack.kDLCUDAManaged):
+            raise ValueError("DLPack device type %d is not supported" %
+                             device_type)
+        if (device_type != _dlpack.kDLCUDAHost and
+                device_id != int(context.device)):
+            raise ValueError(
+                "DLPack tensor is on the device %d, context is on %d" %
+                (device_id, int(context.device)))
+        if strides is None:
+            strides = DeviceArray.c_strides(shape, dtype.itemsize)
+        mem = MemPtr(context, ptr, owner=owner, size=DeviceArray.span(
+            shape, strides, dtype.itemsize))
+        return DeviceArray(context, shape, dtype, strides, mem)
+
+    @staticmethod
+    def from_host(context, array, stream=None):
+        """Creates new array with the copy of the host array.
+        """
+        import numpy
+        array = numpy.asarray(array)
+        arr = DeviceArray(context, array.shape, array.dtype)
+        arr.set(array, stream)
+        return arr
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def mem(self):
+        return self._mem
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def strides(self):
+        return self._strides
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    @property
+    def itemsize(self):
+        return self._dtype.itemsize
+
+    @property
+    def size(self):
+        """Number of elements.
+        """
+        size = 1
+        for n in self._shape:
+            size *= n
+        return size
+
+    @property
+    def nbytes(self):
+        return self.size * self.itemsize
+
+    @property
+    def handle(self):
+        """Address of the first element (int).
+        """
+        return int(self._mem) + self._offset
+
+    def __int__(self):
+        return self.handle
+
+    @property
+    def __cuda_array_interface__(self):
+        return {"shape": self._shape, "typestr": self._dtype.str,
+                "data": (self.handle, False), "version": 3,
+                "strides": None if self.is_contiguous else self._strides}
+
+    def __dlpack_device__(self):
+        from cuda4py import _dlpack
+        if isinstance(self._mem, MemHostAlloc):
+            return _dlpack.kDLCUDAHost, 0
+        if isinstance(self._mem, MemAllocManaged):
+            return _dlpack.kDLCUDAManaged, int(self.context.device)
+        return _dlpack.kDLCUDA, int(self.context.device)
+
+    def __dlpack__(self, stream=None):
+        """Returns "dltensor" PyCapsule referencing this array.
+
+        Parameters:
+            stream: consumer's stream, if set, the context is synchronized
+                    as the work submitted to the array is not tracked.
+        """
+        from cuda4py import _dlpack
+        if stream is not None and stream != -1:
+            self.context.synchronize()
+        device_type, device_id = self.__dlpack_device__()
+        return _dlpack.to_dlpack(self.handle, self._shape, self._strides,
+                                 self._dtype, device_type, device_id, self)
+
+    def __len__(self):
+        if not self._shape:
+            raise TypeError("len() of unsized object")
+        return self._shape[0]
+
+    @property
+    def is_contiguous(self):
+        """True if the array is C-contiguous.
+        """
+        return self.size == 0 or all(
+            n == 1 or s == c for n, s, c in zip(
+                self._shape, self._strides,
+                DeviceArray.c_strides(self._shape, self.itemsize)))
+
+    def __getitem__(self, index):
+        """Returns view of the array (basic slicing only).
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        n_ellipsis = sum(1 for x in index if x is Ellipsis)
+        if n_ellipsis > 1:
+            raise IndexError("Only one ellipsis is allowed")
+        n_dims = len(index) - n_ellipsis
+        if n_dims > self.ndim:
+            raise IndexError("Too many indices")
+        if n_ellipsis:
+            i = index.index(Ellipsis)
+            index = (index[:i] + (slice(None),) * (self.ndim - n_dims) +
+                     index[i + 1:])
+        else:
+            index += (slice(None),) * (self.ndim - n_dims)
+        offset = self._offset
+        shape = []
+        strides = []
+        for x, n, s in zip(index, self._shape, self._strides):
+            if isinstance(x, slice):
+                start, stop, step = x.indices(n)
+                if step < 0:
+                    raise IndexError("Negative steps are not supported")
+                shape.append(max(0, (stop - start + step - 1) // step))
+                strides.append(s * step)
+                offset += start * s
+                continue
+            try:
+                i = int(x)
+            except TypeError:
+                raise IndexError("Only integers, slices and ellipsis "
+                                 "are supported as indices")
+            if i < 0:
+                i += n
+            if i < 0 or i >= n:
+                raise IndexError("Index %d is out of bounds for size %d" %
+                                 (int(x), n))
+            offset += i * s
+        return DeviceArray(self.context, shape, self.dtype, strides,
+                           self._mem, offset)
+
+    def _geometry(self):
+        """Describes the array as 3D region for memcpy_3d_async.
+
+        Returns:
+            (width_in_bytes, height, depth, pitch, slice_height)
+            or None if the layout can not be expressed in that way.
+        """
+        dims = [(n, s) for n, s in zip(self._shape, self._strides) if n != 1]
+        if dims and dims[-1][1] == self.itemsize:
+            width = dims[-1][0] * self.itemsize
+            dims = dims[:-1]
+        else:
+            width = self.itemsize
+        if len(dims) > 2:
+            return None
+        dims = [(1, 0)] * (2 - len(dims)) + dims
+        (depth, slice_pitch), (height, pitch) = dims
+        if height == 1:
+            pitch = width
+        if depth == 1:
+            slice_pitch = pitch * height
+        if pitch < width or slice_pitch % pitch or \
+                slice_pitch // pitch < height:
+            return None
+        return width, height, depth, pitch, slice_pitch // pitch
+
+    @staticmethod
+    def span(shape, strides, itemsize):
+        """Returns number of bytes from the first to the last element.
+        """
+        if any(n == 0 for n in shape):
+            return 0
+        return sum((n - 1) * s for n, s in zip(shape, strides)) + itemsize
+
+    def _span(self):
+        return DeviceArray.span(self._shape, self._strides, self.itemsize)
+
+    def _check_host(self, array):
+        if tuple(array.shape) != self._shape:
+            raise ValueError("Shape mismatch: %s vs %s" %
+                             (array.shape, self._shape))
+        if array.dtype != self._dtype:
+            raise ValueError("dtype mismatch: %s vs %s" %
+                             (array.dtype, self._dtype))
+        if not array.flags["C_CONTIGUOUS"]:
+            raise ValueError("Host array should be C-contiguous")
+
+    def get(self, out=None, stream=None):
+        """Copies the array to the host.
+
+        Parameters:
+            out: C-contiguous numpy array to copy to
+                 (None - allocate new one).
+            stream: compute stream (Stream instance or it's handle),
+                    if not None, the copy is asynchronous when possible
+                    and the caller should synchronize before accessing
+                    out (it should be page-locked to be truly async).
+
+        Returns:
+            out.
+        """
+        import numpy
+        if out is None:
+            out = numpy.empty(self._shape, self._dtype)
+        self._check_host(out)
+        if self.size == 0:
+            return out
+        if self.is_contiguous:
+            if stream is None:
+                self._mem.to_host(out, self._offset, self.nbytes)
+            else:
+                self._mem.to_host_async(out, self._offset, self.nbytes,
+                                        stream)
+            return out
+        geometry = self._geometry()
+        if geometry is not None:
+            width, height, depth, pitch, slice_height = geometry
+            self._mem.memcpy_3d_async(
+                (0, 0, 0), (0, 0, 0), (width, height, depth),
+                pitch, slice_height, width, height,
+                src=self.handle, dst=out, stream=stream)
+            if stream is None:
+                self.context.synchronize()
+            return out
+        # generic layout: copy the whole span and extract on the host
+        if stream is not None:
+            self.context.synchronize()
+        span = numpy.empty(self._span(), numpy.uint8)
+        self._mem.to_host(span, self._offset, span.nbytes)
+        out[...] = numpy.ndarray(self._shape, self._dtype, span, 0,
+                                 self._strides)
+        return out
+
+    def set(self, array, stream=None):
+        """Copies the host array to this array.
+
+        Parameters:
+            array: numpy array of the same shape and dtype.
+            stream: compute stream (Stream instance or it's handle),
+                    if not None, the copy is asynchronous when possible
+                    and array must not be modified until it completes.
+        """
+        import numpy
+        array = numpy.asarray(array)
+        if not array.flags["C_CONTIGUOUS"]:
+            array = array.copy()
+        self._check_host(array)
+        if self.size == 0:
+            return
+        if self.is_contiguous:
+            if stream is None:
+                self._mem.to_device(array, self._offset, self.nbytes)
+            else:
+                self._mem.to_device_async(array, self._offset, self.nbytes,
+                                          stream)
+            return
+        geometry = self._geometry()
+        if geometry is not None:
+            width, height, depth, pitch, slice_height = geometry
+            self._mem.memcpy_3d_async(
+                (0, 0, 0), (0, 0, 0), (width, height, depth),
+                width, height, pitch, slice_height,
+                src=array, dst=self.handle, stream=stream)
+            if stream is None:
+                self.context.synchronize()
+            return
+        # generic layout: read-modify-write of the whole span
+        if stream is not None:
+            self.context.synchronize()
+        span = numpy.empty(self._span(), numpy.uint8)
+        self._mem.to_host(span, self._offset, span.nbytes)
+        numpy.ndarray(self._shape, self._dtype, span, 0,
+                      self._strides)[...] = array
+        self._mem.to_device(span, self._offset, span.nbytes)
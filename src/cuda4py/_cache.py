@@ -0,0 +1,251 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+"""
+Persistent cache of the compiled modules.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+
+#: Matches #include directives
+INCLUDE_RE = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+
+
+class CompilationCache(object):
+    """Content-addressed disk cache of PTX/cubin produced by the compiler.
+
+    Entries are keyed by the hash of the source text, the text of the
+    included headers found in the source directory and include_dirs,
+    compiler options, compiler version and compute capability.
+    Entries are written to a temporary file and atomically renamed,
+    so the cache directory can be shared by many processes.
+    Least recently used entries are removed when the total size
+    exceeds max_size.
+
+    Attributes:
+        path: cache directory.
+        max_size: maximum total size of the cache in bytes.
+    """
+    SUFFIX = ".bin"
+
+    _fingerprints = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path=None, max_size=256 * 1024 * 1024):
+        """Initializes the cache.
+
+        Parameters:
+            path: cache directory (defaults to CUDA4PY_CACHE_DIR environment
+                  variable or ~/.cache/cuda4py).
+            max_size: maximum total size of the cache in bytes.
+        """
+        if path is None:
+            path = os.environ.get("CUDA4PY_CACHE_DIR")
+            if not path:
+                path = os.path.join(os.path.expanduser("~"),
+                                    ".cache", "cuda4py")
+        self.path = path
+        self.max_size = max_size
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+    @staticmethod
+    def compiler_fingerprint(nvcc_path):
+        """Returns string identifying the version of the compiler executable
+        (resolved path, size and modification time, so nvcc is not run).
+        """
+        with CompilationCache._lock:
+            fingerprint = CompilationCache._fingerprints.get(nvcc_path)
+        if fingerprint is not None:
+            return fingerprint
+        if os.path.dirname(nvcc_path):
+            candidates = [nvcc_path]
+        else:
+            candidates = [os.path.join(dirnme, nvcc_path)
+                          for dirnme in os.environ.get(
+                              "PATH", "").split(os.pathsep) if dirnme]
+        exts = [""] + os.environ.get("PATHEXT", "").split(os.pathsep)
+        fingerprint = nvcc_path
+        for candidate in candidates:
+            for ext in exts:
+                fnme = candidate + ext
+                if os.path.isfile(fnme):
+                    fnme = os.path.realpath(fnme)
+                    st = os.stat(fnme)
+                    fingerprint = "%s:%d:%d" % (fnme, st.st_size,
+                                                int(st.st_mtime))
+                    break
+            else:
+                continue
+            break
+        with CompilationCache._lock:
+            CompilationCache._fingerprints[nvcc_path] = fingerprint
+        return fingerprint
+
+    @staticmethod
+    def _hash_includes(h, text, dirs, seen):
+        for nme in INCLUDE_RE.findall(text):
+            for dirnme in dirs:
+                fnme = os.path.join(dirnme, nme)
+                if not os.path.isfile(fnme):
+                    continue
+                fnme = os.path.realpath(fnme)
+                if fnme in seen:
+                    break
+                seen.add(fnme)
+                with open(fnme, "rb") as fin:
+                    data = fin.read()
+                h.update(fnme.encode("utf-8"))
+                h.update(data)
+                CompilationCache._hash_includes(
+                    h, data.decode("utf-8", "replace"),
+                    [os.path.dirname(fnme)] + dirs, seen)
+                break
+
+    def make_key(self, source, source_file, options, include_dirs,
+                 compute_capability, compiler):
+        """Returns the key for the compilation.
+
+        Parameters:
+            source: kernel source code (or None if source_file is given).
+            source_file: path to the file with kernel code.
+            options: sequence of the compiler options.
+            include_dirs: include directories.
+            compute_capability: tuple (major, minor).
+            compiler: string identifying the compiler and it's version.
+        """
+        if source is None:
+            with open(source_file, "rb") as fin:
+                source = fin.read().decode("utf-8")
+            dirs = [os.path.dirname(os.path.realpath(source_file))]
+        else:
+            dirs = []
+        h = hashlib.sha256()
+        h.update(source.encode("utf-8"))
+        for value in (tuple(options), tuple(include_dirs),
+                      tuple(compute_capability), compiler):
+            h.update(b"\0")
+            h.update(repr(value).encode("utf-8"))
+        dirs.extend(dirnme for dirnme in include_dirs if len(dirnme))
+        CompilationCache._hash_includes(h, source, dirs, set())
+        return h.hexdigest()
+
+    def _fnme(self, key):
+        return os.path.join(self.path, key + CompilationCache.SUFFIX)
+
+    def get(self, key):
+        """Returns cached bytes for the key or None.
+        """
+        fnme = self._fnme(key)
+        try:
+            with open(fnme, "rb") as fin:
+                data = fin.read()
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(fnme, None)  # for LRU eviction
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Stores bytes for the key.
+        """
+        fout, tmp = tempfile.mkstemp(".tmp", key, self.path)
+        try:
+            os.write(fout, data)
+        finally:
+            os.close(fout)
+        try:
+            getattr(os, "replace", os.rename)(tmp, self._fnme(key))
+        except OSError:
+            # another process has already stored the same key
+            os.unlink(tmp)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            fnmes = os.listdir(self.path)
+        except OSError:
+            return entries
+        for fnme in fnmes:
+            if not fnme.endswith(CompilationCache.SUFFIX):
+                continue
+            fnme = os.path.join(self.path, fnme)
+            try:
+                st = os.stat(fnme)
+            except OSError:  # removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, fnme))
+        return entries
+
+    @property
+    def size(self):
+        """Total size of the cached entries in bytes.
+        """
+        return sum(entry[1] for entry in self._entries())
+
+    def evict(self, max_size=None):
+        """Removes least recently used entries
+        until total size is not greater than max_size.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = self._entries()
+        total = sum(entry[1] for entry in entries)
+        if total <= max_size:
+            return
+        entries.sort()
+        for _mtime, size, fnme in entries:
+            if total <= max_size:
+                break
+            try:
+                os.unlink(fnme)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Removes all entries.
+        """
+        self.evict(0)
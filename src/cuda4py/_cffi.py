@@ -37,7 +37,12 @@ Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
 cffi bindings.
 """
 import cffi
+import importlib
+import os
+import re
+import sys
 import threading
+import time
 
 
 #: ffi parser
@@ -52,6 +57,338 @@ lib = None
 lock = threading.Lock()
 
 
+#: Whether to use the prebuilt out-of-line ffi modules when available
+use_prebuilt = True
+
+
+#: Whether the loaded libraries are wrapped with InstrumentedLib
+#: (see enable_stats())
+instrument = os.environ.get("CUDA4PY_STATS", "0") not in ("", "0")
+
+
+def prebuilt_ffi(name):
+    """Returns ffi of the prebuilt out-of-line ABI mode module
+    (see _ffi_build.py) or None if it is not available,
+    so C definitions should be parsed at runtime.
+
+    Parameters:
+        name: full name of the module, e.g. "cuda4py._cuda_ffi".
+    """
+    if not use_prebuilt:
+        return None
+    try:
+        return importlib.import_module(name).ffi
+    except ImportError:
+        return None
+
+
+def stub_backend():
+    """Returns path to the stub backend shared library, which implements
+    the bound functions of all libraries over host memory
+    (see _stub.c), compiling it on first use if necessary.
+    """
+    try:
+        return importlib.import_module("cuda4py._stub").__file__
+    except ImportError:
+        from cuda4py import _ffi_build
+        return _ffi_build.build_stub()
+
+
+def stub_enabled():
+    """Returns True if the stub backend is selected
+    with CUDA4PY_STUB environment variable.
+    """
+    return os.environ.get("CUDA4PY_STUB", "0") not in ("", "0")
+
+
+def get_backends(backends):
+    """Returns the shared libraries to try loading: the stub backend
+    if CUDA4PY_STUB environment variable is set to nonzero value,
+    backends otherwise.
+    """
+    if stub_enabled():
+        return (stub_backend(),)
+    return backends
+
+
+class LazyLib(object):
+    """Proxy to the loaded shared library, which parses C definitions
+    of the functions on the first access to them.
+
+    Definitions should contain function declarations only,
+    types should be already defined in ffi.
+    """
+    #: Matches function names in the declarations
+    FUNC_NAME = re.compile(r"(\w+)\s*\(")
+
+    def __init__(self, ffi, lib, srcs):
+        """Constructor.
+
+        Parameters:
+            ffi: cffi.FFI() the library was loaded with.
+            lib: loaded shared library.
+            srcs: iterable of C definitions to parse on demand.
+        """
+        self._ffi = ffi
+        self._lib = lib
+        self._lock = threading.Lock()
+        self._pending = {}
+        for src in srcs:
+            for name in LazyLib.FUNC_NAME.findall(src):
+                self._pending[name] = src
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        with self._lock:
+            src = self._pending.get(name)
+            if src is not None:
+                self._ffi.cdef(src)
+                for key in LazyLib.FUNC_NAME.findall(src):
+                    self._pending.pop(key, None)
+        value = getattr(self._lib, name)
+        setattr(self, name, value)  # next access will skip __getattr__
+        return value
+
+
+#: Timer for the instrumentation
+timer = getattr(time, "perf_counter", time.time)
+
+
+#: Number of buckets in the latency histograms,
+#: bucket i counts calls which took less than 2 ** i nanoseconds
+HISTOGRAM_SIZE = 40
+
+
+#: Functions returning the number of transferred bytes
+#: from the arguments of the memory copy entry points
+TRANSFER_SIZE = {
+    "cuMemcpyDtoH_v2": lambda args: args[2],
+    "cuMemcpyHtoD_v2": lambda args: args[2],
+    "cuMemcpyDtoHAsync_v2": lambda args: args[2],
+    "cuMemcpyHtoDAsync_v2": lambda args: args[2],
+    "cuMemcpyDtoDAsync_v2": lambda args: args[2],
+    "cuMemcpyPeerAsync": lambda args: args[4],
+    "cuMemcpy3DAsync_v2": lambda args: (args[0].WidthInBytes *
+                                        max(args[0].Height, 1) *
+                                        max(args[0].Depth, 1)),
+}
+
+
+#: Bindings modules holding the loaded libraries (see enable_stats())
+BINDINGS = ("cuda4py._cffi", "cuda4py.blas._cublas",
+            "cuda4py.cufft._cufft", "cuda4py.nvrtc._nvrtc",
+            "cuda4py._impl.cudnn._cffi")
+
+
+class ApiStats(object):
+    """Statistics of the single entry point.
+
+    Attributes:
+        calls: number of calls.
+        bytes: number of transferred bytes (memory copies only).
+        time: total wall time of the calls in seconds.
+        histogram: list of HISTOGRAM_SIZE counters of the calls
+                   by their duration (see HISTOGRAM_SIZE).
+    """
+    __slots__ = ("calls", "bytes", "time", "histogram")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.bytes = 0
+        self.time = 0.0
+        self.histogram = [0] * HISTOGRAM_SIZE
+
+    def add(self, other):
+        """Adds the counters of other ApiStats to this one.
+        """
+        self.calls += other.calls
+        self.bytes += other.bytes
+        self.time += other.time
+        self.histogram = [a + b for a, b in
+                          zip(self.histogram, other.histogram)]
+
+
+#: Statistics of the instrumented entry points collected by the running
+#: threads: id of ThreadStats => dictionary name => ApiStats,
+#: each thread updates only it's own dictionary, so the calls do not
+#: contend for stats_lock
+api_stats = {}
+
+
+#: Statistics collected by the finished threads: name => ApiStats
+retired_stats = {}
+
+
+#: Lock for api_stats, retired_stats and the insertions into
+#: the dictionaries of api_stats (reentrant, as ThreadStats
+#: can be collected while it is held)
+stats_lock = threading.RLock()
+
+
+#: Holds ThreadStats of the current thread
+thread_stats = threading.local()
+
+
+class ThreadStats(object):
+    """Statistics of the single thread registered in api_stats,
+    merged into retired_stats when the thread finishes
+    and it's thread local storage is released.
+
+    Attributes:
+        api_stats: dictionary name => ApiStats.
+    """
+    def __init__(self):
+        self.api_stats = {}
+        with stats_lock:
+            api_stats[id(self)] = self.api_stats
+
+    def __del__(self):
+        if stats_lock is None:  # interpreter shutdown
+            return
+        with stats_lock:
+            api_stats.pop(id(self), None)
+            for name, s in self.api_stats.items():
+                retired = retired_stats.get(name)
+                if retired is None:
+                    retired = retired_stats[name] = ApiStats()
+                retired.add(s)
+
+
+def _get_stats(name):
+    """Returns ApiStats of the entry point for the current thread.
+    """
+    with stats_lock:
+        holder = getattr(thread_stats, "holder", None)
+        if holder is None:
+            holder = thread_stats.holder = ThreadStats()
+            thread_stats.api_stats = holder.api_stats
+        stats = holder.api_stats.get(name)
+        if stats is None:
+            stats = holder.api_stats[name] = ApiStats()
+    return stats
+
+
+def _instrument(name, func):
+    """Returns func wrapped to update api_stats on every call.
+    """
+    transfer_size = TRANSFER_SIZE.get(name)
+    last = HISTOGRAM_SIZE - 1
+
+    def wrapper(*args):
+        t0 = timer()
+        try:
+            return func(*args)
+        finally:
+            dt = timer() - t0
+            bucket = min(int(dt * 1.0e9).bit_length(), last)
+            try:
+                stats = thread_stats.api_stats[name]
+            except (AttributeError, KeyError):
+                stats = _get_stats(name)
+            stats.calls += 1
+            stats.time += dt
+            stats.histogram[bucket] += 1
+            if transfer_size is not None:
+                stats.bytes += transfer_size(args)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+class InstrumentedLib(object):
+    """Proxy to the loaded shared library, which counts calls,
+    transferred bytes and wall time of the functions (see stats()).
+    """
+    def __init__(self, lib):
+        """Constructor.
+
+        Parameters:
+            lib: loaded shared library (or LazyLib).
+        """
+        self._lib = lib
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        value = getattr(self._lib, name)
+        if callable(value):
+            value = _instrument(name, value)
+        setattr(self, name, value)  # next access will skip __getattr__
+        return value
+
+
+def instrumented(lib):
+    """Returns lib wrapped with InstrumentedLib if instrumentation
+    is enabled, the original library otherwise.
+
+    Parameters:
+        lib: loaded shared library or InstrumentedLib.
+    """
+    if isinstance(lib, InstrumentedLib):
+        lib = lib._lib
+    return InstrumentedLib(lib) if instrument else lib
+
+
+def enable_stats(enable=True):
+    """Enables or disables instrumentation of the loaded libraries
+    (and of the libraries being loaded later).
+
+    Objects hold the library they were created with,
+    so only the objects created after the call are affected,
+    to instrument all of them, call this function before creating
+    any objects or set CUDA4PY_STATS environment variable to 1.
+    When disabled, the original libraries are used, so there is no
+    overhead.
+    """
+    global instrument
+    with lock:
+        instrument = bool(enable)
+        for name in BINDINGS:
+            module = sys.modules.get(name)
+            if module is not None and module.lib is not None:
+                module.lib = instrumented(module.lib)
+
+
+def stats():
+    """Returns the snapshot of the instrumentation statistics
+    of the called entry points (see enable_stats()).
+
+    Returns:
+        Dictionary: name => {"calls": number of calls,
+                             "bytes": number of transferred bytes,
+                             "time": total wall time in seconds,
+                             "histogram": {upper bound in nanoseconds:
+                                           number of calls}}.
+    """
+    totals = {}
+    with stats_lock:
+        for per_thread in [retired_stats] + list(api_stats.values()):
+            for name, s in per_thread.items():
+                total = totals.get(name)
+                if total is None:
+                    total = totals[name] = ApiStats()
+                total.add(s)
+    return dict(
+        (name, {"calls": s.calls, "bytes": s.bytes, "time": s.time,
+                "histogram": dict((1 << i, n) for i, n in
+                                  enumerate(s.histogram) if n)})
+        for name, s in totals.items() if s.calls)
+
+
+def reset_stats():
+    """Resets the instrumentation statistics.
+    """
+    with stats_lock:
+        retired_stats.clear()
+        for per_thread in api_stats.values():
+            for s in per_thread.values():
+                s.reset()
+
+
 #: Error codes
 CUDA_SUCCESS = 0
 CUDA_ERROR_INVALID_VALUE = 1
@@ -223,11 +560,28 @@ CU_MEMHOSTALLOC_PORTABLE = 0x01
 CU_MEMHOSTALLOC_DEVICEMAP = 0x02
 CU_MEMHOSTALLOC_WRITECOMBINED = 0x04
 
+CU_MEMHOSTREGISTER_PORTABLE = 0x01
+CU_MEMHOSTREGISTER_DEVICEMAP = 0x02
+CU_MEMHOSTREGISTER_IOMEMORY = 0x04
+CU_MEMHOSTREGISTER_READ_ONLY = 0x08
+
 CU_MEM_ATTACH_GLOBAL = 0x1
 CU_MEM_ATTACH_HOST = 0x2
 CU_MEM_ATTACH_SINGLE = 0x4
 
 
+#: CUstream_flags
+CU_STREAM_DEFAULT = 0x0
+CU_STREAM_NON_BLOCKING = 0x1
+
+
+#: CUevent_flags
+CU_EVENT_DEFAULT = 0x0
+CU_EVENT_BLOCKING_SYNC = 0x1
+CU_EVENT_DISABLE_TIMING = 0x2
+CU_EVENT_INTERPROCESS = 0x4
+
+
 #: CUmemorytype
 CU_MEMORYTYPE_HOST = 0x01
 CU_MEMORYTYPE_DEVICE = 0x02
@@ -235,161 +589,306 @@ CU_MEMORYTYPE_ARRAY = 0x03
 CU_MEMORYTYPE_UNIFIED = 0x04
 
 
-def _initialize(backends):
-    global lib
-    if lib is not None:
-        return
-    # C function definitions (http://docs.nvidia.com/cuda/cuda-driver-api/)
-    # size_t instead of void* is used
-    # for convinience with python calls and numpy arrays.
-    src = """
-    typedef int CUresult;
-    typedef int CUdevice;
-    typedef size_t CUcontext;
-    typedef size_t CUmodule;
-    typedef size_t CUfunction;
-    typedef size_t CUstream;
-    typedef size_t CUdeviceptr;
-    typedef int CUdevice_attribute;
-    typedef size_t (*CUoccupancyB2DSize)(int blockSize);
-    typedef int CUmemorytype;
-    typedef size_t CUarray;
-
-    typedef struct CUDA_MEMCPY3D_st {
-        size_t srcXInBytes;
-        size_t srcY;
-        size_t srcZ;
-        size_t srcLOD;
-        CUmemorytype srcMemoryType;
-        size_t srcHost;
-        CUdeviceptr srcDevice;
-        CUarray srcArray;
-        void *reserved0;
-        size_t srcPitch;
-        size_t srcHeight;
-
-        size_t dstXInBytes;
-        size_t dstY;
-        size_t dstZ;
-        size_t dstLOD;
-        CUmemorytype dstMemoryType;
-        size_t dstHost;
-        CUdeviceptr dstDevice;
-        CUarray dstArray;
-        void *reserved1;
-        size_t dstPitch;
-        size_t dstHeight;
-
-        size_t WidthInBytes;
-        size_t Height;
-        size_t Depth;
-    } CUDA_MEMCPY3D;
-
-    CUresult cuInit(unsigned int Flags);
-
-    CUresult cuDeviceGetCount(int *count);
-    CUresult cuDeviceGet(CUdevice *device,
-                         int ordinal);
-    CUresult cuDeviceGetAttribute(int *pi,
-                                  CUdevice_attribute attrib,
-                                  CUdevice dev);
-    CUresult cuDeviceGetName(char *name,
+#: CUdevice_P2PAttribute
+CU_DEVICE_P2P_ATTRIBUTE_PERFORMANCE_RANK = 0x01
+CU_DEVICE_P2P_ATTRIBUTE_ACCESS_SUPPORTED = 0x02
+CU_DEVICE_P2P_ATTRIBUTE_NATIVE_ATOMIC_SUPPORTED = 0x03
+CU_DEVICE_P2P_ATTRIBUTE_CUDA_ARRAY_ACCESS_SUPPORTED = 0x04
+
+
+#: CUstreamCaptureMode
+CU_STREAM_CAPTURE_MODE_GLOBAL = 0
+CU_STREAM_CAPTURE_MODE_THREAD_LOCAL = 1
+CU_STREAM_CAPTURE_MODE_RELAXED = 2
+
+
+#: CUstreamCaptureStatus
+CU_STREAM_CAPTURE_STATUS_NONE = 0
+CU_STREAM_CAPTURE_STATUS_ACTIVE = 1
+CU_STREAM_CAPTURE_STATUS_INVALIDATED = 2
+
+
+#: CUgraphNodeType
+CU_GRAPH_NODE_TYPE_KERNEL = 0
+CU_GRAPH_NODE_TYPE_MEMCPY = 1
+CU_GRAPH_NODE_TYPE_MEMSET = 2
+CU_GRAPH_NODE_TYPE_HOST = 3
+CU_GRAPH_NODE_TYPE_GRAPH = 4
+CU_GRAPH_NODE_TYPE_EMPTY = 5
+
+
+#: CUgraphInstantiate_flags
+CUDA_GRAPH_INSTANTIATE_FLAG_AUTO_FREE_ON_LAUNCH = 1
+
+
+# C function definitions (http://docs.nvidia.com/cuda/cuda-driver-api/)
+# size_t instead of void* is used
+# for convinience with python calls and numpy arrays.
+_SRC = """
+typedef int CUresult;
+typedef int CUdevice;
+typedef size_t CUcontext;
+typedef size_t CUmodule;
+typedef size_t CUfunction;
+typedef size_t CUstream;
+typedef size_t CUevent;
+typedef size_t CUdeviceptr;
+typedef int CUdevice_attribute;
+typedef size_t (*CUoccupancyB2DSize)(int blockSize);
+typedef int CUmemorytype;
+typedef size_t CUarray;
+typedef size_t CUgraph;
+typedef size_t CUgraphExec;
+typedef size_t CUgraphNode;
+typedef int CUdevice_P2PAttribute;
+typedef int CUstreamCaptureMode;
+typedef int CUstreamCaptureStatus;
+typedef int CUgraphNodeType;
+
+typedef struct CUDA_KERNEL_NODE_PARAMS_st {
+    CUfunction func;
+    unsigned int gridDimX;
+    unsigned int gridDimY;
+    unsigned int gridDimZ;
+    unsigned int blockDimX;
+    unsigned int blockDimY;
+    unsigned int blockDimZ;
+    unsigned int sharedMemBytes;
+    void **kernelParams;
+    void **extra;
+} CUDA_KERNEL_NODE_PARAMS;
+
+typedef struct CUDA_MEMCPY3D_st {
+    size_t srcXInBytes;
+    size_t srcY;
+    size_t srcZ;
+    size_t srcLOD;
+    CUmemorytype srcMemoryType;
+    size_t srcHost;
+    CUdeviceptr srcDevice;
+    CUarray srcArray;
+    void *reserved0;
+    size_t srcPitch;
+    size_t srcHeight;
+
+    size_t dstXInBytes;
+    size_t dstY;
+    size_t dstZ;
+    size_t dstLOD;
+    CUmemorytype dstMemoryType;
+    size_t dstHost;
+    CUdeviceptr dstDevice;
+    CUarray dstArray;
+    void *reserved1;
+    size_t dstPitch;
+    size_t dstHeight;
+
+    size_t WidthInBytes;
+    size_t Height;
+    size_t Depth;
+} CUDA_MEMCPY3D;
+
+CUresult cuInit(unsigned int Flags);
+
+CUresult cuDeviceGetCount(int *count);
+CUresult cuDeviceGet(CUdevice *device,
+                     int ordinal);
+CUresult cuDeviceGetAttribute(int *pi,
+                              CUdevice_attribute attrib,
+                              CUdevice dev);
+CUresult cuDeviceGetName(char *name,
+                         int len,
+                         CUdevice dev);
+CUresult cuDeviceTotalMem_v2(size_t *bytes,
+                             CUdevice dev);
+CUresult cuDeviceGetPCIBusId(char *pciBusId,
                              int len,
                              CUdevice dev);
-    CUresult cuDeviceTotalMem_v2(size_t *bytes,
-                                 CUdevice dev);
-    CUresult cuDeviceGetPCIBusId(char *pciBusId,
-                                 int len,
-                                 CUdevice dev);
-    CUresult cuDeviceGetByPCIBusId(CUdevice *dev,
-                                   const char *pciBusId);
-
-    CUresult cuCtxCreate_v2(CUcontext *pctx,
-                            unsigned int flags,
-                            CUdevice dev);
-    CUresult cuCtxDestroy_v2(CUcontext ctx);
-    CUresult cuCtxPushCurrent_v2(CUcontext ctx);
-    CUresult cuCtxPopCurrent_v2(CUcontext *pctx);
-    CUresult cuCtxSetCurrent(CUcontext ctx);
-    CUresult cuCtxGetCurrent(CUcontext *pctx);
-    CUresult cuCtxSynchronize();
-
-    CUresult cuModuleLoadData(CUmodule *module,
-                              const void *image);
-    CUresult cuModuleUnload(CUmodule hmod);
-    CUresult cuModuleGetFunction(CUfunction *hfunc,
-                                 CUmodule hmod,
-                                 const char *name);
-    CUresult cuModuleGetGlobal_v2(CUdeviceptr *dptr,
-                                  size_t *bytes,
-                                  CUmodule hmod,
-                                  const char *name);
-
-    CUresult cuLaunchKernel(CUfunction f,
-                            unsigned int gridDimX,
-                            unsigned int gridDimY,
-                            unsigned int gridDimZ,
-                            unsigned int blockDimX,
-                            unsigned int blockDimY,
-                            unsigned int blockDimZ,
-                            unsigned int sharedMemBytes,
-                            CUstream hStream,
-                            void **kernelParams,
-                            void **extra);
-
-    CUresult cuMemAlloc_v2(CUdeviceptr *dptr,
-                           size_t bytesize);
-    CUresult cuMemFree_v2(CUdeviceptr dptr);
-    CUresult cuMemAllocManaged(CUdeviceptr* dptr,
-                               size_t bytesize,
-                               unsigned int flags);
-    CUresult cuMemHostAlloc(size_t *pp,
-                            size_t bytesize,
-                            unsigned int Flags);
-    CUresult cuMemFreeHost(size_t p);
-    CUresult cuMemHostGetDevicePointer_v2(CUdeviceptr *pdptr,
-                                          size_t p,
-                                          unsigned int Flags);
-
-    CUresult cuMemcpyDtoH_v2(size_t dstHost,
-                             CUdeviceptr srcDevice,
-                             size_t ByteCount);
-    CUresult cuMemcpyHtoD_v2(CUdeviceptr dstDevice,
-                             size_t srcHost,
-                             size_t ByteCount);
-    CUresult cuMemcpyHtoDAsync_v2(CUdeviceptr dstDevice,
-                                  size_t srcHost,
-                                  size_t ByteCount,
-                                  CUstream hStream);
-    CUresult cuMemcpyDtoDAsync_v2(CUdeviceptr dstDevice,
-                                  CUdeviceptr srcDevice,
-                                  size_t ByteCount,
-                                  CUstream hStream);
-    CUresult cuMemsetD32Async(CUdeviceptr dstDevice,
-                              unsigned int ui,
-                              size_t N,
+CUresult cuDeviceGetByPCIBusId(CUdevice *dev,
+                               const char *pciBusId);
+
+CUresult cuCtxCreate_v2(CUcontext *pctx,
+                        unsigned int flags,
+                        CUdevice dev);
+CUresult cuCtxDestroy_v2(CUcontext ctx);
+CUresult cuCtxPushCurrent_v2(CUcontext ctx);
+CUresult cuCtxPopCurrent_v2(CUcontext *pctx);
+CUresult cuCtxSetCurrent(CUcontext ctx);
+CUresult cuCtxGetCurrent(CUcontext *pctx);
+CUresult cuCtxSynchronize();
+CUresult cuDevicePrimaryCtxRetain(CUcontext *pctx,
+                                  CUdevice dev);
+CUresult cuDevicePrimaryCtxRelease_v2(CUdevice dev);
+CUresult cuDevicePrimaryCtxSetFlags_v2(CUdevice dev,
+                                       unsigned int flags);
+CUresult cuDevicePrimaryCtxGetState(CUdevice dev,
+                                    unsigned int *flags,
+                                    int *active);
+CUresult cuCtxEnablePeerAccess(CUcontext peerContext,
+                               unsigned int Flags);
+CUresult cuCtxDisablePeerAccess(CUcontext peerContext);
+CUresult cuDeviceCanAccessPeer(int *canAccessPeer,
+                               CUdevice dev,
+                               CUdevice peerDev);
+CUresult cuDeviceGetP2PAttribute(int *value,
+                                 CUdevice_P2PAttribute attrib,
+                                 CUdevice srcDevice,
+                                 CUdevice dstDevice);
+
+CUresult cuModuleLoadData(CUmodule *module,
+                          const void *image);
+CUresult cuModuleUnload(CUmodule hmod);
+CUresult cuModuleGetFunction(CUfunction *hfunc,
+                             CUmodule hmod,
+                             const char *name);
+CUresult cuModuleGetGlobal_v2(CUdeviceptr *dptr,
+                              size_t *bytes,
+                              CUmodule hmod,
+                              const char *name);
+
+CUresult cuLaunchKernel(CUfunction f,
+                        unsigned int gridDimX,
+                        unsigned int gridDimY,
+                        unsigned int gridDimZ,
+                        unsigned int blockDimX,
+                        unsigned int blockDimY,
+                        unsigned int blockDimZ,
+                        unsigned int sharedMemBytes,
+                        CUstream hStream,
+                        void **kernelParams,
+                        void **extra);
+
+CUresult cuMemAlloc_v2(CUdeviceptr *dptr,
+                       size_t bytesize);
+CUresult cuMemFree_v2(CUdeviceptr dptr);
+CUresult cuMemAllocManaged(CUdeviceptr* dptr,
+                           size_t bytesize,
+                           unsigned int flags);
+CUresult cuMemHostAlloc(size_t *pp,
+                        size_t bytesize,
+                        unsigned int Flags);
+CUresult cuMemFreeHost(size_t p);
+CUresult cuMemHostRegister_v2(size_t p,
+                              size_t bytesize,
+                              unsigned int Flags);
+CUresult cuMemHostUnregister(size_t p);
+CUresult cuMemHostGetDevicePointer_v2(CUdeviceptr *pdptr,
+                                      size_t p,
+                                      unsigned int Flags);
+
+CUresult cuMemcpyDtoH_v2(size_t dstHost,
+                         CUdeviceptr srcDevice,
+                         size_t ByteCount);
+CUresult cuMemcpyHtoD_v2(CUdeviceptr dstDevice,
+                         size_t srcHost,
+                         size_t ByteCount);
+CUresult cuMemcpyDtoHAsync_v2(size_t dstHost,
+                              CUdeviceptr srcDevice,
+                              size_t ByteCount,
                               CUstream hStream);
-    CUresult cuMemcpy3DAsync_v2(const CUDA_MEMCPY3D *pCopy,
-                                CUstream hStream);
-
-    CUresult cuOccupancyMaxActiveBlocksPerMultiprocessor(
-                                int *numBlocks,
-                                CUfunction func,
-                                int blockSize,
-                                size_t dynamicSMemSize);
-    CUresult cuOccupancyMaxPotentialBlockSize(
-                                int *minGridSize,
-                                int *blockSize,
-                                CUfunction func,
-                                CUoccupancyB2DSize blockSizeToDynamicSMemSize,
-                                size_t dynamicSMemSize,
-                                int blockSizeLimit);
-    """
+CUresult cuMemcpyHtoDAsync_v2(CUdeviceptr dstDevice,
+                              size_t srcHost,
+                              size_t ByteCount,
+                              CUstream hStream);
+CUresult cuMemcpyDtoDAsync_v2(CUdeviceptr dstDevice,
+                              CUdeviceptr srcDevice,
+                              size_t ByteCount,
+                              CUstream hStream);
+CUresult cuMemcpyPeerAsync(CUdeviceptr dstDevice,
+                           CUcontext dstContext,
+                           CUdeviceptr srcDevice,
+                           CUcontext srcContext,
+                           size_t ByteCount,
+                           CUstream hStream);
+CUresult cuMemsetD32Async(CUdeviceptr dstDevice,
+                          unsigned int ui,
+                          size_t N,
+                          CUstream hStream);
+CUresult cuMemcpy3DAsync_v2(const CUDA_MEMCPY3D *pCopy,
+                            CUstream hStream);
+
+CUresult cuCtxGetStreamPriorityRange(int *leastPriority,
+                                     int *greatestPriority);
+CUresult cuStreamCreate(CUstream *phStream,
+                        unsigned int Flags);
+CUresult cuStreamCreateWithPriority(CUstream *phStream,
+                                    unsigned int flags,
+                                    int priority);
+CUresult cuStreamGetPriority(CUstream hStream,
+                             int *priority);
+CUresult cuStreamGetFlags(CUstream hStream,
+                          unsigned int *flags);
+CUresult cuStreamQuery(CUstream hStream);
+CUresult cuStreamSynchronize(CUstream hStream);
+CUresult cuStreamDestroy_v2(CUstream hStream);
+CUresult cuStreamWaitEvent(CUstream hStream,
+                           CUevent hEvent,
+                           unsigned int Flags);
+
+CUresult cuEventCreate(CUevent *phEvent,
+                       unsigned int Flags);
+CUresult cuEventRecord(CUevent hEvent,
+                       CUstream hStream);
+CUresult cuEventQuery(CUevent hEvent);
+CUresult cuEventSynchronize(CUevent hEvent);
+CUresult cuEventElapsedTime(float *pMilliseconds,
+                            CUevent hStart,
+                            CUevent hEnd);
+CUresult cuEventDestroy_v2(CUevent hEvent);
+
+CUresult cuStreamBeginCapture_v2(CUstream hStream,
+                                 CUstreamCaptureMode mode);
+CUresult cuStreamEndCapture(CUstream hStream,
+                            CUgraph *phGraph);
+CUresult cuStreamIsCapturing(CUstream hStream,
+                             CUstreamCaptureStatus *captureStatus);
+CUresult cuGraphCreate(CUgraph *phGraph,
+                       unsigned int flags);
+CUresult cuGraphDestroy(CUgraph hGraph);
+CUresult cuGraphGetNodes(CUgraph hGraph,
+                         CUgraphNode *nodes,
+                         size_t *numNodes);
+CUresult cuGraphNodeGetType(CUgraphNode hNode,
+                            CUgraphNodeType *type);
+CUresult cuGraphKernelNodeGetParams(
+                            CUgraphNode hNode,
+                            CUDA_KERNEL_NODE_PARAMS *nodeParams);
+CUresult cuGraphInstantiateWithFlags(CUgraphExec *phGraphExec,
+                                     CUgraph hGraph,
+                                     unsigned long long flags);
+CUresult cuGraphExecKernelNodeSetParams(
+                            CUgraphExec hGraphExec,
+                            CUgraphNode hNode,
+                            const CUDA_KERNEL_NODE_PARAMS *nodeParams);
+CUresult cuGraphLaunch(CUgraphExec hGraphExec,
+                       CUstream hStream);
+CUresult cuGraphExecDestroy(CUgraphExec hGraphExec);
+
+CUresult cuOccupancyMaxActiveBlocksPerMultiprocessor(
+                            int *numBlocks,
+                            CUfunction func,
+                            int blockSize,
+                            size_t dynamicSMemSize);
+CUresult cuOccupancyMaxPotentialBlockSize(
+                            int *minGridSize,
+                            int *blockSize,
+                            CUfunction func,
+                            CUoccupancyB2DSize blockSizeToDynamicSMemSize,
+                            size_t dynamicSMemSize,
+                            int blockSizeLimit);
+"""
+
 
+def _initialize(backends):
+    global lib
+    if lib is not None:
+        return
     # Parse
     global ffi
-    ffi = cffi.FFI()
-    ffi.cdef(src)
+    ffi = prebuilt_ffi("cuda4py._cuda_ffi")
+    if ffi is None:
+        ffi = cffi.FFI()
+        ffi.cdef(_SRC)
 
     # Load library
     for libnme in backends:
@@ -401,6 +900,7 @@ def _initialize(backends):
     else:
         ffi = None
         raise OSError("Could not load cuda library")
+    lib = instrumented(lib)
 
 
 def initialize(backends=("libcuda.so", "nvcuda.dll")):
@@ -409,4 +909,4 @@ def initialize(backends=("libcuda.so", "nvcuda.dll")):
         return
     global lock
     with lock:
-        _initialize(backends)
+        _initialize(get_backends(backends))
@@ -0,0 +1,234 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+DLPack tensors exchange via PyCapsule (ctypes is used
+as cffi in ABI mode has no access to the capsule api).
+
+The capsules are passed to the capsule api by id(),
+which is the address of the object on CPython only,
+so the exchange is not supported on the other implementations (PyPy).
+"""
+import ctypes
+import platform
+import threading
+
+
+#: DLDeviceType
+kDLCPU = 1
+kDLCUDA = 2
+kDLCUDAHost = 3
+kDLCUDAManaged = 13
+
+
+#: DLDataTypeCode
+kDLInt = 0
+kDLUInt = 1
+kDLFloat = 2
+kDLComplex = 5
+kDLBool = 6
+
+
+#: numpy dtype kind to DLDataTypeCode
+KINDS = {"i": kDLInt, "u": kDLUInt, "f": kDLFloat, "c": kDLComplex,
+         "b": kDLBool}
+
+
+class DLDevice(ctypes.Structure):
+    _fields_ = [("device_type", ctypes.c_int32),
+                ("device_id", ctypes.c_int32)]
+
+
+class DLDataType(ctypes.Structure):
+    _fields_ = [("code", ctypes.c_uint8),
+                ("bits", ctypes.c_uint8),
+                ("lanes", ctypes.c_uint16)]
+
+
+class DLTensor(ctypes.Structure):
+    _fields_ = [("data", ctypes.c_void_p),
+                ("device", DLDevice),
+                ("ndim", ctypes.c_int32),
+                ("dtype", DLDataType),
+                ("shape", ctypes.POINTER(ctypes.c_int64)),
+                ("strides", ctypes.POINTER(ctypes.c_int64)),
+                ("byte_offset", ctypes.c_uint64)]
+
+
+class DLManagedTensor(ctypes.Structure):
+    pass
+
+
+DLManagedTensorDeleter = ctypes.CFUNCTYPE(
+    None, ctypes.POINTER(DLManagedTensor))
+
+
+DLManagedTensor._fields_ = [("dl_tensor", DLTensor),
+                            ("manager_ctx", ctypes.c_void_p),
+                            ("deleter", DLManagedTensorDeleter)]
+
+
+PyCapsule_Destructor = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+
+if platform.python_implementation() == "CPython":
+    _capi = ctypes.pythonapi
+    _capi.PyCapsule_New.restype = ctypes.py_object
+    _capi.PyCapsule_New.argtypes = (ctypes.c_void_p, ctypes.c_char_p,
+                                    PyCapsule_Destructor)
+    _capi.PyCapsule_IsValid.restype = ctypes.c_int
+    _capi.PyCapsule_IsValid.argtypes = (ctypes.c_void_p, ctypes.c_char_p)
+    _capi.PyCapsule_GetPointer.restype = ctypes.c_void_p
+    _capi.PyCapsule_GetPointer.argtypes = (ctypes.c_void_p,
+                                           ctypes.c_char_p)
+    _capi.PyCapsule_SetName.restype = ctypes.c_int
+    _capi.PyCapsule_SetName.argtypes = (ctypes.py_object, ctypes.c_char_p)
+else:
+    _capi = None
+
+
+def _check_capi():
+    if _capi is None:
+        raise NotImplementedError(
+            "DLPack is not supported on %s" %
+            platform.python_implementation())
+
+
+#: Exported tensors by the address of DLManagedTensor
+_exported = {}
+_lock = threading.Lock()
+
+
+def _delete_managed(ptr):
+    with _lock:
+        _exported.pop(ctypes.addressof(ptr.contents), None)
+
+
+def _destroy_capsule(capsule):
+    # the capsule was not consumed, so we are still the owner
+    if _capi.PyCapsule_IsValid(capsule, b"dltensor"):
+        ptr = _capi.PyCapsule_GetPointer(capsule, b"dltensor")
+        managed = ctypes.cast(ptr, ctypes.POINTER(DLManagedTensor))
+        managed.contents.deleter(managed)
+
+
+_deleter = DLManagedTensorDeleter(_delete_managed)
+_capsule_destructor = PyCapsule_Destructor(_destroy_capsule)
+
+
+def to_dlpack(ptr, shape, strides, dtype, device_type, device_id, owner):
+    """Returns "dltensor" PyCapsule describing the memory.
+
+    Parameters:
+        ptr: address of the first element.
+        shape: tuple of dimensions.
+        strides: tuple of steps in bytes for each dimension.
+        dtype: numpy dtype.
+        device_type: one of kDL*.
+        device_id: device ordinal.
+        owner: object to hold the reference to
+               until the consumer calls the deleter.
+    """
+    _check_capi()
+    kind = KINDS.get(dtype.kind)
+    if kind is None:
+        raise ValueError("dtype %s is not supported by DLPack" % dtype)
+    for s in strides:
+        if s % dtype.itemsize:
+            raise ValueError("Strides should be multiple of the itemsize")
+    ndim = len(shape)
+    c_shape = (ctypes.c_int64 * max(ndim, 1))(*shape)
+    c_strides = (ctypes.c_int64 * max(ndim, 1))(
+        *(s // dtype.itemsize for s in strides))
+    managed = DLManagedTensor()
+    tensor = managed.dl_tensor
+    tensor.data = ptr
+    tensor.device = DLDevice(device_type, device_id)
+    tensor.ndim = ndim
+    tensor.dtype = DLDataType(kind, dtype.itemsize * 8, 1)
+    tensor.shape = c_shape
+    tensor.strides = c_strides
+    tensor.byte_offset = 0
+    managed.deleter = _deleter
+    with _lock:
+        _exported[ctypes.addressof(managed)] = (
+            managed, c_shape, c_strides, owner)
+    return _capi.PyCapsule_New(ctypes.addressof(managed), b"dltensor",
+                               _capsule_destructor)
+
+
+class DLPackOwner(object):
+    """Holds consumed DLManagedTensor and calls its deleter when collected.
+    """
+    def __init__(self, managed):
+        self._managed = managed
+
+    def __del__(self):
+        if self._managed is not None and self._managed.contents.deleter:
+            self._managed.contents.deleter(self._managed)
+        self._managed = None
+
+
+def from_dlpack(capsule):
+    """Consumes "dltensor" PyCapsule.
+
+    Returns:
+        ptr, shape, strides, dtype, device_type, device_id, owner:
+            the same as the parameters of to_dlpack(),
+            strides are in bytes, owner calls the deleter when collected.
+    """
+    import numpy
+    _check_capi()
+    if not _capi.PyCapsule_IsValid(id(capsule), b"dltensor"):
+        raise ValueError("Expected unconsumed \"dltensor\" capsule")
+    managed = ctypes.cast(
+        _capi.PyCapsule_GetPointer(id(capsule), b"dltensor"),
+        ctypes.POINTER(DLManagedTensor))
+    tensor = managed.contents.dl_tensor
+    kind = dict((v, k) for k, v in KINDS.items()).get(tensor.dtype.code)
+    if kind is None or tensor.dtype.lanes != 1:
+        raise ValueError("Unsupported DLPack dtype (%d, %d, %d)" % (
+            tensor.dtype.code, tensor.dtype.bits, tensor.dtype.lanes))
+    dtype = numpy.dtype("%s%d" % (kind, tensor.dtype.bits // 8))
+    shape = tuple(tensor.shape[i] for i in range(tensor.ndim))
+    if tensor.strides:
+        strides = tuple(tensor.strides[i] * dtype.itemsize
+                        for i in range(tensor.ndim))
+    else:
+        strides = None
+    _capi.PyCapsule_SetName(capsule, b"used_dltensor")
+    return ((tensor.data or 0) + tensor.byte_offset, shape, strides, dtype,
+            tensor.device.device_type, tensor.device.device_id,
+            DLPackOwner(managed))
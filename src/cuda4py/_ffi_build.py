@@ -0,0 +1,237 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+"""
+Builds out-of-line ABI mode cffi modules from the C definitions
+of the bindings, so they are loaded at runtime without parsing
+(see prebuilt_ffi() in _cffi.py).
+
+Used by setup.py via cffi_modules or can be run directly to build
+the modules in place:
+
+    python src/cuda4py/_ffi_build.py
+
+Also builds the stub backend from _stub.c (see build_stub()).
+"""
+import cffi
+import hashlib
+import importlib
+import os
+import shutil
+import stat
+import sys
+import sysconfig
+import tempfile
+
+
+#: Prebuilt module name => (bindings module name, C definitions names)
+MODULES = {
+    "cuda4py._cuda_ffi": ("cuda4py._cffi", ("_SRC",)),
+    "cuda4py.blas._cublas_ffi": ("cuda4py.blas._cublas", ("_SRC",)),
+    "cuda4py.cufft._cufft_ffi": ("cuda4py.cufft._cufft", ("_SRC",)),
+    "cuda4py.nvrtc._nvrtc_ffi": ("cuda4py.nvrtc._nvrtc", ("_SRC",)),
+}
+
+
+def _src_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _bindings(name):
+    """Imports the bindings module from this source tree.
+    """
+    src_dir = _src_dir()
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+    return importlib.import_module(name)
+
+
+def make_ffi(name):
+    """Returns cffi.FFI with set_source() called for the prebuilt module.
+
+    Parameters:
+        name: full name of the prebuilt module (see MODULES).
+    """
+    if name in MODULES:
+        module_name, srcs = MODULES[name]
+        module = _bindings(module_name)
+        srcs = tuple(getattr(module, src) for src in srcs)
+    else:
+        module = _bindings("cuda4py._impl.cudnn._cffi")
+        srcs = None
+        for _min_version, variant, variant_srcs in module.VARIANTS:
+            if name == "cuda4py._impl.cudnn._cudnn_%s_ffi" % variant:
+                srcs = (module._SRC,) + module.FEATURES + variant_srcs
+        if srcs is None:
+            raise ValueError("Unknown prebuilt module %s" % name)
+    ffi = cffi.FFI()
+    ffi.set_source(name, None)
+    for src in srcs:
+        ffi.cdef(src)
+    return ffi
+
+
+def module_names():
+    """Returns names of all prebuilt modules.
+    """
+    module = _bindings("cuda4py._impl.cudnn._cffi")
+    return sorted(MODULES) + [
+        "cuda4py._impl.cudnn._cudnn_%s_ffi" % variant
+        for _min_version, variant, _srcs in module.VARIANTS]
+
+
+def cuda():
+    return make_ffi("cuda4py._cuda_ffi")
+
+
+def cublas():
+    return make_ffi("cuda4py.blas._cublas_ffi")
+
+
+def cufft():
+    return make_ffi("cuda4py.cufft._cufft_ffi")
+
+
+def nvrtc():
+    return make_ffi("cuda4py.nvrtc._nvrtc_ffi")
+
+
+def cudnn_v2():
+    return make_ffi("cuda4py._impl.cudnn._cudnn_v2_ffi")
+
+
+def cudnn_v4():
+    return make_ffi("cuda4py._impl.cudnn._cudnn_v4_ffi")
+
+
+def cudnn_v5():
+    return make_ffi("cuda4py._impl.cudnn._cudnn_v5_ffi")
+
+
+def _stub_src():
+    with open(os.path.join(_src_dir(), "cuda4py", "_stub.c")) as fin:
+        return fin.read()
+
+
+def stub():
+    """Returns cffi.FFI of the stub backend: the extension module
+    cuda4py._stub, which exports the functions of the bindings
+    implemented over host memory, so it can be passed
+    to initialize() instead of the real libraries.
+    """
+    ffi = cffi.FFI()
+    ffi.set_source("cuda4py._stub", _stub_src())
+    ffi.cdef("""
+    size_t cuda4py_stub_allocated(void);
+    unsigned long long cuda4py_stub_launches(void);
+    """)
+    return ffi
+
+
+def _check_private(path):
+    """Raises OSError if path is not owned by the current user
+    or is writable by the others, so the stub library found there
+    could be replaced by another user.
+    """
+    if not hasattr(os, "getuid"):
+        return  # no POSIX permissions
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP |
+                                                  stat.S_IWOTH):
+        raise OSError("%s should be owned by the current user and "
+                      "not writable by the others" % path)
+
+
+def build_stub(tmpdir=None):
+    """Compiles the stub backend if it was not compiled yet.
+
+    The library is compiled in the private temporary directory
+    and atomically moved into the cache, so concurrent processes
+    never load the partially written file.
+
+    Parameters:
+        tmpdir: directory to keep the build in, defaults to
+                CUDA4PY_CACHE_DIR environment variable or ~/.cache/cuda4py
+                (the same as for CompilationCache), it should be owned
+                by the current user and not writable by the others.
+
+    Returns:
+        Path to the compiled shared library.
+    """
+    digest = hashlib.sha1(_stub_src().encode("utf-8"))
+    suffix = str(sysconfig.get_config_var("EXT_SUFFIX") or
+                 sysconfig.get_config_var("SO"))
+    digest.update(suffix.encode("utf-8"))
+    if tmpdir is None:
+        tmpdir = os.environ.get("CUDA4PY_CACHE_DIR")
+        if not tmpdir:
+            tmpdir = os.path.join(os.path.expanduser("~"),
+                                  ".cache", "cuda4py")
+    stubdir = os.path.join(tmpdir, "stub-%s" % digest.hexdigest()[:16])
+    try:
+        os.makedirs(stubdir, 0o700)
+    except OSError:
+        if not os.path.isdir(stubdir):
+            raise
+    _check_private(tmpdir)
+    _check_private(stubdir)
+    path = os.path.join(stubdir, "_stub" + suffix)
+    if os.path.isfile(path):
+        _check_private(path)
+        return path
+    builddir = tempfile.mkdtemp(dir=stubdir)
+    try:
+        getattr(os, "replace", os.rename)(
+            stub().compile(tmpdir=builddir), path)
+    finally:
+        shutil.rmtree(builddir, ignore_errors=True)
+    return path
+
+
+def build(tmpdir=None):
+    """Writes all prebuilt modules to tmpdir
+    (the source tree if not specified).
+
+    Returns:
+        List of the written files.
+    """
+    tmpdir = _src_dir() if tmpdir is None else tmpdir
+    return [make_ffi(name).compile(tmpdir=tmpdir)
+            for name in module_names()]
+
+
+if __name__ == "__main__":
+    for path in build(*sys.argv[1:2]):
+        print(path)
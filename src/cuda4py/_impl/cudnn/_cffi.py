@@ -179,527 +179,564 @@ CUDNN_SOFTMAX_MODE_CHANNEL = 1  # compute over all C for each H, W, N
 cudnn_version = 0
 
 
-def _initialize(backends):
-    global lib
-    if lib is not None:
-        return
-    # C function definitions
-    # size_t instead of void* is used
-    # for convinience with python calls and numpy arrays,
-    # cffi automatically calls int() on objects also.
-    src = """
-    typedef int cudnnStatus_t;
-    typedef size_t cudnnHandle_t;
-    typedef size_t cudnnTensorDescriptor_t;
-    typedef size_t cudnnConvolutionDescriptor_t;
-    typedef size_t cudnnFilterDescriptor_t;
-    typedef size_t cudnnPoolingDescriptor_t;
-    typedef int cudnnTensorFormat_t;
-    typedef int cudnnDataType_t;
-    typedef int cudnnConvolutionMode_t;
-    typedef int cudnnConvolutionFwdPreference_t;
-    typedef int cudnnConvolutionFwdAlgo_t;
-    typedef int cudnnPoolingMode_t;
-    typedef int cudnnSoftmaxAlgorithm_t;
-    typedef int cudnnSoftmaxMode_t;
-
-    size_t cudnnGetVersion();
-
-    cudnnStatus_t cudnnCreate(cudnnHandle_t *handle);
-    cudnnStatus_t cudnnDestroy(cudnnHandle_t handle);
-
-    cudnnStatus_t cudnnCreateTensorDescriptor(
-        cudnnTensorDescriptor_t *tensorDesc);
-    cudnnStatus_t cudnnDestroyTensorDescriptor(
-        cudnnTensorDescriptor_t tensorDesc);
-    cudnnStatus_t cudnnSetTensor4dDescriptor(
-        cudnnTensorDescriptor_t tensorDesc,
-        cudnnTensorFormat_t format,
-        cudnnDataType_t dataType,
-        int n, int c, int h, int w);
-    cudnnStatus_t cudnnGetTensor4dDescriptor(
-        const cudnnTensorDescriptor_t tensorDesc,
-        cudnnDataType_t *dataType,
-        int *n, int *c, int *h, int *w,
-        int *nStride, int *cStride, int *hStride, int *wStride);
-    cudnnStatus_t cudnnSetTensorNdDescriptor(
-        cudnnTensorDescriptor_t tensorDesc,
-        cudnnDataType_t dataType,
-        int nbDims,
-        const int *dimA,
-        const int *strideA);
-    cudnnStatus_t cudnnGetTensorNdDescriptor(
-        const cudnnTensorDescriptor_t tensorDesc,
-        int nbDimsRequested,
-        cudnnDataType_t *dataType,
-        int *nbDims,
-        int *dimA,
-        int *strideA);
-
-    cudnnStatus_t cudnnCreateFilterDescriptor(
-        cudnnFilterDescriptor_t *filterDesc);
-    cudnnStatus_t cudnnDestroyFilterDescriptor(
-        cudnnFilterDescriptor_t filterDesc);
-
-    cudnnStatus_t cudnnCreateConvolutionDescriptor(
-        cudnnConvolutionDescriptor_t *convDesc);
-    cudnnStatus_t cudnnDestroyConvolutionDescriptor(
-        cudnnConvolutionDescriptor_t convDesc);
-    cudnnStatus_t cudnnSetConvolution2dDescriptor(
-        cudnnConvolutionDescriptor_t convDesc,
-        int pad_h,
-        int pad_w,
-        int u,
-        int v,
-        int upscalex,
-        int upscaley,
-        cudnnConvolutionMode_t mode);
-
-    cudnnStatus_t cudnnGetConvolution2dForwardOutputDim(
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnTensorDescriptor_t inputTensorDesc,
-        const cudnnFilterDescriptor_t filterDesc,
-        int *n, int *c, int *h, int *w);
-
-    cudnnStatus_t cudnnGetConvolutionForwardAlgorithm(
-        cudnnHandle_t handle,
-        const cudnnTensorDescriptor_t srcDesc,
-        const cudnnFilterDescriptor_t filterDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnTensorDescriptor_t destDesc,
-        cudnnConvolutionFwdPreference_t preference,
-        size_t memoryLimitInbytes,
-        cudnnConvolutionFwdAlgo_t *algo);
-
-    cudnnStatus_t cudnnGetConvolutionForwardWorkspaceSize(
-        cudnnHandle_t handle,
-        const cudnnTensorDescriptor_t srcDesc,
-        const cudnnFilterDescriptor_t filterDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnTensorDescriptor_t destDesc,
-        cudnnConvolutionFwdAlgo_t algo,
-        size_t *sizeInBytes);
-
-    cudnnStatus_t cudnnConvolutionForward(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t srcDesc,
-        const intptr_t srcData,
-        const cudnnFilterDescriptor_t filterDesc,
-        const intptr_t filterData,
-        const cudnnConvolutionDescriptor_t convDesc,
-        cudnnConvolutionFwdAlgo_t algo,
-        intptr_t workSpace,
-        size_t workSpaceSizeInBytes,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t destDesc,
-        intptr_t destData);
-
-    cudnnStatus_t cudnnConvolutionBackwardBias(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t srcDesc,
-        const intptr_t srcData,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t destDesc,
-        intptr_t destData);
-
-    cudnnStatus_t cudnnTransformTensor(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t srcDesc,
-        const intptr_t srcData,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t destDesc,
-        intptr_t destData);
-
-    cudnnStatus_t cudnnCreatePoolingDescriptor(
-        cudnnPoolingDescriptor_t *poolingDesc);
-    cudnnStatus_t cudnnDestroyPoolingDescriptor(
-        cudnnPoolingDescriptor_t poolingDesc);
-    cudnnStatus_t cudnnGetPooling2dForwardOutputDim(
-        const cudnnPoolingDescriptor_t poolingDesc,
-        const cudnnTensorDescriptor_t inputTensorDesc,
-        int *n, int *c, int *h, int *w);
-    cudnnStatus_t cudnnPoolingForward(
-        cudnnHandle_t handle,
-        const cudnnPoolingDescriptor_t poolingDesc,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t xDesc,
-        const intptr_t x,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t yDesc,
-        intptr_t y);
-    cudnnStatus_t cudnnPoolingBackward(
-        cudnnHandle_t handle,
-        const cudnnPoolingDescriptor_t poolingDesc,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t yDesc,
-        const intptr_t y,
-        const cudnnTensorDescriptor_t dyDesc,
-        const intptr_t dy,
-        const cudnnTensorDescriptor_t xDesc,
-        const intptr_t x,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t dxDesc,
-        intptr_t dx);
-
-    cudnnStatus_t cudnnSoftmaxForward(
-        cudnnHandle_t handle,
-        cudnnSoftmaxAlgorithm_t algo,
-        cudnnSoftmaxMode_t mode,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t xDesc,
-        const intptr_t x,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t yDesc,
-        intptr_t y);
-    cudnnStatus_t cudnnSoftmaxBackward(
-        cudnnHandle_t handle,
-        cudnnSoftmaxAlgorithm_t algo,
-        cudnnSoftmaxMode_t mode,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t yDesc,
-        const intptr_t y,
-        const cudnnTensorDescriptor_t dyDesc,
-        const intptr_t dy,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t dxDesc,
-        intptr_t dx);
-    """
+# C function definitions
+# size_t instead of void* is used
+# for convinience with python calls and numpy arrays,
+# cffi automatically calls int() on objects also.
+# All types are defined here, the rest of the definitions
+# are parsed when the declared functions are used for the first time.
+_SRC = """
+typedef int cudnnStatus_t;
+typedef size_t cudnnHandle_t;
+typedef size_t cudnnTensorDescriptor_t;
+typedef size_t cudnnConvolutionDescriptor_t;
+typedef size_t cudnnFilterDescriptor_t;
+typedef size_t cudnnPoolingDescriptor_t;
+typedef int cudnnTensorFormat_t;
+typedef int cudnnDataType_t;
+typedef int cudnnConvolutionMode_t;
+typedef int cudnnConvolutionFwdPreference_t;
+typedef int cudnnConvolutionFwdAlgo_t;
+typedef int cudnnPoolingMode_t;
+typedef int cudnnSoftmaxAlgorithm_t;
+typedef int cudnnSoftmaxMode_t;
+typedef int cudnnConvolutionBwdFilterAlgo_t;
+typedef int cudnnConvolutionBwdDataAlgo_t;
+typedef int cudnnConvolutionBwdFilterPreference_t;
+typedef int cudnnConvolutionBwdDataPreference_t;
+typedef size_t cudnnRNNDescriptor_t;
+typedef size_t cudnnDropoutDescriptor_t;
+typedef int cudnnNanPropagation_t;
+typedef int cudnnRNNInputMode_t;
+typedef int cudnnDirectionMode_t;
+typedef int cudnnRNNMode_t;
+
+size_t cudnnGetVersion();
+
+cudnnStatus_t cudnnCreate(cudnnHandle_t *handle);
+cudnnStatus_t cudnnDestroy(cudnnHandle_t handle);
+cudnnStatus_t cudnnSetStream(cudnnHandle_t handle, size_t streamId);
+
+cudnnStatus_t cudnnCreateTensorDescriptor(
+    cudnnTensorDescriptor_t *tensorDesc);
+cudnnStatus_t cudnnDestroyTensorDescriptor(
+    cudnnTensorDescriptor_t tensorDesc);
+cudnnStatus_t cudnnSetTensor4dDescriptor(
+    cudnnTensorDescriptor_t tensorDesc,
+    cudnnTensorFormat_t format,
+    cudnnDataType_t dataType,
+    int n, int c, int h, int w);
+cudnnStatus_t cudnnGetTensor4dDescriptor(
+    const cudnnTensorDescriptor_t tensorDesc,
+    cudnnDataType_t *dataType,
+    int *n, int *c, int *h, int *w,
+    int *nStride, int *cStride, int *hStride, int *wStride);
+cudnnStatus_t cudnnSetTensorNdDescriptor(
+    cudnnTensorDescriptor_t tensorDesc,
+    cudnnDataType_t dataType,
+    int nbDims,
+    const int *dimA,
+    const int *strideA);
+cudnnStatus_t cudnnGetTensorNdDescriptor(
+    const cudnnTensorDescriptor_t tensorDesc,
+    int nbDimsRequested,
+    cudnnDataType_t *dataType,
+    int *nbDims,
+    int *dimA,
+    int *strideA);
+
+cudnnStatus_t cudnnCreateFilterDescriptor(
+    cudnnFilterDescriptor_t *filterDesc);
+cudnnStatus_t cudnnDestroyFilterDescriptor(
+    cudnnFilterDescriptor_t filterDesc);
+
+cudnnStatus_t cudnnTransformTensor(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t srcDesc,
+    const intptr_t srcData,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t destDesc,
+    intptr_t destData);
+"""
 
-    src2 = """
-    cudnnStatus_t cudnnConvolutionBackwardFilter(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t srcDesc,
-        const intptr_t srcData,
-        const cudnnTensorDescriptor_t diffDesc,
-        const intptr_t diffData,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const intptr_t beta,
-        const cudnnFilterDescriptor_t gradDesc,
-        intptr_t gradData);
-
-    cudnnStatus_t cudnnConvolutionBackwardData(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnFilterDescriptor_t filterDesc,
-        const intptr_t filterData,
-        const cudnnTensorDescriptor_t diffDesc,
-        const intptr_t diffData,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t gradDesc,
-        intptr_t gradData);
-    """
+# convolution
+_SRC_CONV = """
+cudnnStatus_t cudnnCreateConvolutionDescriptor(
+    cudnnConvolutionDescriptor_t *convDesc);
+cudnnStatus_t cudnnDestroyConvolutionDescriptor(
+    cudnnConvolutionDescriptor_t convDesc);
+cudnnStatus_t cudnnSetConvolution2dDescriptor(
+    cudnnConvolutionDescriptor_t convDesc,
+    int pad_h,
+    int pad_w,
+    int u,
+    int v,
+    int upscalex,
+    int upscaley,
+    cudnnConvolutionMode_t mode);
+
+cudnnStatus_t cudnnGetConvolution2dForwardOutputDim(
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnTensorDescriptor_t inputTensorDesc,
+    const cudnnFilterDescriptor_t filterDesc,
+    int *n, int *c, int *h, int *w);
+
+cudnnStatus_t cudnnGetConvolutionForwardAlgorithm(
+    cudnnHandle_t handle,
+    const cudnnTensorDescriptor_t srcDesc,
+    const cudnnFilterDescriptor_t filterDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnTensorDescriptor_t destDesc,
+    cudnnConvolutionFwdPreference_t preference,
+    size_t memoryLimitInbytes,
+    cudnnConvolutionFwdAlgo_t *algo);
+
+cudnnStatus_t cudnnGetConvolutionForwardWorkspaceSize(
+    cudnnHandle_t handle,
+    const cudnnTensorDescriptor_t srcDesc,
+    const cudnnFilterDescriptor_t filterDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnTensorDescriptor_t destDesc,
+    cudnnConvolutionFwdAlgo_t algo,
+    size_t *sizeInBytes);
+
+cudnnStatus_t cudnnConvolutionForward(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t srcDesc,
+    const intptr_t srcData,
+    const cudnnFilterDescriptor_t filterDesc,
+    const intptr_t filterData,
+    const cudnnConvolutionDescriptor_t convDesc,
+    cudnnConvolutionFwdAlgo_t algo,
+    intptr_t workSpace,
+    size_t workSpaceSizeInBytes,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t destDesc,
+    intptr_t destData);
+
+cudnnStatus_t cudnnConvolutionBackwardBias(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t srcDesc,
+    const intptr_t srcData,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t destDesc,
+    intptr_t destData);
+"""
 
-    src4p = """
-    typedef int cudnnConvolutionBwdFilterAlgo_t;
-    typedef int cudnnConvolutionBwdDataAlgo_t;
-    typedef int cudnnConvolutionBwdFilterPreference_t;
-    typedef int cudnnConvolutionBwdDataPreference_t;
-
-    cudnnStatus_t cudnnGetConvolutionBackwardFilterAlgorithm(
-        cudnnHandle_t handle,
-        const cudnnTensorDescriptor_t xDesc,
-        const cudnnTensorDescriptor_t dyDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnFilterDescriptor_t dwDesc,
-        cudnnConvolutionBwdFilterPreference_t preference,
-        size_t memoryLimitInBytes,
-        cudnnConvolutionBwdFilterAlgo_t *algo);
-    cudnnStatus_t cudnnGetConvolutionBackwardFilterWorkspaceSize(
-        cudnnHandle_t handle,
-        const cudnnTensorDescriptor_t xDesc,
-        const cudnnTensorDescriptor_t dyDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnFilterDescriptor_t gradDesc,
-        cudnnConvolutionBwdFilterAlgo_t algo,
-        size_t *sizeInBytes);
-    cudnnStatus_t cudnnConvolutionBackwardFilter(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnTensorDescriptor_t srcDesc,
-        const intptr_t srcData,
-        const cudnnTensorDescriptor_t diffDesc,
-        const intptr_t diffData,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnConvolutionBwdFilterAlgo_t algo,
-        intptr_t workSpace,
-        size_t workSpaceSizeInBytes,
-        const intptr_t beta,
-        const cudnnFilterDescriptor_t gradDesc,
-        intptr_t gradData);
-
-    cudnnStatus_t cudnnGetConvolutionBackwardDataAlgorithm(
-        cudnnHandle_t handle,
-        const cudnnFilterDescriptor_t wDesc,
-        const cudnnTensorDescriptor_t dyDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnTensorDescriptor_t dxDesc,
-        cudnnConvolutionBwdDataPreference_t preference,
-        size_t memoryLimitInBytes,
-        cudnnConvolutionBwdDataAlgo_t *algo);
-    cudnnStatus_t cudnnGetConvolutionBackwardDataWorkspaceSize(
-        cudnnHandle_t handle,
-        const cudnnFilterDescriptor_t wDesc,
-        const cudnnTensorDescriptor_t dyDesc,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnTensorDescriptor_t dxDesc,
-        cudnnConvolutionBwdDataAlgo_t algo,
-        size_t *sizeInBytes);
-    cudnnStatus_t cudnnConvolutionBackwardData(
-        cudnnHandle_t handle,
-        const intptr_t alpha,
-        const cudnnFilterDescriptor_t filterDesc,
-        const intptr_t filterData,
-        const cudnnTensorDescriptor_t diffDesc,
-        const intptr_t diffData,
-        const cudnnConvolutionDescriptor_t convDesc,
-        const cudnnConvolutionBwdDataAlgo_t algo,
-        intptr_t workSpace,
-        size_t workSpaceSizeInBytes,
-        const intptr_t beta,
-        const cudnnTensorDescriptor_t gradDesc,
-        intptr_t gradData);
-    """
+# pooling
+_SRC_POOLING = """
+cudnnStatus_t cudnnCreatePoolingDescriptor(
+    cudnnPoolingDescriptor_t *poolingDesc);
+cudnnStatus_t cudnnDestroyPoolingDescriptor(
+    cudnnPoolingDescriptor_t poolingDesc);
+cudnnStatus_t cudnnGetPooling2dForwardOutputDim(
+    const cudnnPoolingDescriptor_t poolingDesc,
+    const cudnnTensorDescriptor_t inputTensorDesc,
+    int *n, int *c, int *h, int *w);
+cudnnStatus_t cudnnPoolingForward(
+    cudnnHandle_t handle,
+    const cudnnPoolingDescriptor_t poolingDesc,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t xDesc,
+    const intptr_t x,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t yDesc,
+    intptr_t y);
+cudnnStatus_t cudnnPoolingBackward(
+    cudnnHandle_t handle,
+    const cudnnPoolingDescriptor_t poolingDesc,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t yDesc,
+    const intptr_t y,
+    const cudnnTensorDescriptor_t dyDesc,
+    const intptr_t dy,
+    const cudnnTensorDescriptor_t xDesc,
+    const intptr_t x,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t dxDesc,
+    intptr_t dx);
+"""
 
-    src24 = """
-    cudnnStatus_t cudnnSetFilter4dDescriptor(
-        cudnnFilterDescriptor_t filterDesc,
-        cudnnDataType_t dataType,
-        int k, int c, int h, int w);
-
-    cudnnStatus_t cudnnSetPooling2dDescriptor(
-        cudnnPoolingDescriptor_t poolingDesc,
-        cudnnPoolingMode_t mode,
-        int windowHeight,
-        int windowWidth,
-        int verticalPadding,
-        int horizontalPadding,
-        int verticalStride,
-        int horizontalStride);
-    """
+# softmax
+_SRC_SOFTMAX = """
+cudnnStatus_t cudnnSoftmaxForward(
+    cudnnHandle_t handle,
+    cudnnSoftmaxAlgorithm_t algo,
+    cudnnSoftmaxMode_t mode,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t xDesc,
+    const intptr_t x,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t yDesc,
+    intptr_t y);
+cudnnStatus_t cudnnSoftmaxBackward(
+    cudnnHandle_t handle,
+    cudnnSoftmaxAlgorithm_t algo,
+    cudnnSoftmaxMode_t mode,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t yDesc,
+    const intptr_t y,
+    const cudnnTensorDescriptor_t dyDesc,
+    const intptr_t dy,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t dxDesc,
+    intptr_t dx);
+"""
 
-    src5 = """
-    typedef size_t cudnnRNNDescriptor_t;
-    typedef size_t cudnnDropoutDescriptor_t;
-    typedef int cudnnNanPropagation_t;
-    typedef int cudnnRNNInputMode_t;
-    typedef int cudnnDirectionMode_t;
-    typedef int cudnnRNNMode_t;
-
-    cudnnStatus_t cudnnSetFilter4dDescriptor(
-        cudnnFilterDescriptor_t filterDesc,
-        cudnnDataType_t dataType,
-        cudnnTensorFormat_t format,
-        int k, int c, int h, int w);
-    cudnnStatus_t cudnnGetFilter4dDescriptor(
-        const cudnnFilterDescriptor_t filterDesc,
-        cudnnDataType_t *dataType,
-        cudnnTensorFormat_t *format,
-        int *k, int *c, int *h, int *w);
-    cudnnStatus_t cudnnSetFilterNdDescriptor(
-        cudnnFilterDescriptor_t filterDesc,
-        cudnnDataType_t dataType,
-        cudnnTensorFormat_t format,
-        int nbDims,
-        const int *filterDimA);
-    cudnnStatus_t cudnnGetFilterNdDescriptor(
-        const cudnnFilterDescriptor_t filterDesc,
-        int nbDimsRequested,
-        cudnnDataType_t *dataType,
-        cudnnTensorFormat_t *format,
-        int *nbDims,
-        int *filterDimA);
-
-    cudnnStatus_t cudnnSetPooling2dDescriptor(
-        cudnnPoolingDescriptor_t poolingDesc,
-        cudnnPoolingMode_t mode,
-        cudnnNanPropagation_t maxpoolingNanOpt,
-        int windowHeight,
-        int windowWidth,
-        int verticalPadding,
-        int horizontalPadding,
-        int verticalStride,
-        int horizontalStride);
-
-    cudnnStatus_t cudnnCreateDropoutDescriptor(
-        cudnnDropoutDescriptor_t *dropoutDesc);
-    cudnnStatus_t cudnnDestroyDropoutDescriptor(
-        cudnnDropoutDescriptor_t dropoutDesc);
-    cudnnStatus_t cudnnDropoutGetStatesSize(
-        cudnnHandle_t handle, size_t *sizeInBytes);
-    cudnnStatus_t cudnnDropoutGetReserveSpaceSize(
-        cudnnTensorDescriptor_t xdesc, size_t *sizeInBytes);
-    cudnnStatus_t cudnnSetDropoutDescriptor(
-        cudnnDropoutDescriptor_t dropoutDesc,
-        cudnnHandle_t handle,
-        float dropout,
-        intptr_t states,
-        size_t stateSizeInBytes,
-        unsigned long long seed);
-    cudnnStatus_t cudnnDropoutForward(
-        cudnnHandle_t handle,
-        const cudnnDropoutDescriptor_t dropoutDesc,
-        const cudnnTensorDescriptor_t xdesc,
-        const intptr_t x,
-        const cudnnTensorDescriptor_t ydesc,
-        intptr_t y,
-        intptr_t reserveSpace,
-        size_t reserveSpaceSizeInBytes);
-    cudnnStatus_t cudnnDropoutBackward(
-        cudnnHandle_t handle,
-        const cudnnDropoutDescriptor_t dropoutDesc,
-        const cudnnTensorDescriptor_t dydesc,
-        const intptr_t dy,
-        const cudnnTensorDescriptor_t dxdesc,
-        intptr_t dx,
-        intptr_t reserveSpace,
-        size_t reserveSpaceSizeInBytes);
-
-    cudnnStatus_t cudnnCreateRNNDescriptor(cudnnRNNDescriptor_t *rnnDesc);
-    cudnnStatus_t cudnnDestroyRNNDescriptor(cudnnRNNDescriptor_t rnnDesc);
-    cudnnStatus_t cudnnSetRNNDescriptor(
-        cudnnRNNDescriptor_t rnnDesc,
-        int hiddenSize,
-        int numLayers,
-        cudnnDropoutDescriptor_t dropoutDesc,
-        cudnnRNNInputMode_t inputMode,
-        cudnnDirectionMode_t direction,
-        cudnnRNNMode_t mode,
-        cudnnDataType_t dataType);
-    cudnnStatus_t cudnnGetRNNWorkspaceSize(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *xDesc,
-        size_t *sizeInBytes);
-    cudnnStatus_t cudnnGetRNNTrainingReserveSize(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *xDesc,
-        size_t *sizeInBytes);
-    cudnnStatus_t cudnnGetRNNParamsSize(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const cudnnTensorDescriptor_t xDesc,
-        size_t *sizeInBytes,
-        cudnnDataType_t dataType);
-    cudnnStatus_t cudnnGetRNNLinLayerMatrixParams(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int layer,
-        const cudnnTensorDescriptor_t xDesc,
-        const cudnnFilterDescriptor_t wDesc,
-        const intptr_t w,
-        const int linLayerID,
-        cudnnFilterDescriptor_t linLayerMatDesc,
-        intptr_t *linLayerMat);
-    cudnnStatus_t cudnnGetRNNLinLayerBiasParams(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int layer,
-        const cudnnTensorDescriptor_t xDesc,
-        const cudnnFilterDescriptor_t wDesc,
-        const intptr_t w,
-        const int linLayerID,
-        cudnnFilterDescriptor_t linLayerBiasDesc,
-        intptr_t *linLayerBias);
-    cudnnStatus_t cudnnRNNForwardInference(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *xDesc,
-        const intptr_t x,
-        const cudnnTensorDescriptor_t hxDesc,
-        const intptr_t hx,
-        const cudnnTensorDescriptor_t cxDesc,
-        const intptr_t cx,
-        const cudnnFilterDescriptor_t wDesc,
-        const intptr_t w,
-        const cudnnTensorDescriptor_t *yDesc,
-        intptr_t y,
-        const cudnnTensorDescriptor_t hyDesc,
-        intptr_t hy,
-        const cudnnTensorDescriptor_t cyDesc,
-        intptr_t cy,
-        intptr_t workspace,
-        size_t workSpaceSizeInBytes);
-    cudnnStatus_t cudnnRNNForwardTraining(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *xDesc,
-        const intptr_t x,
-        const cudnnTensorDescriptor_t hxDesc,
-        const intptr_t hx,
-        const cudnnTensorDescriptor_t cxDesc,
-        const intptr_t cx,
-        const cudnnFilterDescriptor_t wDesc,
-        const intptr_t w,
-        const cudnnTensorDescriptor_t *yDesc,
-        intptr_t y,
-        const cudnnTensorDescriptor_t hyDesc,
-        intptr_t hy,
-        const cudnnTensorDescriptor_t cyDesc,
-        intptr_t cy,
-        intptr_t workspace,
-        size_t workSpaceSizeInBytes,
-        intptr_t reserveSpace,
-        size_t reserveSpaceSizeInBytes);
-    cudnnStatus_t cudnnRNNBackwardData(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *yDesc,
-        const intptr_t y,
-        const cudnnTensorDescriptor_t *dyDesc,
-        const intptr_t dy,
-        const cudnnTensorDescriptor_t dhyDesc,
-        const intptr_t dhy,
-        const cudnnTensorDescriptor_t dcyDesc,
-        const intptr_t dcy,
-        const cudnnFilterDescriptor_t wDesc,
-        const intptr_t w,
-        const cudnnTensorDescriptor_t hxDesc,
-        const intptr_t hx,
-        const cudnnTensorDescriptor_t cxDesc,
-        const intptr_t cx,
-        const cudnnTensorDescriptor_t *dxDesc,
-        intptr_t dx,
-        const cudnnTensorDescriptor_t dhxDesc,
-        intptr_t dhx,
-        const cudnnTensorDescriptor_t dcxDesc,
-        intptr_t dcx,
-        intptr_t workspace,
-        size_t workSpaceSizeInBytes,
-        const intptr_t reserveSpace,
-        size_t reserveSpaceSizeInBytes);
-    cudnnStatus_t cudnnRNNBackwardWeights(
-        cudnnHandle_t handle,
-        const cudnnRNNDescriptor_t rnnDesc,
-        const int seqLength,
-        const cudnnTensorDescriptor_t *xDesc,
-        const intptr_t x,
-        const cudnnTensorDescriptor_t hxDesc,
-        const intptr_t hx,
-        const cudnnTensorDescriptor_t *yDesc,
-        const intptr_t y,
-        const intptr_t workspace,
-        size_t workSpaceSizeInBytes,
-        const cudnnFilterDescriptor_t dwDesc,
-        intptr_t dw,
-        const intptr_t reserveSpace,
-        size_t reserveSpaceSizeInBytes);
-    """
+# specific functions for V2
+_SRC2 = """
+cudnnStatus_t cudnnConvolutionBackwardFilter(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t srcDesc,
+    const intptr_t srcData,
+    const cudnnTensorDescriptor_t diffDesc,
+    const intptr_t diffData,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const intptr_t beta,
+    const cudnnFilterDescriptor_t gradDesc,
+    intptr_t gradData);
+
+cudnnStatus_t cudnnConvolutionBackwardData(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnFilterDescriptor_t filterDesc,
+    const intptr_t filterData,
+    const cudnnTensorDescriptor_t diffDesc,
+    const intptr_t diffData,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t gradDesc,
+    intptr_t gradData);
+"""
+
+# specific functions for V4+
+_SRC4P = """
+cudnnStatus_t cudnnGetConvolutionBackwardFilterAlgorithm(
+    cudnnHandle_t handle,
+    const cudnnTensorDescriptor_t xDesc,
+    const cudnnTensorDescriptor_t dyDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnFilterDescriptor_t dwDesc,
+    cudnnConvolutionBwdFilterPreference_t preference,
+    size_t memoryLimitInBytes,
+    cudnnConvolutionBwdFilterAlgo_t *algo);
+cudnnStatus_t cudnnGetConvolutionBackwardFilterWorkspaceSize(
+    cudnnHandle_t handle,
+    const cudnnTensorDescriptor_t xDesc,
+    const cudnnTensorDescriptor_t dyDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnFilterDescriptor_t gradDesc,
+    cudnnConvolutionBwdFilterAlgo_t algo,
+    size_t *sizeInBytes);
+cudnnStatus_t cudnnConvolutionBackwardFilter(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnTensorDescriptor_t srcDesc,
+    const intptr_t srcData,
+    const cudnnTensorDescriptor_t diffDesc,
+    const intptr_t diffData,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnConvolutionBwdFilterAlgo_t algo,
+    intptr_t workSpace,
+    size_t workSpaceSizeInBytes,
+    const intptr_t beta,
+    const cudnnFilterDescriptor_t gradDesc,
+    intptr_t gradData);
+
+cudnnStatus_t cudnnGetConvolutionBackwardDataAlgorithm(
+    cudnnHandle_t handle,
+    const cudnnFilterDescriptor_t wDesc,
+    const cudnnTensorDescriptor_t dyDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnTensorDescriptor_t dxDesc,
+    cudnnConvolutionBwdDataPreference_t preference,
+    size_t memoryLimitInBytes,
+    cudnnConvolutionBwdDataAlgo_t *algo);
+cudnnStatus_t cudnnGetConvolutionBackwardDataWorkspaceSize(
+    cudnnHandle_t handle,
+    const cudnnFilterDescriptor_t wDesc,
+    const cudnnTensorDescriptor_t dyDesc,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnTensorDescriptor_t dxDesc,
+    cudnnConvolutionBwdDataAlgo_t algo,
+    size_t *sizeInBytes);
+cudnnStatus_t cudnnConvolutionBackwardData(
+    cudnnHandle_t handle,
+    const intptr_t alpha,
+    const cudnnFilterDescriptor_t filterDesc,
+    const intptr_t filterData,
+    const cudnnTensorDescriptor_t diffDesc,
+    const intptr_t diffData,
+    const cudnnConvolutionDescriptor_t convDesc,
+    const cudnnConvolutionBwdDataAlgo_t algo,
+    intptr_t workSpace,
+    size_t workSpaceSizeInBytes,
+    const intptr_t beta,
+    const cudnnTensorDescriptor_t gradDesc,
+    intptr_t gradData);
+"""
+
+# specific functions for V2 and V4
+_SRC24 = """
+cudnnStatus_t cudnnSetFilter4dDescriptor(
+    cudnnFilterDescriptor_t filterDesc,
+    cudnnDataType_t dataType,
+    int k, int c, int h, int w);
+
+cudnnStatus_t cudnnSetPooling2dDescriptor(
+    cudnnPoolingDescriptor_t poolingDesc,
+    cudnnPoolingMode_t mode,
+    int windowHeight,
+    int windowWidth,
+    int verticalPadding,
+    int horizontalPadding,
+    int verticalStride,
+    int horizontalStride);
+"""
 
-    # Parse
+# specific functions for V5
+_SRC5 = """
+cudnnStatus_t cudnnSetFilter4dDescriptor(
+    cudnnFilterDescriptor_t filterDesc,
+    cudnnDataType_t dataType,
+    cudnnTensorFormat_t format,
+    int k, int c, int h, int w);
+cudnnStatus_t cudnnGetFilter4dDescriptor(
+    const cudnnFilterDescriptor_t filterDesc,
+    cudnnDataType_t *dataType,
+    cudnnTensorFormat_t *format,
+    int *k, int *c, int *h, int *w);
+cudnnStatus_t cudnnSetFilterNdDescriptor(
+    cudnnFilterDescriptor_t filterDesc,
+    cudnnDataType_t dataType,
+    cudnnTensorFormat_t format,
+    int nbDims,
+    const int *filterDimA);
+cudnnStatus_t cudnnGetFilterNdDescriptor(
+    const cudnnFilterDescriptor_t filterDesc,
+    int nbDimsRequested,
+    cudnnDataType_t *dataType,
+    cudnnTensorFormat_t *format,
+    int *nbDims,
+    int *filterDimA);
+
+cudnnStatus_t cudnnSetPooling2dDescriptor(
+    cudnnPoolingDescriptor_t poolingDesc,
+    cudnnPoolingMode_t mode,
+    cudnnNanPropagation_t maxpoolingNanOpt,
+    int windowHeight,
+    int windowWidth,
+    int verticalPadding,
+    int horizontalPadding,
+    int verticalStride,
+    int horizontalStride);
+"""
+
+# dropout (V5)
+_SRC5_DROPOUT = """
+cudnnStatus_t cudnnCreateDropoutDescriptor(
+    cudnnDropoutDescriptor_t *dropoutDesc);
+cudnnStatus_t cudnnDestroyDropoutDescriptor(
+    cudnnDropoutDescriptor_t dropoutDesc);
+cudnnStatus_t cudnnDropoutGetStatesSize(
+    cudnnHandle_t handle, size_t *sizeInBytes);
+cudnnStatus_t cudnnDropoutGetReserveSpaceSize(
+    cudnnTensorDescriptor_t xdesc, size_t *sizeInBytes);
+cudnnStatus_t cudnnSetDropoutDescriptor(
+    cudnnDropoutDescriptor_t dropoutDesc,
+    cudnnHandle_t handle,
+    float dropout,
+    intptr_t states,
+    size_t stateSizeInBytes,
+    unsigned long long seed);
+cudnnStatus_t cudnnDropoutForward(
+    cudnnHandle_t handle,
+    const cudnnDropoutDescriptor_t dropoutDesc,
+    const cudnnTensorDescriptor_t xdesc,
+    const intptr_t x,
+    const cudnnTensorDescriptor_t ydesc,
+    intptr_t y,
+    intptr_t reserveSpace,
+    size_t reserveSpaceSizeInBytes);
+cudnnStatus_t cudnnDropoutBackward(
+    cudnnHandle_t handle,
+    const cudnnDropoutDescriptor_t dropoutDesc,
+    const cudnnTensorDescriptor_t dydesc,
+    const intptr_t dy,
+    const cudnnTensorDescriptor_t dxdesc,
+    intptr_t dx,
+    intptr_t reserveSpace,
+    size_t reserveSpaceSizeInBytes);
+"""
+
+# RNN (V5)
+_SRC5_RNN = """
+cudnnStatus_t cudnnCreateRNNDescriptor(cudnnRNNDescriptor_t *rnnDesc);
+cudnnStatus_t cudnnDestroyRNNDescriptor(cudnnRNNDescriptor_t rnnDesc);
+cudnnStatus_t cudnnSetRNNDescriptor(
+    cudnnRNNDescriptor_t rnnDesc,
+    int hiddenSize,
+    int numLayers,
+    cudnnDropoutDescriptor_t dropoutDesc,
+    cudnnRNNInputMode_t inputMode,
+    cudnnDirectionMode_t direction,
+    cudnnRNNMode_t mode,
+    cudnnDataType_t dataType);
+cudnnStatus_t cudnnGetRNNWorkspaceSize(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *xDesc,
+    size_t *sizeInBytes);
+cudnnStatus_t cudnnGetRNNTrainingReserveSize(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *xDesc,
+    size_t *sizeInBytes);
+cudnnStatus_t cudnnGetRNNParamsSize(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const cudnnTensorDescriptor_t xDesc,
+    size_t *sizeInBytes,
+    cudnnDataType_t dataType);
+cudnnStatus_t cudnnGetRNNLinLayerMatrixParams(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int layer,
+    const cudnnTensorDescriptor_t xDesc,
+    const cudnnFilterDescriptor_t wDesc,
+    const intptr_t w,
+    const int linLayerID,
+    cudnnFilterDescriptor_t linLayerMatDesc,
+    intptr_t *linLayerMat);
+cudnnStatus_t cudnnGetRNNLinLayerBiasParams(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int layer,
+    const cudnnTensorDescriptor_t xDesc,
+    const cudnnFilterDescriptor_t wDesc,
+    const intptr_t w,
+    const int linLayerID,
+    cudnnFilterDescriptor_t linLayerBiasDesc,
+    intptr_t *linLayerBias);
+cudnnStatus_t cudnnRNNForwardInference(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *xDesc,
+    const intptr_t x,
+    const cudnnTensorDescriptor_t hxDesc,
+    const intptr_t hx,
+    const cudnnTensorDescriptor_t cxDesc,
+    const intptr_t cx,
+    const cudnnFilterDescriptor_t wDesc,
+    const intptr_t w,
+    const cudnnTensorDescriptor_t *yDesc,
+    intptr_t y,
+    const cudnnTensorDescriptor_t hyDesc,
+    intptr_t hy,
+    const cudnnTensorDescriptor_t cyDesc,
+    intptr_t cy,
+    intptr_t workspace,
+    size_t workSpaceSizeInBytes);
+cudnnStatus_t cudnnRNNForwardTraining(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *xDesc,
+    const intptr_t x,
+    const cudnnTensorDescriptor_t hxDesc,
+    const intptr_t hx,
+    const cudnnTensorDescriptor_t cxDesc,
+    const intptr_t cx,
+    const cudnnFilterDescriptor_t wDesc,
+    const intptr_t w,
+    const cudnnTensorDescriptor_t *yDesc,
+    intptr_t y,
+    const cudnnTensorDescriptor_t hyDesc,
+    intptr_t hy,
+    const cudnnTensorDescriptor_t cyDesc,
+    intptr_t cy,
+    intptr_t workspace,
+    size_t workSpaceSizeInBytes,
+    intptr_t reserveSpace,
+    size_t reserveSpaceSizeInBytes);
+cudnnStatus_t cudnnRNNBackwardData(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *yDesc,
+    const intptr_t y,
+    const cudnnTensorDescriptor_t *dyDesc,
+    const intptr_t dy,
+    const cudnnTensorDescriptor_t dhyDesc,
+    const intptr_t dhy,
+    const cudnnTensorDescriptor_t dcyDesc,
+    const intptr_t dcy,
+    const cudnnFilterDescriptor_t wDesc,
+    const intptr_t w,
+    const cudnnTensorDescriptor_t hxDesc,
+    const intptr_t hx,
+    const cudnnTensorDescriptor_t cxDesc,
+    const intptr_t cx,
+    const cudnnTensorDescriptor_t *dxDesc,
+    intptr_t dx,
+    const cudnnTensorDescriptor_t dhxDesc,
+    intptr_t dhx,
+    const cudnnTensorDescriptor_t dcxDesc,
+    intptr_t dcx,
+    intptr_t workspace,
+    size_t workSpaceSizeInBytes,
+    const intptr_t reserveSpace,
+    size_t reserveSpaceSizeInBytes);
+cudnnStatus_t cudnnRNNBackwardWeights(
+    cudnnHandle_t handle,
+    const cudnnRNNDescriptor_t rnnDesc,
+    const int seqLength,
+    const cudnnTensorDescriptor_t *xDesc,
+    const intptr_t x,
+    const cudnnTensorDescriptor_t hxDesc,
+    const intptr_t hx,
+    const cudnnTensorDescriptor_t *yDesc,
+    const intptr_t y,
+    const intptr_t workspace,
+    size_t workSpaceSizeInBytes,
+    const cudnnFilterDescriptor_t dwDesc,
+    intptr_t dw,
+    const intptr_t reserveSpace,
+    size_t reserveSpaceSizeInBytes);
+"""
+
+
+#: Feature specific C definitions to add to _SRC
+FEATURES = (_SRC_CONV, _SRC_POOLING, _SRC_SOFTMAX)
+
+
+#: Version specific C definitions to add to _SRC and FEATURES:
+#: (min version, variant name, sources),
+#: prebuilt modules are named _cudnn_<variant name>_ffi (see _ffi_build.py)
+VARIANTS = ((5000, "v5", (_SRC4P, _SRC5, _SRC5_DROPOUT, _SRC5_RNN)),
+            (4000, "v4", (_SRC4P, _SRC24)),
+            (0, "v2", (_SRC2, _SRC24)))
+
+
+def _initialize(backends):
+    global lib
+    if lib is not None:
+        return
+    # Parse (common definitions are enough to get the version),
+    # all variants of the prebuilt modules are built together
     global ffi
-    ffi = cffi.FFI()
-    ffi.cdef(src)
+    ffi = cuffi.prebuilt_ffi("cuda4py._impl.cudnn._cudnn_v5_ffi")
+    parsed = ffi is None
+    if parsed:
+        ffi = cffi.FFI()
+        ffi.cdef(_SRC)
 
     # Load library
     for libnme in backends:
@@ -714,15 +751,16 @@ def _initialize(backends):
 
     global cudnn_version
     cudnn_version = lib.cudnnGetVersion()
-    if cudnn_version < 4000:
-        ffi.cdef(src2)  # specific functions for V2
-        ffi.cdef(src24)  # specific functions for V2 and V4
-    else:
-        ffi.cdef(src4p)  # specific functions for V4+
-        if cudnn_version < 5000:
-            ffi.cdef(src24)  # specific functions for V2 and V4
-        else:
-            ffi.cdef(src5)  # specific functions for V5
+    for min_version, variant, srcs in VARIANTS:
+        if cudnn_version >= min_version:
+            break
+    if parsed:
+        lib = cuffi.LazyLib(ffi, lib, FEATURES + srcs)
+    elif variant != "v5":
+        ffi = cuffi.prebuilt_ffi(
+            "cuda4py._impl.cudnn._cudnn_%s_ffi" % variant)
+        lib = ffi.dlopen(libnme)
+    lib = cuffi.instrumented(lib)
 
     global ERRORS
     for code, msg in ERRORS.items():
@@ -742,4 +780,4 @@ def initialize(backends=("libcudnn.so", "cudnn64_65.dll")):
     if lib is not None:
         return
     with cuffi.lock:
-        _initialize(backends)
+        _initialize(cuffi.get_backends(backends))
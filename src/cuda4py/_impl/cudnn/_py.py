@@ -602,6 +602,19 @@ class CUDNN(object):
     def context(self):
         return self._context
 
+    def set_stream(self, stream=None):
+        """Sets the stream used by the subsequent cuDNN calls.
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle),
+                    None for the NULL stream.
+        """
+        err = self._lib.cudnnSetStream(
+            self.handle, 0 if stream is None else stream)
+        if err:
+            raise CU.error("cudnnSetStream", err)
+        self._stream = stream  # to hold the reference
+
     @staticmethod
     def get_convolution_2d_forward_output_dim(conv_desc, input_desc,
                                               filter_desc):
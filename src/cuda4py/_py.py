@@ -36,12 +36,14 @@ Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
 """
 Helper classes.
 """
+import bisect
 import cuda4py._cffi as cu
 import gc
 import os
 import subprocess
 import sys
 import tempfile
+import threading
 
 
 class CUDARuntimeError(RuntimeError):
@@ -239,6 +241,13 @@ class Memory(CU):
         """
         return self._flags
 
+    @property
+    def __cuda_array_interface__(self):
+        """Exports the allocation as one-dimensional array of bytes.
+        """
+        return {"shape": (self.size,), "typestr": "|u1",
+                "data": (self.handle, False), "version": 3}
+
     def to_host(self, host_array, offs=0, size=None):
         """Copies memory from device to host.
 
@@ -254,6 +263,34 @@ class Memory(CU):
         if err:
             raise CU.error("cuMemcpyDtoH_v2", err)
 
+    def to_host_async(self, host_array, offs=0, size=None, stream=None,
+                      event=None):
+        """Copies memory from device to host.
+
+        The function will NOT block, host_array should be page-locked
+        (MemHostAlloc or registered) for the copy to be truly asynchronous
+        and must not be accessed until the copy completes.
+
+        Parameters:
+            host_array: host array to copy to (numpy, cffi handle or int).
+            offs: offset from the device memory base in bytes.
+            size: size of the memory to copy in bytes.
+            stream: compute stream (Stream instance or it's handle).
+            event: Event instance to record in the stream after the copy.
+
+        Returns:
+            event.
+        """
+        ptr, size = CU.extract_ptr_and_size(host_array, size)
+        err = self._lib.cuMemcpyDtoHAsync_v2(
+            ptr, self.handle + offs, size,
+            0 if stream is None else stream)
+        if err:
+            raise CU.error("cuMemcpyDtoHAsync_v2", err)
+        if event is not None:
+            event.record(stream)
+        return event
+
     def to_device(self, host_array, offs=0, size=None):
         """Copies memory from host to device.
 
@@ -269,7 +306,8 @@ class Memory(CU):
         if err:
             raise CU.error("cuMemcpyHtoD_v2", err)
 
-    def to_device_async(self, host_array, offs=0, size=None, stream=None):
+    def to_device_async(self, host_array, offs=0, size=None, stream=None,
+                        event=None):
         """Copies memory from host to device.
 
         The function will NOT block.
@@ -278,7 +316,11 @@ class Memory(CU):
             host_array: host array to copy from (numpy, cffi handle or int).
             offs: offset from the device memory base in bytes.
             size: size of the memory to copy in bytes.
-            stream: compute stream.
+            stream: compute stream (Stream instance or it's handle).
+            event: Event instance to record in the stream after the copy.
+
+        Returns:
+            event.
         """
         ptr, size = CU.extract_ptr_and_size(host_array, size)
         err = self._lib.cuMemcpyHtoDAsync_v2(
@@ -286,6 +328,9 @@ class Memory(CU):
             0 if stream is None else stream)
         if err:
             raise CU.error("cuMemcpyHtoDAsync_v2", err)
+        if event is not None:
+            event.record(stream)
+        return event
 
     def from_device_async(self, src, dst_offs=0, size=None, stream=None):
         """Copies memory from device to device.
@@ -297,7 +342,7 @@ class Memory(CU):
             dst_offs: offset from this device memory base in bytes.
             size: size of the memory to copy in bytes
                   (defaults to this buffer size - dst_offs).
-            stream: compute stream.
+            stream: compute stream (Stream instance or it's handle).
         """
         err = self._lib.cuMemcpyDtoDAsync_v2(
             self.handle + dst_offs, int(src),
@@ -306,6 +351,39 @@ class Memory(CU):
         if err:
             raise CU.error("cuMemcpyDtoDAsync_v2", err)
 
+    def from_peer_async(self, src, dst_offs=0, size=None, stream=None,
+                        src_offs=0, src_context=None):
+        """Copies memory from the device buffer of another context
+        (possibly on another device).
+
+        The function will NOT block, the copy goes directly over NVLink
+        or PCIe if the peer access is supported, see
+        Context.enable_peer_access(), and is staged through the host
+        otherwise.
+
+        Parameters:
+            src: source device buffer to copy memory from (Memory, int).
+            dst_offs: offset from this device memory base in bytes.
+            size: size of the memory to copy in bytes
+                  (defaults to this buffer size - dst_offs).
+            stream: compute stream (Stream instance or it's handle).
+            src_offs: offset from the source device memory base in bytes.
+            src_context: Context of src (defaults to src.context,
+                         required when src is a device pointer).
+        """
+        if src_context is None:
+            if not isinstance(src, Memory):
+                raise ValueError(
+                    "src_context is required when src is a device pointer")
+            src_context = src.context
+        err = self._lib.cuMemcpyPeerAsync(
+            self.handle + dst_offs, self.context.handle,
+            int(src) + src_offs, src_context.handle,
+            self.size - dst_offs if size is None else size,
+            0 if stream is None else stream)
+        if err:
+            raise CU.error("cuMemcpyPeerAsync", err)
+
     def memset32_async(self, value=0, offs=0, size=None, stream=None):
         """Sets memory object with 32-bit integer value.
 
@@ -315,7 +393,7 @@ class Memory(CU):
             value: value to set with.
             offs: offset from the device memory base in 32-bit elements.
             size: size of device memory to set in 32-bit elements.
-            stream: compute stream.
+            stream: compute stream (Stream instance or it's handle).
         """
         err = self._lib.cuMemsetD32Async(
             self.handle + (offs << 2), value,
@@ -327,7 +405,7 @@ class Memory(CU):
     def memcpy_3d_async(self, src_origin, dst_origin, region,
                         src_pitch=0, src_height=0,
                         dst_pitch=0, dst_height=0,
-                        src=None, dst=None, stream=None):
+                        src=None, dst=None, stream=None, event=None):
         """Copies memory for 3D arrays.
 
         The function will NOT block.
@@ -342,13 +420,19 @@ class Memory(CU):
             dst_height: the height of each destination 2D slice.
             src: source:
                 None - use self as the source,
+                MemHostAlloc - use as the host buffer,
                 convertible to int - use as the device buffer address,
                 numpy array - use as the host buffer address.
             dst: destination:
                 None - use self as the destination,
+                MemHostAlloc - use as the host buffer,
                 convertible to int - use as the device buffer address,
                 numpy array - use as the host buffer address.
-            stream: compute stream.
+            stream: compute stream (Stream instance or it's handle).
+            event: Event instance to record in the stream after the copy.
+
+        Returns:
+            event.
         """
         p_copy = cu.ffi.new("CUDA_MEMCPY3D *")
 
@@ -373,33 +457,38 @@ class Memory(CU):
                             else dst_origin[1] + region[1])
 
         if src is None:
-            p_copy.srcDevice = self.handle
-            p_copy.srcMemoryType = cu.CU_MEMORYTYPE_DEVICE
+            src = self
+        arr = getattr(src, "__array_interface__", None)
+        if arr is not None:
+            p_copy.srcHost = arr["data"][0]
+            p_copy.srcMemoryType = cu.CU_MEMORYTYPE_HOST
+        elif isinstance(src, MemHostAlloc):
+            p_copy.srcHost = src.handle
+            p_copy.srcMemoryType = cu.CU_MEMORYTYPE_HOST
         else:
-            arr = getattr(src, "__array_interface__", None)
-            if arr is None:
-                p_copy.srcDevice = int(src)
-                p_copy.srcMemoryType = cu.CU_MEMORYTYPE_DEVICE
-            else:
-                p_copy.srcHost = arr["data"][0]
-                p_copy.srcMemoryType = cu.CU_MEMORYTYPE_HOST
+            p_copy.srcDevice = int(src)
+            p_copy.srcMemoryType = cu.CU_MEMORYTYPE_DEVICE
 
         if dst is None:
-            p_copy.dstDevice = self.handle
-            p_copy.dstMemoryType = cu.CU_MEMORYTYPE_DEVICE
+            dst = self
+        arr = getattr(dst, "__array_interface__", None)
+        if arr is not None:
+            p_copy.dstHost = arr["data"][0]
+            p_copy.dstMemoryType = cu.CU_MEMORYTYPE_HOST
+        elif isinstance(dst, MemHostAlloc):
+            p_copy.dstHost = dst.handle
+            p_copy.dstMemoryType = cu.CU_MEMORYTYPE_HOST
         else:
-            arr = getattr(dst, "__array_interface__", None)
-            if arr is None:
-                p_copy.dstDevice = int(dst)
-                p_copy.dstMemoryType = cu.CU_MEMORYTYPE_DEVICE
-            else:
-                p_copy.dstHost = arr["data"][0]
-                p_copy.dstMemoryType = cu.CU_MEMORYTYPE_HOST
+            p_copy.dstDevice = int(dst)
+            p_copy.dstMemoryType = cu.CU_MEMORYTYPE_DEVICE
 
         err = self._lib.cuMemcpy3DAsync_v2(
             p_copy, 0 if stream is None else stream)
         if err:
             raise CU.error("cuMemcpy3DAsync_v2", err)
+        if event is not None:
+            event.record(stream)
+        return event
 
     def _release_mem(self):
         """Do actual memory release in child class.
@@ -471,6 +560,299 @@ class MemAlloc(Memory):
         self._lib.cuMemFree_v2(self.handle)
 
 
+class PooledMemAlloc(MemAlloc):
+    """Allocates memory from the caching pool of the context
+    (see Context.enable_mem_pool).
+
+    The memory is returned to the pool on release
+    instead of calling cuMemFree.
+
+    Attributes:
+        handle: pointer in the device address space (int).
+        stream: the stream the memory is going to be used on.
+    """
+    def __init__(self, context, size_or_ndarray, stream=None):
+        self._pool = None
+        self._stream = 0 if stream is None else int(stream)
+        super(PooledMemAlloc, self).__init__(context, size_or_ndarray)
+
+    @property
+    def stream(self):
+        return self._stream
+
+    def _device_alloc(self):
+        pool = self.context.mem_pool
+        if pool is None:
+            raise ValueError("Memory pool is not enabled for the context")
+        self._handle = pool.malloc(self.size, self.stream)
+        self._pool = pool
+
+    def _release_mem(self):
+        self._pool.free(self.handle)
+
+
+class _Block(object):
+    """Part of the device memory segment allocated by MemoryPool.
+    """
+    __slots__ = ("ptr", "size", "segment", "stream", "small",
+                 "prev", "next", "free")
+
+    def __init__(self, ptr, size, segment, stream, small):
+        self.ptr = ptr
+        self.size = size
+        self.segment = segment
+        self.stream = stream
+        self.small = small
+        self.prev = None
+        self.next = None
+        self.free = True
+
+
+class MemoryPool(object):
+    """Caching allocator of the device memory.
+
+    Device memory is requested from the driver in segments
+    (SMALL_SEGMENT bytes for allocations up to SMALL_SIZE,
+    allocation size rounded up to LARGE_ROUND otherwise),
+    which are split into blocks on allocation and coalesced back on free.
+    Free blocks are kept in the bins by size class (bit length of the size)
+    and are reused only for the same stream, so the reuse is stream-ordered.
+
+    Attributes:
+        context: Context the memory is allocated in.
+        release_threshold: amount of cached (free) bytes above which
+                           completely free segments are returned
+                           to the driver on free (None - never).
+    """
+    ROUND = 512
+    SMALL_SIZE = 1 << 20
+    SMALL_SEGMENT = 2 << 20
+    LARGE_ROUND = 2 << 20
+
+    def __init__(self, context, release_threshold=None):
+        self._lib = cu.lib  # to hold the reference
+        self._context = context
+        self.release_threshold = release_threshold
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self._pending = []  # frees deferred while the pool was busy
+        # (stream, small, size class) => sorted list of (size, ptr)
+        self._bins = {}
+        self._max_class = 0
+        self._free_blocks = {}  # ptr => _Block
+        self._used_blocks = {}  # ptr => _Block
+        self._segments = {}  # ptr => size
+        self._allocated = 0
+        self._reserved = 0
+        self._peak = 0
+        self._n_allocs = 0
+        self._n_frees = 0
+        self._n_hits = 0
+        self._n_driver_allocs = 0
+        self._n_driver_frees = 0
+
+    @property
+    def context(self):
+        return self._context
+
+    @staticmethod
+    def round_size(size):
+        """Returns size rounded up to the allocation granularity.
+        """
+        size = max(int(size), 1)
+        return ((size + MemoryPool.ROUND - 1) // MemoryPool.ROUND *
+                MemoryPool.ROUND)
+
+    @property
+    def stats(self):
+        """Returns dictionary with the usage statistics.
+        """
+        with self._lock:
+            self._tls.busy = True
+            try:
+                self._free_pending()
+            finally:
+                self._tls.busy = False
+            return {
+                "allocated_bytes": self._allocated,
+                "reserved_bytes": self._reserved,
+                "cached_bytes": self._reserved - self._allocated,
+                "peak_allocated_bytes": self._peak,
+                "n_segments": len(self._segments),
+                "n_allocs": self._n_allocs,
+                "n_frees": self._n_frees,
+                "n_hits": self._n_hits,
+                "n_driver_allocs": self._n_driver_allocs,
+                "n_driver_frees": self._n_driver_frees}
+
+    def malloc(self, size, stream=0):
+        """Returns pointer to the device memory of at least size bytes.
+
+        Parameters:
+            size: size of the allocation in bytes.
+            stream: the stream the memory is going to be used on (int).
+        """
+        size = MemoryPool.round_size(size)
+        small = size <= MemoryPool.SMALL_SIZE
+        with self._lock:
+            self._tls.busy = True
+            try:
+                block = self._find_free(size, stream, small)
+                if block is None:
+                    block = self._new_segment(size, stream, small)
+                else:
+                    self._n_hits += 1
+                block.free = False
+                rest = block.size - size
+                if rest >= (MemoryPool.ROUND if small
+                            else MemoryPool.SMALL_SIZE + 1):
+                    tail = _Block(block.ptr + size, rest, block.segment,
+                                  stream, small)
+                    tail.prev = block
+                    tail.next = block.next
+                    if block.next is not None:
+                        block.next.prev = tail
+                    block.next = tail
+                    block.size = size
+                    self._insert_free(tail)
+                self._used_blocks[block.ptr] = block
+                self._allocated += block.size
+                self._peak = max(self._peak, self._allocated)
+                self._n_allocs += 1
+                self._free_pending()
+            finally:
+                self._tls.busy = False
+        return block.ptr
+
+    def free(self, ptr):
+        """Returns the memory previously obtained with malloc to the pool.
+        """
+        if getattr(self._tls, "busy", False):
+            # Called from the garbage collector while the pool is being
+            # modified on the same thread, defer it
+            self._pending.append(ptr)
+            return
+        with self._lock:
+            self._tls.busy = True
+            try:
+                self._free(ptr)
+                self._free_pending()
+            finally:
+                self._tls.busy = False
+
+    def empty_cache(self):
+        """Returns all completely free segments to the driver.
+        """
+        with self._lock:
+            self._tls.busy = True
+            try:
+                self._free_pending()
+                self._release_free_segments(0)
+            finally:
+                self._tls.busy = False
+
+    def _free_pending(self):
+        while len(self._pending):
+            self._free(self._pending.pop())
+
+    def _free(self, ptr):
+        block = self._used_blocks.pop(ptr)
+        self._allocated -= block.size
+        self._n_frees += 1
+        prev = block.prev
+        if prev is not None and prev.free:
+            self._remove_free(prev)
+            prev.size += block.size
+            prev.next = block.next
+            if block.next is not None:
+                block.next.prev = prev
+            block = prev
+        nxt = block.next
+        if nxt is not None and nxt.free:
+            self._remove_free(nxt)
+            block.size += nxt.size
+            block.next = nxt.next
+            if nxt.next is not None:
+                nxt.next.prev = block
+        block.free = True
+        self._insert_free(block)
+        if (self.release_threshold is not None and
+                self._reserved - self._allocated > self.release_threshold):
+            self._release_free_segments(self.release_threshold)
+
+    def _find_free(self, size, stream, small):
+        for cls in range(size.bit_length(), self._max_class + 1):
+            blocks = self._bins.get((stream, small, cls))
+            if not blocks:
+                continue
+            i = bisect.bisect_left(blocks, (size, 0))
+            if i < len(blocks):
+                block = self._free_blocks[blocks[i][1]]
+                self._remove_free(block)
+                return block
+        return None
+
+    def _insert_free(self, block):
+        cls = block.size.bit_length()
+        self._max_class = max(self._max_class, cls)
+        bisect.insort(
+            self._bins.setdefault((block.stream, block.small, cls), []),
+            (block.size, block.ptr))
+        self._free_blocks[block.ptr] = block
+
+    def _remove_free(self, block):
+        blocks = self._bins[
+            (block.stream, block.small, block.size.bit_length())]
+        del blocks[bisect.bisect_left(blocks, (block.size, block.ptr))]
+        del self._free_blocks[block.ptr]
+
+    def _new_segment(self, size, stream, small):
+        if small:
+            seg_size = MemoryPool.SMALL_SEGMENT
+        else:
+            seg_size = ((size + MemoryPool.LARGE_ROUND - 1) //
+                        MemoryPool.LARGE_ROUND * MemoryPool.LARGE_ROUND)
+        ptr = cu.ffi.new("CUdeviceptr *")
+        with self.context:
+            err = self._lib.cuMemAlloc_v2(ptr, seg_size)
+            if err == cu.CUDA_ERROR_OUT_OF_MEMORY and len(self._free_blocks):
+                self._release_free_segments(0)
+                err = self._lib.cuMemAlloc_v2(ptr, seg_size)
+        if err:
+            raise CU.error("cuMemAlloc_v2", err)
+        self._n_driver_allocs += 1
+        self._reserved += seg_size
+        self._segments[int(ptr[0])] = seg_size
+        return _Block(int(ptr[0]), seg_size, int(ptr[0]), stream, small)
+
+    def _release_free_segments(self, threshold):
+        blocks = [block for block in self._free_blocks.values()
+                  if block.prev is None and block.next is None]
+        blocks.sort(key=lambda block: block.size)
+        with self.context:
+            for block in blocks:
+                if self._reserved - self._allocated <= threshold:
+                    break
+                self._remove_free(block)
+                del self._segments[block.segment]
+                self._reserved -= block.size
+                self._n_driver_frees += 1
+                self._lib.cuMemFree_v2(block.ptr)
+
+    def _release(self):
+        """Frees all segments (called by Context on release).
+        """
+        with self._lock:
+            for ptr in self._segments:
+                self._lib.cuMemFree_v2(ptr)
+            self._segments.clear()
+            self._bins.clear()
+            self._free_blocks.clear()
+            self._used_blocks.clear()
+            self._reserved = 0
+            self._allocated = 0
+
+
 class MemAllocManaged(Memory):
     """Allocated memory via cuMemAllocManaged.
 
@@ -526,10 +908,672 @@ class MemHostAlloc(Memory):
     def buffer(self):
         return cu.ffi.buffer(cu.ffi.cast("void *", self.handle), self.size)
 
+    def as_ndarray(self, shape=None, dtype=None):
+        """Returns numpy array over this memory without copying.
+
+        The array holds the reference to this object.
+
+        Parameters:
+            shape: shape of the array (defaults to the whole allocation).
+            dtype: numpy dtype of the array (defaults to numpy.uint8).
+        """
+        import numpy
+        dtype = numpy.dtype(numpy.uint8 if dtype is None else dtype)
+        if shape is None:
+            shape = (self.size // dtype.itemsize,)
+        elif not hasattr(shape, "__len__"):
+            shape = (int(shape),)
+        shape = tuple(int(x) for x in shape)
+        nbytes = int(numpy.prod(shape)) * dtype.itemsize
+        if nbytes > self.size:
+            raise ValueError("Array of %d bytes does not fit into "
+                             "the allocation of %d bytes" %
+                             (nbytes, self.size))
+        return numpy.asarray(_ArrayInterface(
+            self, {"shape": shape, "typestr": dtype.str,
+                   "data": (self.handle, False), "version": 3}))
+
     def _release_mem(self):
         self._lib.cuMemFreeHost(self.handle)
 
 
+class HostRegistered(MemHostAlloc):
+    """Page-locks existing host memory in place via cuMemHostRegister.
+
+    Attributes:
+        handle: pointer in the host address space (int).
+        array: the registered object (holds the reference to the memory).
+    """
+    def __init__(self, context, array,
+                 flags=(cu.CU_MEMHOSTREGISTER_PORTABLE |
+                        cu.CU_MEMHOSTREGISTER_DEVICEMAP)):
+        """Registers memory of the array.
+
+        Parameters:
+            context: Context instance.
+            array: numpy array or object supporting the buffer protocol
+                   (mmap, bytearray), the memory should be contiguous
+                   and must not be released while registered.
+            flags: CU_MEMHOSTREGISTER_* flags.
+        """
+        import numpy
+        if getattr(array, "__array_interface__", None) is None:
+            array = numpy.frombuffer(array, dtype=numpy.uint8)
+        else:
+            array = numpy.asarray(array)
+        self._array = array
+        self._ptr = array.__array_interface__["data"][0]
+        super(HostRegistered, self).__init__(context, array.nbytes, flags)
+
+    @property
+    def array(self):
+        return self._array
+
+    def _device_alloc(self):
+        # checked here, so the failed instance is destructed properly
+        if not self._array.flags["C_CONTIGUOUS"]:
+            raise ValueError("array should be C-contiguous")
+        with self.context:
+            err = self._lib.cuMemHostRegister_v2(
+                self._ptr, self.size, self.flags)
+        if err:
+            raise CU.error("cuMemHostRegister_v2", err)
+        self._handle = self._ptr
+
+    def _release_mem(self):
+        with self.context:
+            self._lib.cuMemHostUnregister(self.handle)
+
+
+class _ArrayInterface(object):
+    """Exports __array_interface__ holding the reference to the owner.
+    """
+    def __init__(self, owner, interface):
+        self.owner = owner
+        self.__array_interface__ = interface
+
+
+class PooledMemHostAlloc(MemHostAlloc):
+    """Allocates page-locked memory from the pool of the context
+    (see Context.enable_host_mem_pool).
+
+    The memory is returned to the pool on release
+    instead of calling cuMemFreeHost.
+
+    Attributes:
+        handle: pointer in the host address space (int).
+    """
+    def __init__(self, context, size_or_ndarray,
+                 flags=(cu.CU_MEMHOSTALLOC_PORTABLE |
+                        cu.CU_MEMHOSTALLOC_DEVICEMAP)):
+        self._pool = None
+        super(PooledMemHostAlloc, self).__init__(
+            context, size_or_ndarray, flags)
+
+    def _device_alloc(self):
+        pool = self.context.host_mem_pool
+        if pool is None:
+            raise ValueError(
+                "Host memory pool is not enabled for the context")
+        self._handle = pool.malloc(self.size, self.flags)
+        self._pool = pool
+
+    def _release_mem(self):
+        self._pool.free(self.handle, self.size, self.flags)
+
+
+class HostMemoryPool(object):
+    """Caching allocator of the page-locked host memory.
+
+    Buffers are allocated via cuMemHostAlloc with the size rounded up
+    to the power of two (but not less than MIN_SIZE) and are reused
+    for the requests of the same size class and flags.
+
+    Attributes:
+        context: Context the memory is allocated in.
+        max_cached_bytes: maximum amount of bytes kept in the pool
+                          for reuse (None - unlimited).
+    """
+    MIN_SIZE = 4096
+
+    def __init__(self, context, max_cached_bytes=None):
+        self._lib = cu.lib  # to hold the reference
+        self._context = context
+        self.max_cached_bytes = max_cached_bytes
+        self._lock = threading.RLock()
+        self._free_ptrs = {}  # (flags, size class) => list of pointers
+        self._allocated = 0
+        self._cached = 0
+        self._n_allocs = 0
+        self._n_hits = 0
+
+    @property
+    def context(self):
+        return self._context
+
+    @staticmethod
+    def round_size(size):
+        """Returns size rounded up to the size class.
+        """
+        return max(1 << (max(int(size), 1) - 1).bit_length(),
+                   HostMemoryPool.MIN_SIZE)
+
+    @property
+    def stats(self):
+        """Returns dictionary with the usage statistics.
+        """
+        with self._lock:
+            return {"allocated_bytes": self._allocated,
+                    "cached_bytes": self._cached,
+                    "n_allocs": self._n_allocs,
+                    "n_hits": self._n_hits}
+
+    def malloc(self, size, flags=(cu.CU_MEMHOSTALLOC_PORTABLE |
+                                  cu.CU_MEMHOSTALLOC_DEVICEMAP)):
+        """Returns pointer to the page-locked memory of at least size bytes.
+        """
+        size = HostMemoryPool.round_size(size)
+        with self._lock:
+            self._n_allocs += 1
+            ptrs = self._free_ptrs.get((flags, size))
+            if ptrs:
+                self._n_hits += 1
+                self._cached -= size
+                self._allocated += size
+                return ptrs.pop()
+        pp = cu.ffi.new("size_t *")
+        with self.context:
+            err = self._lib.cuMemHostAlloc(pp, size, flags)
+            if err == cu.CUDA_ERROR_OUT_OF_MEMORY and self._cached:
+                self.empty_cache()
+                err = self._lib.cuMemHostAlloc(pp, size, flags)
+        if err:
+            raise CU.error("cuMemHostAlloc", err)
+        with self._lock:
+            self._allocated += size
+        return int(pp[0])
+
+    def free(self, ptr, size, flags=(cu.CU_MEMHOSTALLOC_PORTABLE |
+                                     cu.CU_MEMHOSTALLOC_DEVICEMAP)):
+        """Returns the memory previously obtained with malloc to the pool.
+        """
+        size = HostMemoryPool.round_size(size)
+        with self._lock:
+            self._allocated -= size
+            if (self.max_cached_bytes is None or
+                    self._cached + size <= self.max_cached_bytes):
+                self._free_ptrs.setdefault((flags, size), []).append(ptr)
+                self._cached += size
+                return
+        self._lib.cuMemFreeHost(ptr)
+
+    def empty_cache(self):
+        """Frees all cached buffers.
+        """
+        with self._lock:
+            free_ptrs = self._free_ptrs
+            self._free_ptrs = {}
+            self._cached = 0
+        for ptrs in free_ptrs.values():
+            for ptr in ptrs:
+                self._lib.cuMemFreeHost(ptr)
+
+    def _release(self):
+        """Frees cached buffers (called by Context on release).
+        """
+        self.empty_cache()
+
+
+class Stream(CU):
+    """Holds CUDA stream.
+
+    Attributes:
+        handle: cffi handle to the stream (int).
+        context: Context to hold the reference.
+        flags: flags of the stream.
+    """
+    def __init__(self, context, flags=cu.CU_STREAM_DEFAULT, priority=0):
+        """Calls cuStreamCreateWithPriority.
+
+        Parameters:
+            context: Context instance.
+            flags: CU_STREAM_DEFAULT or CU_STREAM_NON_BLOCKING
+                   (the latter does not synchronize with the NULL stream).
+            priority: priority of the stream, lower numbers represent
+                      higher priorities, see Context.stream_priority_range
+                      (values outside of the range are clamped).
+        """
+        super(Stream, self).__init__()
+        context._add_ref(self)
+        self._context = context
+        self._flags = flags
+        stream = cu.ffi.new("CUstream *")
+        with context:
+            err = self._lib.cuStreamCreateWithPriority(
+                stream, flags, priority)
+        if err:
+            raise CU.error("cuStreamCreateWithPriority", err)
+        self._handle = int(stream[0])
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def flags(self):
+        """Flags supplied for this stream.
+        """
+        return self._flags
+
+    @property
+    def priority(self):
+        """Priority of the stream (after clamping by the driver).
+        """
+        priority = cu.ffi.new("int *")
+        err = self._lib.cuStreamGetPriority(self.handle, priority)
+        if err:
+            raise CU.error("cuStreamGetPriority", err)
+        return int(priority[0])
+
+    def query(self):
+        """Returns True if all operations in the stream have completed.
+        """
+        err = self._lib.cuStreamQuery(self.handle)
+        if err == cu.CUDA_ERROR_NOT_READY:
+            return False
+        if err:
+            raise CU.error("cuStreamQuery", err)
+        return True
+
+    def synchronize(self):
+        """Waits until all operations in the stream have completed.
+        """
+        err = self._lib.cuStreamSynchronize(self.handle)
+        if err:
+            raise CU.error("cuStreamSynchronize", err)
+
+    def wait_event(self, event, flags=0):
+        """Makes all future work submitted to the stream wait
+        until event completes (does not block the host).
+
+        Parameters:
+            event: Event instance or it's handle.
+            flags: must be 0.
+        """
+        err = self._lib.cuStreamWaitEvent(self.handle, event, flags)
+        if err:
+            raise CU.error("cuStreamWaitEvent", err)
+
+    def begin_capture(self, mode=cu.CU_STREAM_CAPTURE_MODE_GLOBAL):
+        """Begins capturing the work submitted to the stream into a graph.
+
+        Work is not executed while capturing, the stream must not be
+        the NULL stream.
+
+        Parameters:
+            mode: one of CU_STREAM_CAPTURE_MODE_*, controls which
+                  potentially unsafe calls are prohibited during capture.
+        """
+        err = self._lib.cuStreamBeginCapture_v2(self.handle, mode)
+        if err:
+            raise CU.error("cuStreamBeginCapture_v2", err)
+
+    def end_capture(self):
+        """Ends capturing started with begin_capture().
+
+        Returns:
+            Graph instance with the captured work.
+        """
+        graph = cu.ffi.new("CUgraph *")
+        err = self._lib.cuStreamEndCapture(self.handle, graph)
+        if err:
+            raise CU.error("cuStreamEndCapture", err)
+        return Graph(self.context, graph[0])
+
+    @property
+    def capture_status(self):
+        """Returns one of CU_STREAM_CAPTURE_STATUS_*.
+        """
+        status = cu.ffi.new("CUstreamCaptureStatus *")
+        err = self._lib.cuStreamIsCapturing(self.handle, status)
+        if err:
+            raise CU.error("cuStreamIsCapturing", err)
+        return int(status[0])
+
+    def _release(self):
+        if self.handle is not None:
+            self._lib.cuStreamDestroy_v2(self.handle)
+            self._handle = None
+
+    def __del__(self):
+        if self.context.handle is None:
+            raise SystemError("Incorrect destructor call order detected")
+        self._release()
+        self.context._del_ref(self)
+
+
+class Event(CU):
+    """Holds CUDA event.
+
+    Can be used as a context manager for timing a block of launches:
+
+        with Event(ctx, stream=stream) as evt:
+            f((N, 1, 1), stream=stream)
+        milliseconds = evt.elapsed_time()
+
+    Attributes:
+        handle: cffi handle to the event (int).
+        context: Context to hold the reference.
+        flags: flags of the event.
+        stream: stream to record the event on when used in with statement.
+    """
+    def __init__(self, context, flags=cu.CU_EVENT_DEFAULT, stream=None):
+        """Calls cuEventCreate.
+
+        Parameters:
+            context: Context instance.
+            flags: combination of CU_EVENT_* flags.
+            stream: stream to record the event on when used in with statement.
+        """
+        super(Event, self).__init__()
+        context._add_ref(self)
+        self._context = context
+        self._flags = flags
+        self.stream = stream
+        self._start = None
+        event = cu.ffi.new("CUevent *")
+        with context:
+            err = self._lib.cuEventCreate(event, flags)
+        if err:
+            raise CU.error("cuEventCreate", err)
+        self._handle = int(event[0])
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def flags(self):
+        """Flags supplied for this event.
+        """
+        return self._flags
+
+    @property
+    def start(self):
+        """Event recorded on entering with statement.
+        """
+        return self._start
+
+    def record(self, stream=None):
+        """Captures in the event the contents of the stream at this time.
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle).
+        """
+        err = self._lib.cuEventRecord(self.handle,
+                                      0 if stream is None else stream)
+        if err:
+            raise CU.error("cuEventRecord", err)
+
+    def query(self):
+        """Returns True if all work captured by the event has completed.
+        """
+        err = self._lib.cuEventQuery(self.handle)
+        if err == cu.CUDA_ERROR_NOT_READY:
+            return False
+        if err:
+            raise CU.error("cuEventQuery", err)
+        return True
+
+    def synchronize(self):
+        """Waits until all work captured by the event has completed.
+        """
+        err = self._lib.cuEventSynchronize(self.handle)
+        if err:
+            raise CU.error("cuEventSynchronize", err)
+
+    def wait(self, stream=None):
+        """Makes the stream wait on this event (does not block the host).
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle).
+        """
+        err = self._lib.cuStreamWaitEvent(
+            0 if stream is None else stream, self.handle, 0)
+        if err:
+            raise CU.error("cuStreamWaitEvent", err)
+
+    def elapsed_time(self, start=None):
+        """Returns time in milliseconds elapsed between start and this event.
+
+        The function will block until completion of this event.
+
+        Parameters:
+            start: the starting Event (defaults to the one recorded
+                   on entering with statement).
+        """
+        if start is None:
+            start = self._start
+            if start is None:
+                raise ValueError("start event should be provided")
+        self.synchronize()
+        ms = cu.ffi.new("float *")
+        err = self._lib.cuEventElapsedTime(ms, start, self.handle)
+        if err:
+            raise CU.error("cuEventElapsedTime", err)
+        return float(ms[0])
+
+    def __enter__(self):
+        if self._start is None:
+            self._start = Event(self.context, self.flags)
+        self._start.record(self.stream)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record(self.stream)
+
+    def _release(self):
+        if self.handle is not None:
+            self._lib.cuEventDestroy_v2(self.handle)
+            self._handle = None
+
+    def __del__(self):
+        if self.context.handle is None:
+            raise SystemError("Incorrect destructor call order detected")
+        self._release()
+        self.context._del_ref(self)
+
+
+class Graph(CU):
+    """Holds CUDA graph.
+
+    Usage:
+        stream.begin_capture()
+        ...  # launch kernels, copies, CUBLAS calls etc. on stream
+        graph = stream.end_capture()
+        graph_exec = graph.instantiate()
+        graph_exec.launch(stream)
+
+    Attributes:
+        handle: cffi handle to the graph (int).
+        context: Context to hold the reference.
+    """
+    def __init__(self, context, handle=None):
+        """Takes ownership of the graph handle or creates an empty graph.
+
+        Parameters:
+            context: Context instance.
+            handle: handle of the graph (e.g. from cuStreamEndCapture).
+        """
+        super(Graph, self).__init__()
+        context._add_ref(self)
+        self._context = context
+        if handle is None:
+            graph = cu.ffi.new("CUgraph *")
+            with context:
+                err = self._lib.cuGraphCreate(graph, 0)
+            if err:
+                raise CU.error("cuGraphCreate", err)
+            handle = graph[0]
+        self._handle = int(handle)
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def nodes(self):
+        """Returns list of the graph nodes handles.
+        """
+        n = cu.ffi.new("size_t *")
+        err = self._lib.cuGraphGetNodes(self.handle, cu.ffi.NULL, n)
+        if err:
+            raise CU.error("cuGraphGetNodes", err)
+        if not n[0]:
+            return []
+        nodes = cu.ffi.new("CUgraphNode[]", n[0])
+        err = self._lib.cuGraphGetNodes(self.handle, nodes, n)
+        if err:
+            raise CU.error("cuGraphGetNodes", err)
+        return [int(nodes[i]) for i in range(n[0])]
+
+    def node_type(self, node):
+        """Returns one of CU_GRAPH_NODE_TYPE_*.
+        """
+        node_type = cu.ffi.new("CUgraphNodeType *")
+        err = self._lib.cuGraphNodeGetType(node, node_type)
+        if err:
+            raise CU.error("cuGraphNodeGetType", err)
+        return int(node_type[0])
+
+    @property
+    def kernel_nodes(self):
+        """Returns list of the handles of the kernel nodes.
+        """
+        return [node for node in self.nodes
+                if self.node_type(node) == cu.CU_GRAPH_NODE_TYPE_KERNEL]
+
+    def get_kernel_node_params(self, node):
+        """Returns launch configuration of the kernel node.
+
+        Returns:
+            func, grid_dims, block_dims, shared_mem_bytes:
+                handle of the function, tuples of 3 ints and int.
+        """
+        params = cu.ffi.new("CUDA_KERNEL_NODE_PARAMS *")
+        err = self._lib.cuGraphKernelNodeGetParams(node, params)
+        if err:
+            raise CU.error("cuGraphKernelNodeGetParams", err)
+        return (int(params.func),
+                (params.gridDimX, params.gridDimY, params.gridDimZ),
+                (params.blockDimX, params.blockDimY, params.blockDimZ),
+                params.sharedMemBytes)
+
+    def instantiate(self, flags=0):
+        """Returns GraphExec instance ready to be launched.
+        """
+        return GraphExec(self, flags)
+
+    def _release(self):
+        if self.handle is not None:
+            self._lib.cuGraphDestroy(self.handle)
+            self._handle = None
+
+    def __del__(self):
+        if self.context.handle is None:
+            raise SystemError("Incorrect destructor call order detected")
+        self._release()
+        self.context._del_ref(self)
+
+
+class GraphExec(CU):
+    """Holds executable CUDA graph.
+
+    Attributes:
+        handle: cffi handle to the executable graph (int).
+        graph: Graph it was instantiated from.
+    """
+    def __init__(self, graph, flags=0):
+        """Calls cuGraphInstantiateWithFlags.
+
+        Parameters:
+            graph: Graph instance.
+            flags: CUDA_GRAPH_INSTANTIATE_FLAG_* flags.
+        """
+        super(GraphExec, self).__init__()
+        graph.context._add_ref(self)
+        self._graph = graph
+        graph_exec = cu.ffi.new("CUgraphExec *")
+        with graph.context:
+            err = self._lib.cuGraphInstantiateWithFlags(
+                graph_exec, graph.handle, flags)
+        if err:
+            raise CU.error("cuGraphInstantiateWithFlags", err)
+        self._handle = int(graph_exec[0])
+
+    @property
+    def graph(self):
+        return self._graph
+
+    @property
+    def context(self):
+        return self._graph.context
+
+    def launch(self, stream=None):
+        """Launches the executable graph.
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle).
+        """
+        err = self._lib.cuGraphLaunch(self.handle,
+                                      0 if stream is None else stream)
+        if err:
+            raise CU.error("cuGraphLaunch", err)
+
+    def set_kernel_node_params(self, node, function, grid_dims,
+                               block_dims=(1, 1, 1), args_tuple=None,
+                               shared_mem_bytes=0):
+        """Updates parameters of the kernel node in this executable graph.
+
+        The arguments are copied, so function can be reused afterwards.
+
+        Parameters:
+            node: handle of the kernel node (see Graph.kernel_nodes).
+            function: Function or PreparedFunction instance.
+            grid_dims, block_dims, args_tuple, shared_mem_bytes:
+                the same as for Function.__call__(),
+                if args_tuple is None, currently set arguments are used.
+        """
+        if args_tuple is not None:
+            function.set_args(*args_tuple)
+        if isinstance(function, PreparedFunction):
+            func, args = function.function.handle, function._params
+        else:
+            func, args = function.handle, function._build_params()
+        params = cu.ffi.new("CUDA_KERNEL_NODE_PARAMS *")
+        params.func = func
+        params.gridDimX, params.gridDimY, params.gridDimZ = grid_dims
+        params.blockDimX, params.blockDimY, params.blockDimZ = block_dims
+        params.sharedMemBytes = shared_mem_bytes
+        params.kernelParams = args
+        params.extra = cu.ffi.NULL
+        err = self._lib.cuGraphExecKernelNodeSetParams(
+            self.handle, node, params)
+        if err:
+            raise CU.error("cuGraphExecKernelNodeSetParams", err)
+
+    def _release(self):
+        if self.handle is not None:
+            self._lib.cuGraphExecDestroy(self.handle)
+            self._handle = None
+
+    def __del__(self):
+        if self.context.handle is None:
+            raise SystemError("Incorrect destructor call order detected")
+        self._release()
+        self.context._del_ref(self)
+
+
 class skip(object):
     """For skipping arguments when passed to set_args.
     """
@@ -555,6 +1599,8 @@ class Function(CU):
         self._refs = []
         # Holds cffi data, copied from the original python objects
         self._args = []
+        # Holds preallocated storage for each argument
+        self._storage = []
         # Holds pointers to the cffi data
         self._params = None
 
@@ -611,7 +1657,6 @@ class Function(CU):
         return int(min_grid_size[0]), int(block_size[0])
 
     def set_args(self, *args):
-        self._params = None
         i = 0
         for arg in args:
             if arg is skip:
@@ -624,28 +1669,28 @@ class Function(CU):
             i += 1
 
     def set_arg(self, i, arg):
-        self._params = None
         while len(self._args) <= i:
             ptr = cu.ffi.new("size_t *")
             self._args.append(ptr)
+            self._storage.append(ptr)
             self._refs.append(None)
+            self._params = None
         self._refs[i] = arg
-        ptr = cu.ffi.new("size_t *")
-        if isinstance(arg, CU):
-            ptr[0] = cu.ffi.cast("size_t", arg.handle)
-            self._args[i] = ptr
-            return
         arr = getattr(arg, "__array_interface__", None)
         if arr is not None:  # save address to the contents of the numpy array
-            self._args[i] = cu.ffi.cast("size_t *", arr["data"][0])
-            return
-        ptr[0] = cu.ffi.cast("size_t", 0 if arg is None else arg)
+            ptr = cu.ffi.cast("size_t *", arr["data"][0])
+        else:
+            ptr = self._storage[i]
+            ptr[0] = cu.ffi.cast(
+                "size_t", arg.handle if isinstance(arg, CU)
+                else 0 if arg is None else arg)
         self._args[i] = ptr
+        if self._params is not None:  # update already built array in place
+            self._params[i] = ptr
 
-    def __call__(self, grid_dims, block_dims=(1, 1, 1), args_tuple=None,
-                 shared_mem_bytes=0, stream=None):
-        if args_tuple is not None:
-            self.set_args(*args_tuple)
+    def _build_params(self):
+        """Returns array of pointers to the arguments, building it if needed.
+        """
         if self._params is None:
             n = len(self._args)
             if n:
@@ -653,26 +1698,254 @@ class Function(CU):
                 self._params[0:n] = self._args[0:n]
             else:
                 self._params = cu.ffi.NULL
+        return self._params
+
+    def prepare(self, signature):
+        """Returns PreparedFunction for the fast repeated launches.
+
+        Parameters:
+            signature: string with the types of the kernel arguments,
+                       see PreparedFunction.TYPES.
+        """
+        return PreparedFunction(self, signature)
+
+    def __call__(self, grid_dims, block_dims=(1, 1, 1), args_tuple=None,
+                 shared_mem_bytes=0, stream=None):
+        if args_tuple is not None:
+            self.set_args(*args_tuple)
         err = self._lib.cuLaunchKernel(
             self.handle, grid_dims[0], grid_dims[1], grid_dims[2],
             block_dims[0], block_dims[1], block_dims[2],
             shared_mem_bytes, 0 if stream is None else stream,
+            self._build_params(), cu.ffi.NULL)
+        if err:
+            raise CU.error("cuLaunchKernel", err)
+
+
+class PreparedFunction(object):
+    """Launcher of CUDA function with the fixed signature.
+
+    Arguments are stored in the single preallocated buffer
+    and are updated in place, so repeated calls do no cffi allocations.
+
+    Attributes:
+        _function: Function instance.
+        _signature: string with the types of the arguments.
+        _buffer: packed arguments.
+        _params: array of pointers to the arguments inside _buffer.
+        _slots: typed pointers to the arguments inside _buffer.
+        _refs: references to the original python objects.
+    """
+    #: Signature characters (struct module notation), "P" is a pointer,
+    #: which accepts None, integer address or CU instance (e.g. MemAlloc).
+    TYPES = {"b": "int8_t", "B": "uint8_t", "h": "int16_t",
+             "H": "uint16_t", "i": "int32_t", "I": "uint32_t",
+             "q": "int64_t", "Q": "uint64_t", "f": "float", "d": "double",
+             "P": "size_t"}
+
+    def __init__(self, function, signature):
+        self._function = function
+        self._signature = signature
+        self._offsets = []
+        size = 0
+        for c in signature:
+            if c not in PreparedFunction.TYPES:
+                raise ValueError("Unsupported argument type %s in %s" %
+                                 (c, signature))
+            align = cu.ffi.sizeof(PreparedFunction.TYPES[c])
+            size = (size + align - 1) // align * align
+            self._offsets.append(size)
+            size += align
+        self._size = size
+        self._buffer, self._params = self._allocate()
+        self._slots = [
+            cu.ffi.cast("%s *" % PreparedFunction.TYPES[c], self._params[i])
+            for i, c in enumerate(signature)]
+        self._refs = [None] * len(signature)
+
+    def _allocate(self):
+        """Allocates buffer for the packed arguments.
+
+        Returns:
+            buffer, params: packed arguments, array of pointers to them.
+        """
+        buffer = cu.ffi.new("char[]", max(self._size, 1))
+        if not self._offsets:
+            return buffer, cu.ffi.NULL
+        params = cu.ffi.new("void*[]", len(self._offsets))
+        for i, offset in enumerate(self._offsets):
+            params[i] = buffer + offset
+        return buffer, params
+
+    def _snapshot(self):
+        """Returns copy of the currently set arguments
+        as the tuple (buffer, params).
+        """
+        buffer, params = self._allocate()
+        cu.ffi.memmove(buffer, self._buffer, self._size)
+        return buffer, params
+
+    @property
+    def function(self):
+        return self._function
+
+    @property
+    def signature(self):
+        return self._signature
+
+    def set_args(self, *args):
+        i = 0
+        for arg in args:
+            if arg is skip:
+                i += 1
+                continue
+            elif isinstance(arg, skip):
+                i += arg.amount
+                continue
+            self.set_arg(i, arg)
+            i += 1
+
+    def set_arg(self, i, arg):
+        if self._signature[i] == "P":
+            self._slots[i][0] = 0 if arg is None else int(arg)
+        else:
+            self._slots[i][0] = arg
+        self._refs[i] = arg
+
+    def __call__(self, grid_dims, block_dims=(1, 1, 1), args_tuple=None,
+                 shared_mem_bytes=0, stream=None):
+        if args_tuple is not None:
+            self.set_args(*args_tuple)
+        err = self._function._lib.cuLaunchKernel(
+            self._function.handle, grid_dims[0], grid_dims[1], grid_dims[2],
+            block_dims[0], block_dims[1], block_dims[2],
+            shared_mem_bytes, 0 if stream is None else stream,
             self._params, cu.ffi.NULL)
         if err:
             raise CU.error("cuLaunchKernel", err)
 
 
+class LaunchBatch(object):
+    """Queue of kernel launches submitted in one tight loop.
+
+    Arguments are packed when the launch is added,
+    so the batch can be submitted many times.
+
+    Attributes:
+        _launches: list of prepared argument tuples for cuLaunchKernel.
+        _refs: references to the packed arguments and python objects.
+    """
+    def __init__(self):
+        self._lib = None
+        self._launches = []
+        self._refs = []
+
+    def __len__(self):
+        return len(self._launches)
+
+    def add(self, function, grid_dims, block_dims=(1, 1, 1),
+            args_tuple=None, shared_mem_bytes=0, stream=None):
+        """Adds kernel launch to the batch.
+
+        Parameters:
+            function: Function or PreparedFunction instance.
+            grid_dims, block_dims, args_tuple, shared_mem_bytes, stream:
+                the same as for Function.__call__(),
+                if args_tuple is None, currently set arguments are used.
+        """
+        if args_tuple is not None:
+            function.set_args(*args_tuple)
+        if isinstance(function, PreparedFunction):
+            buffer, params = function._snapshot()
+            handle = function.function.handle
+            lib = function.function._lib
+        else:
+            buffer, params = LaunchBatch._pack(function)
+            handle = function.handle
+            lib = function._lib
+        if self._lib is not None and lib is not self._lib:
+            raise ValueError("All functions should use the same library")
+        self._lib = lib
+        self._launches.append((
+            handle, grid_dims[0], grid_dims[1], grid_dims[2],
+            block_dims[0], block_dims[1], block_dims[2],
+            shared_mem_bytes, 0 if stream is None else stream,
+            params, cu.ffi.NULL))
+        self._refs.append((function, buffer))
+
+    @staticmethod
+    def _pack(function):
+        """Copies currently set arguments of Function.
+
+        Returns:
+            buffer, params: packed arguments, array of pointers to them.
+        """
+        step = cu.ffi.sizeof("size_t")
+        # numpy arrays are passed by contents, everything else as size_t
+        sizes = [ref.nbytes if hasattr(ref, "__array_interface__") else step
+                 for ref in function._refs]
+        offsets = []
+        size = 0
+        for n in sizes:
+            offsets.append(size)
+            size += (n + step - 1) // step * step
+        buffer = cu.ffi.new("char[]", max(size, 1))
+        if not sizes:
+            return buffer, cu.ffi.NULL
+        params = cu.ffi.new("void*[]", len(sizes))
+        for i, ptr in enumerate(function._args):
+            params[i] = buffer + offsets[i]
+            cu.ffi.memmove(params[i], ptr, sizes[i])
+        return buffer, params
+
+    def submit(self):
+        """Launches all the kernels in the batch in order.
+        """
+        if not self._launches:
+            return
+        launch = self._lib.cuLaunchKernel
+        for args in self._launches:
+            err = launch(*args)
+            if err:
+                raise CU.error("cuLaunchKernel", err)
+
+    def clear(self):
+        """Removes all the launches from the batch.
+        """
+        del self._launches[:]
+        del self._refs[:]
+        self._lib = None
+
+
 class Module(CU):
-    """Class for compiling CUDA module from source (nvcc is required)
+    """Class for compiling CUDA module from source (NVRTC or nvcc is required)
     or linking from PTX/cubin/fatbin binary.
     """
     OPTIONS_PTX = ("-ptx",)
     OPTIONS_CUBLAS = ("-cubin", "-lcudadevrt", "-lcublas_device", "-dlink")
 
+    #: Options passed to nvcc which NVRTC understands (by prefix)
+    NVRTC_OPTIONS = ("--ftz", "--fmad", "--prec-div", "--prec-sqrt",
+                     "--use_fast_math", "-use_fast_math", "-D",
+                     "--define-macro", "-U", "--undefine-macro", "-std",
+                     "--std", "-lineinfo", "--generate-line-info", "-G",
+                     "--device-debug", "-maxrregcount", "--maxrregcount",
+                     "--restrict", "-restrict")
+
+    #: Default CompilationCache (None - do not cache)
+    cache = None
+
+    #: Default compiler:
+    #: "nvcc" - always invoke nvcc,
+    #: "nvrtc" - use NVRTC (nvcc is used if libnvrtc is missing),
+    #: "auto" - use NVRTC when it is available and the options are
+    #:          supported by it, nvcc otherwise.
+    compiler = "nvcc"
+
     def __init__(self, context, ptx=None, source=None, source_file=None,
                  nvcc_options=("-O3", "--ftz=true", "--fmad=true"),
                  nvcc_path="nvcc", include_dirs=(),
-                 nvcc_options2=OPTIONS_PTX):
+                 nvcc_options2=OPTIONS_PTX, cache=None, compiler=None):
         """Calls cuModuleLoadData, invoking nvcc if ptx is not None.
 
         Parameters:
@@ -685,6 +1958,10 @@ class Module(CU):
             include_dirs: include directories for nvcc.
             nvcc_options2: more options for nvcc (defaults to ("-ptx",)),
                 example: ("-cubin", "-lcudadevrt", "-lcublas_device", "-dlink")
+            cache: CompilationCache to lookup the compiled code in
+                   (None - use Module.cache, False - do not use cache).
+            compiler: "auto", "nvrtc" or "nvcc"
+                      (None - use Module.compiler).
         """
         super(Module, self).__init__()
         context._add_ref(self)
@@ -697,45 +1974,10 @@ class Module(CU):
             if source is None and source_file is None:
                 raise ValueError("Either ptx, source or source_file "
                                  "should be provided")
-            if source is not None:
-                fout, source_file = tempfile.mkstemp(".cu")
-                os.write(fout, source.encode("utf-8"))
-                os.close(fout)
-
-            fptx, ptx_file = tempfile.mkstemp(".ptx")
-            os.close(fptx)
-
-            nvcc_options = list(nvcc_options)
-            for dirnme in include_dirs:
-                if not len(dirnme):
-                    continue
-                nvcc_options.extend(("-I", dirnme))
-            nvcc_options.append("-arch=sm_%d%d" %
-                                context.device.compute_capability)
-            nvcc_options.extend(nvcc_options2)
-            nvcc_options.extend(("-o", ptx_file))
-            nvcc_options.insert(0, nvcc_path)
-            nvcc_options.insert(1, source_file)
-            try:
-                proc = subprocess.Popen(
-                    nvcc_options, stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                self._stdout, self._stderr = proc.communicate()
-                err = proc.returncode
-                with open(ptx_file, "rb") as fptx:
-                    ptx = fptx.read()
-            except OSError:
-                raise RuntimeError("Could not execute %s" %
-                                   " ".join(nvcc_options))
-            finally:
-                os.unlink(ptx_file)
-                if source is not None:
-                    os.unlink(source_file)
-            if err:
-                raise RuntimeError("nvcc returned %d with stderr:\n%s"
-                                   "\nCommand line was:\n%s" %
-                                   (err, self.stderr.decode("utf-8"),
-                                    " ".join(nvcc_options)))
+            ptx, self._stdout, self._stderr = Module.build(
+                source, source_file, nvcc_options, nvcc_path, include_dirs,
+                nvcc_options2, context.device.compute_capability,
+                cache, compiler)
         self._ptx = ptx.encode("utf-8") if type(ptx) != type(b"") else ptx
 
         # Workaround to prevent deadlock in pypy when doing
@@ -750,6 +1992,187 @@ class Module(CU):
             raise CU.error("cuModuleLoadData", err)
         self._handle = int(module[0])
 
+    @staticmethod
+    def build(source=None, source_file=None,
+              nvcc_options=("-O3", "--ftz=true", "--fmad=true"),
+              nvcc_path="nvcc", include_dirs=(),
+              nvcc_options2=OPTIONS_PTX, compute_capability=(2, 0),
+              cache=None, compiler=None):
+        """Compiles source with NVRTC or nvcc looking up the cache first.
+
+        Parameters are the same as for __init__.
+
+        Returns:
+            ptx, stdout, stderr: output of the compilation (bytes),
+                                 stdout and stderr are None on cache hit.
+        """
+        if cache is None:
+            cache = Module.cache
+        if compiler is None:
+            compiler = Module.compiler
+        if compiler not in ("auto", "nvrtc", "nvcc"):
+            raise ValueError("Unknown compiler %s" % compiler)
+        options = None
+        if compiler != "nvcc":
+            options = Module.nvrtc_options(
+                nvcc_options, include_dirs, nvcc_options2,
+                compute_capability, source_file)
+            if options is None and compiler == "nvrtc":
+                raise ValueError("Options %s are not supported by NVRTC" %
+                                 " ".join(tuple(nvcc_options) +
+                                          tuple(nvcc_options2)))
+            if options is not None:
+                import cuda4py.nvrtc as nvrtc
+                try:
+                    nvrtc.initialize()
+                except OSError:
+                    options = None
+        key = None
+        if cache:
+            if options is None:
+                key = cache.make_key(
+                    source, source_file,
+                    tuple(nvcc_options) + tuple(nvcc_options2),
+                    include_dirs, compute_capability,
+                    cache.compiler_fingerprint(nvcc_path))
+            else:
+                # -O options are not passed to NVRTC but still requested
+                key = cache.make_key(
+                    source, source_file, tuple(options) + tuple(
+                        opt for opt in nvcc_options if opt.startswith("-O")),
+                    include_dirs, compute_capability,
+                    "nvrtc %d.%d" % nvrtc.version())
+            ptx = cache.get(key)
+            if ptx is not None:
+                return ptx, None, None
+        if options is not None:
+            result = Module.compile_nvrtc(source, source_file, options)
+        else:
+            result = Module.compile(
+                source, source_file, nvcc_options, nvcc_path, include_dirs,
+                nvcc_options2, compute_capability)
+        if key is not None:
+            cache.put(key, result[0])
+        return result
+
+    @staticmethod
+    def nvrtc_options(nvcc_options=("-O3", "--ftz=true", "--fmad=true"),
+                      include_dirs=(), nvcc_options2=OPTIONS_PTX,
+                      compute_capability=(2, 0), source_file=None):
+        """Translates nvcc options to NVRTC ones.
+
+        Returns:
+            list of options or None if some of the options
+            cannot be handled by NVRTC.
+        """
+        if tuple(nvcc_options2) != Module.OPTIONS_PTX:
+            return None  # linking is required
+        options = []
+        dirs = [] if source_file is None else [
+            os.path.dirname(os.path.abspath(source_file))]
+        opts = iter(nvcc_options)
+        for opt in opts:
+            if opt.startswith("-O"):
+                continue  # device code is always optimized by NVRTC
+            if opt == "-I":
+                dirs.append(next(opts, ""))
+                continue
+            if opt.startswith("-I"):
+                dirs.append(opt[2:])
+                continue
+            if opt == "-use_fast_math":
+                opt = "--use_fast_math"
+            for prefix in Module.NVRTC_OPTIONS:
+                if opt.startswith(prefix):
+                    break
+            else:
+                return None
+            options.append(opt)
+        dirs.extend(include_dirs)
+        options.extend("--include-path=%s" % dirnme
+                       for dirnme in dirs if len(dirnme))
+        options.append("--gpu-architecture=compute_%d%d" %
+                       tuple(compute_capability))
+        return options
+
+    @staticmethod
+    def compile_nvrtc(source=None, source_file=None, options=()):
+        """Compiles source with NVRTC.
+
+        Parameters:
+            source: kernel source code.
+            source_file: path to the file with kernel code
+                         (used when source is None).
+            options: NVRTC options (see nvrtc_options).
+
+        Returns:
+            ptx, stdout, stderr: output of the compilation (bytes).
+        """
+        import cuda4py.nvrtc as nvrtc
+        if source is None:
+            with open(source_file, "rb") as fin:
+                source = fin.read().decode("utf-8")
+            name = os.path.basename(source_file)
+        else:
+            name = "source.cu"
+        prog = nvrtc.Program(source, name)
+        if not prog.compile(options):
+            raise RuntimeError("NVRTC compilation failed with log:\n%s"
+                               "\nOptions were:\n%s" %
+                               (prog.log.decode("utf-8", "replace"),
+                                " ".join(options)))
+        return prog.ptx, b"", prog.log
+
+    @staticmethod
+    def compile(source=None, source_file=None,
+                nvcc_options=("-O3", "--ftz=true", "--fmad=true"),
+                nvcc_path="nvcc", include_dirs=(),
+                nvcc_options2=OPTIONS_PTX, compute_capability=(2, 0)):
+        """Compiles source with nvcc.
+
+        Returns:
+            ptx, stdout, stderr: output of the compilation (bytes).
+        """
+        if source is not None:
+            fout, source_file = tempfile.mkstemp(".cu")
+            os.write(fout, source.encode("utf-8"))
+            os.close(fout)
+
+        fptx, ptx_file = tempfile.mkstemp(".ptx")
+        os.close(fptx)
+
+        nvcc_options = list(nvcc_options)
+        for dirnme in include_dirs:
+            if not len(dirnme):
+                continue
+            nvcc_options.extend(("-I", dirnme))
+        nvcc_options.append("-arch=sm_%d%d" % tuple(compute_capability))
+        nvcc_options.extend(nvcc_options2)
+        nvcc_options.extend(("-o", ptx_file))
+        nvcc_options.insert(0, nvcc_path)
+        nvcc_options.insert(1, source_file)
+        try:
+            proc = subprocess.Popen(
+                nvcc_options, stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = proc.communicate()
+            err = proc.returncode
+            with open(ptx_file, "rb") as fptx:
+                ptx = fptx.read()
+        except OSError:
+            raise RuntimeError("Could not execute %s" %
+                               " ".join(nvcc_options))
+        finally:
+            os.unlink(ptx_file)
+            if source is not None:
+                os.unlink(source_file)
+        if err:
+            raise RuntimeError("nvcc returned %d with stderr:\n%s"
+                               "\nCommand line was:\n%s" %
+                               (err, stderr.decode("utf-8"),
+                                " ".join(nvcc_options)))
+        return ptx, stdout, stderr
+
     def create_function(self, name):
         return Function(self, name)
 
@@ -810,7 +2233,21 @@ class Context(CU):
     default_flags = cu.CU_CTX_SCHED_AUTO | cu.CU_CTX_MAP_HOST
     context_count = 0  # number of active contexts
 
-    def __init__(self, device, flags=0, handle=None):
+    #: Track the current context of each thread, so with statement
+    #: skips push/pop when the context is already current
+    #: (set to False if the foreign code changes the current context
+    #: in the threads which use cuda4py).
+    track_current = True
+
+    # Per-thread tracking state: handle - current context handle
+    # (None if unknown), stack - handles below it, generation - value of
+    # _generation when handle was recorded, entered - whether each of the
+    # nested with statements has pushed the context.
+    _tls = threading.local()
+    # Incremented on each context destruction as handles may be reused
+    _generation = 0
+
+    def __init__(self, device, flags=0, handle=None, primary=False):
         """Initializes CUDA context.
 
         Parameters:
@@ -819,10 +2256,23 @@ class Context(CU):
             handle: external context handle,
                     if set, device and flags are ignored, and
                     cuCtxDestroy_v2 will not be called in destructor.
+            primary: retain the primary context of the device
+                     instead of creating the new one (flags are ignored,
+                     see Device.retain_primary_context()),
+                     cuDevicePrimaryCtxRelease_v2 will be called
+                     in destructor.
         """
         super(Context, self).__init__()
         self._n_refs = 1
-        if handle is None:
+        self._primary = primary and handle is None
+        if self._primary:
+            ctx = cu.ffi.new("CUcontext *")
+            err = self._lib.cuDevicePrimaryCtxRetain(ctx, device)
+            if err:
+                raise CU.error("cuDevicePrimaryCtxRetain", err)
+            self._handle = int(ctx[0])
+            self._own_handle = True
+        elif handle is None:
             ctx = cu.ffi.new("CUcontext *")
             err = self._lib.cuCtxCreate_v2(
                 ctx, flags if flags else Context.default_flags, device)
@@ -830,12 +2280,21 @@ class Context(CU):
                 raise CU.error("cuCtxCreate_v2", err)
             self._handle = int(ctx[0])
             self._own_handle = True
+            Context._tracked_push(self._handle)  # new context is pushed
         else:
             self._handle = int(handle)
             self._own_handle = False
         self.device = device
+        self._mem_pool = None
+        self._host_mem_pool = None
         Context.context_count += 1
 
+    @property
+    def primary(self):
+        """True if this is the retained primary context of the device.
+        """
+        return self._primary
+
     def _add_ref(self, obj):
         self._n_refs += 1
 
@@ -851,7 +2310,69 @@ class Context(CU):
         if err:
             raise CU.error("cuCtxSynchronize", err)
 
-    def mem_alloc(self, size_or_ndarray):
+    @property
+    def mem_pool(self):
+        """Caching allocator used by mem_alloc (None if not enabled).
+        """
+        return self._mem_pool
+
+    def enable_mem_pool(self, release_threshold=None):
+        """Enables caching allocator for mem_alloc.
+
+        Parameters:
+            release_threshold: amount of cached bytes above which completely
+                               free segments are returned to the driver
+                               (None - keep everything until empty_cache()).
+
+        Returns:
+            MemoryPool instance.
+        """
+        if self._mem_pool is None:
+            self._mem_pool = MemoryPool(self, release_threshold)
+        else:
+            self._mem_pool.release_threshold = release_threshold
+        return self._mem_pool
+
+    @property
+    def host_mem_pool(self):
+        """Caching allocator used by mem_host_alloc (None if not enabled).
+        """
+        return self._host_mem_pool
+
+    def enable_host_mem_pool(self, max_cached_bytes=None):
+        """Enables caching allocator for mem_host_alloc.
+
+        Parameters:
+            max_cached_bytes: maximum amount of bytes kept for reuse
+                              (None - unlimited).
+
+        Returns:
+            HostMemoryPool instance.
+        """
+        if self._host_mem_pool is None:
+            self._host_mem_pool = HostMemoryPool(self, max_cached_bytes)
+        else:
+            self._host_mem_pool.max_cached_bytes = max_cached_bytes
+        return self._host_mem_pool
+
+    def empty_cache(self):
+        """Returns unused cached memory of the pools to the driver.
+        """
+        if self._mem_pool is not None:
+            self._mem_pool.empty_cache()
+        if self._host_mem_pool is not None:
+            self._host_mem_pool.empty_cache()
+
+    def mem_alloc(self, size_or_ndarray, stream=None):
+        """Allocates device memory, from the pool if it is enabled.
+
+        Parameters:
+            size_or_ndarray: size in bytes or numpy array to copy from.
+            stream: the stream the memory is going to be used on
+                    (matters only for the pooled allocations).
+        """
+        if self._mem_pool is not None:
+            return PooledMemAlloc(self, size_or_ndarray, stream)
         return MemAlloc(self, size_or_ndarray)
 
     def mem_alloc_managed(self, size_or_ndarray,
@@ -861,20 +2382,205 @@ class Context(CU):
     def mem_host_alloc(self, size_or_ndarray,
                        flags=(cu.CU_MEMHOSTALLOC_PORTABLE |
                               cu.CU_MEMHOSTALLOC_DEVICEMAP)):
+        """Allocates page-locked host memory,
+        from the pool if it is enabled.
+        """
+        if self._host_mem_pool is not None:
+            return PooledMemHostAlloc(self, size_or_ndarray, flags)
         return MemHostAlloc(self, size_or_ndarray, flags)
 
+    def mem_host_register(self, array,
+                          flags=(cu.CU_MEMHOSTREGISTER_PORTABLE |
+                                 cu.CU_MEMHOSTREGISTER_DEVICEMAP)):
+        """Page-locks memory of the existing array in place.
+
+        Returns:
+            HostRegistered instance.
+        """
+        return HostRegistered(self, array, flags)
+
+    def pinned_empty(self, shape, dtype=None):
+        """Returns numpy array in the page-locked memory
+        (allocated from the pool if it is enabled).
+
+        The memory is released (returned to the pool)
+        when the array is garbage collected.
+
+        Parameters:
+            shape: shape of the array.
+            dtype: numpy dtype (defaults to numpy.float32).
+        """
+        import numpy
+        dtype = numpy.dtype(numpy.float32 if dtype is None else dtype)
+        if not hasattr(shape, "__len__"):
+            shape = (int(shape),)
+        mem = self.mem_host_alloc(int(numpy.prod(shape)) * dtype.itemsize)
+        return mem.as_ndarray(shape, dtype)
+
+    def create_stream(self, flags=cu.CU_STREAM_DEFAULT, priority=0):
+        return Stream(self, flags, priority)
+
+    def create_event(self, flags=cu.CU_EVENT_DEFAULT, stream=None):
+        return Event(self, flags, stream)
+
+    @property
+    def stream_priority_range(self):
+        """Returns tuple (least, greatest) of the stream priorities.
+
+        Greatest priority has the lower number, (0, 0) is returned
+        when the device does not support stream priorities.
+        """
+        least = cu.ffi.new("int *")
+        greatest = cu.ffi.new("int *")
+        with self:
+            err = self._lib.cuCtxGetStreamPriorityRange(least, greatest)
+        if err:
+            raise CU.error("cuCtxGetStreamPriorityRange", err)
+        return int(least[0]), int(greatest[0])
+
     def create_module(self, ptx=None, source=None, source_file=None,
                       nvcc_options=("-O3", "--ftz=true", "--fmad=true"),
                       nvcc_path="nvcc", include_dirs=(),
-                      nvcc_options2=Module.OPTIONS_PTX):
+                      nvcc_options2=Module.OPTIONS_PTX, cache=None,
+                      compiler=None):
         return Module(self, ptx, source, source_file,
                       nvcc_options, nvcc_path, include_dirs,
-                      nvcc_options2)
+                      nvcc_options2, cache, compiler)
+
+    def create_modules_async(self, sources, executor=None, **kwargs):
+        """Compiles modules in parallel and loads them into this context.
+
+        Parameters:
+            sources: sequence of the kernel source codes (str) or
+                     dictionaries with the keyword arguments for Module
+                     (source, source_file, nvcc_options, include_dirs etc.).
+            executor: concurrent.futures executor to compile in
+                      (ThreadPoolExecutor or ProcessPoolExecutor),
+                      if None, thread pool with the number of workers
+                      equal to the number of cpus will be used.
+            kwargs: default keyword arguments for Module
+                    applied to each of the sources.
+
+        Returns:
+            list of concurrent.futures.Future resolving to Module objects.
+        """
+        import concurrent.futures
+        own_executor = executor is None
+        if own_executor:
+            import multiprocessing
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max(min(len(sources), multiprocessing.cpu_count()), 1))
+        compute_capability = self.device.compute_capability
+        futures = []
+        try:
+            for source in sources:
+                params = dict(kwargs)
+                if isinstance(source, dict):
+                    params.update(source)
+                else:
+                    params["source"] = source
+                ptx = params.pop("ptx", None)
+                if params.get("cache") is None:
+                    params["cache"] = Module.cache
+                if params.get("compiler") is None:
+                    params["compiler"] = Module.compiler
+                future = concurrent.futures.Future()
+                futures.append(future)
+                if ptx is not None:
+                    self._load_module(future, ptx, None, None)
+                    continue
+                if (params.get("source") is None and
+                        params.get("source_file") is None):
+                    future.set_exception(ValueError(
+                        "Either ptx, source or source_file "
+                        "should be provided"))
+                    continue
+                params["compute_capability"] = compute_capability
+                executor.submit(Module.build, **params).add_done_callback(
+                    lambda f, future=future: self._on_module_built(f, future))
+        finally:
+            if own_executor:
+                executor.shutdown(wait=False)
+        return futures
+
+    def _on_module_built(self, build_future, future):
+        """Loads compiled module into the context.
+        """
+        try:
+            ptx, stdout, stderr = build_future.result()
+        except Exception as e:
+            future.set_exception(e)
+            return
+        self._load_module(future, ptx, stdout, stderr)
+
+    def _load_module(self, future, ptx, stdout, stderr):
+        try:
+            module = Module(self, ptx=ptx)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        module._stdout = stdout
+        module._stderr = stderr
+        future.set_result(module)
+
+    def enable_peer_access(self, peer):
+        """Allows this context to access memory of the peer context
+        directly (the access is unidirectional).
+
+        Parameters:
+            peer: Context instance.
+        """
+        with self:
+            err = self._lib.cuCtxEnablePeerAccess(peer.handle, 0)
+        if err and err != cu.CUDA_ERROR_PEER_ACCESS_ALREADY_ENABLED:
+            raise CU.error("cuCtxEnablePeerAccess", err)
+
+    def disable_peer_access(self, peer):
+        """Disables direct access to memory of the peer context.
+
+        Parameters:
+            peer: Context instance.
+        """
+        with self:
+            err = self._lib.cuCtxDisablePeerAccess(peer.handle)
+        if err and err != cu.CUDA_ERROR_PEER_ACCESS_NOT_ENABLED:
+            raise CU.error("cuCtxDisablePeerAccess", err)
+
+    @staticmethod
+    def _tracked_current():
+        """Returns handle of the current context of this thread
+        or None if it is unknown.
+        """
+        tls = Context._tls
+        if getattr(tls, "generation", None) != Context._generation:
+            return None
+        return tls.handle
+
+    @staticmethod
+    def _tracked_set(handle):
+        tls = Context._tls
+        tls.handle = handle
+        tls.generation = Context._generation
+
+    @staticmethod
+    def _tracked_push(handle):
+        tls = Context._tls
+        stack = getattr(tls, "stack", None)
+        if stack is None:
+            stack = tls.stack = []
+        stack.append(Context._tracked_current())
+        Context._tracked_set(handle)
+
+    @staticmethod
+    def _tracked_pop():
+        stack = getattr(Context._tls, "stack", None)
+        Context._tracked_set(stack.pop() if stack else None)
 
     def set_current(self):
         err = self._lib.cuCtxSetCurrent(self.handle)
         if err:
             raise CU.error("cuCtxSetCurrent", err)
+        Context._tracked_set(self.handle)
 
     @staticmethod
     def get_current():
@@ -890,6 +2596,7 @@ class Context(CU):
         err = self._lib.cuCtxPushCurrent_v2(self.handle)
         if err:
             raise CU.error("cuCtxPushCurrent_v2", err)
+        Context._tracked_push(self.handle)
 
     @staticmethod
     def pop_current():
@@ -897,22 +2604,49 @@ class Context(CU):
         err = cu.lib.cuCtxPopCurrent_v2(ctx)
         if err:
             raise CU.error("cuCtxPopCurrent_v2", err)
+        Context._tracked_pop()
         return ctx[0]
 
     def __enter__(self):
         if self.handle is None:
             raise SystemError("Incorrect destructor call order detected")
-        self.push_current()
+        tls = Context._tls
+        entered = getattr(tls, "entered", None)
+        if entered is None:
+            entered = tls.entered = []
+        if (Context.track_current and
+                Context._tracked_current() == self.handle):
+            entered.append(False)
+        else:
+            self.push_current()
+            entered.append(True)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.handle is not None:
-            self._lib.cuCtxPopCurrent_v2(cu.ffi.new("CUcontext *"))
+        if not Context._tls.entered.pop() or self.handle is None:
+            return
+        ptr = getattr(Context._tls, "ptr", None)
+        if ptr is None:
+            ptr = Context._tls.ptr = cu.ffi.new("CUcontext *")
+        self._lib.cuCtxPopCurrent_v2(ptr)
+        Context._tracked_pop()
 
     def _release(self):
         if self.handle is not None:
-            if self._own_handle:
+            if self._mem_pool is not None:
+                self._mem_pool._release()
+                self._mem_pool = None
+            if self._host_mem_pool is not None:
+                self._host_mem_pool._release()
+                self._host_mem_pool = None
+            if self._primary:
+                self._lib.cuDevicePrimaryCtxRelease_v2(self.device)
+                Context._generation += 1
+            elif self._own_handle:
+                if Context._tracked_current() == self.handle:
+                    Context._tracked_pop()  # destroy pops current context
                 self._lib.cuCtxDestroy_v2(self.handle)
+                Context._generation += 1
             self._handle = None
             Context.context_count -= 1
 
@@ -922,6 +2656,9 @@ class Context(CU):
 
 class Device(CU):
     """Holds device id and it's info.
+
+    Attributes are read with cuDeviceGetAttribute once into the snapshot
+    (see refresh()), so the properties are cheap to access repeatedly.
     """
     def __init__(self, index):
         """Will get the device by index here.
@@ -942,6 +2679,87 @@ class Device(CU):
         if err:
             raise CU.error(nme, err)
         self._handle = int(dev[0])
+        self._attrs = None
+
+    @property
+    def attributes(self):
+        """Snapshot of the device attributes: tuple indexed by
+        CU_DEVICE_ATTRIBUTE_* value (None for the unsupported ones).
+        """
+        attrs = self._attrs
+        if attrs is None:
+            attrs = self.refresh()
+        return attrs
+
+    def refresh(self):
+        """Queries all known device attributes and replaces the snapshot.
+
+        Returns:
+            The new snapshot (see attributes).
+        """
+        n_attrs = max(value for key, value in cu.__dict__.items()
+                      if key.startswith("CU_DEVICE_ATTRIBUTE_")) + 1
+        n = cu.ffi.new("int *")
+        get_attr = self._lib.cuDeviceGetAttribute
+        handle = self.handle
+        attrs = [None] * n_attrs
+        for attr in range(1, n_attrs):
+            if not get_attr(n, attr, handle):
+                attrs[attr] = int(n[0])
+        self._attrs = tuple(attrs)
+        return self._attrs
+
+    def retain_primary_context(self, flags=None):
+        """Returns Context holding the primary context of the device.
+
+        The primary context is shared with the other libraries (e.g. CUDA
+        runtime) in the process and is released when all of them
+        release it.
+
+        Parameters:
+            flags: flags to set for the primary context
+                   (None - leave the current flags).
+        """
+        if flags is not None:
+            err = self._lib.cuDevicePrimaryCtxSetFlags_v2(self.handle, flags)
+            if err:
+                raise CU.error("cuDevicePrimaryCtxSetFlags_v2", err)
+        return Context(self, primary=True)
+
+    @property
+    def primary_context_state(self):
+        """Returns tuple (flags, active) of the primary context.
+        """
+        flags = cu.ffi.new("unsigned int *")
+        active = cu.ffi.new("int *")
+        err = self._lib.cuDevicePrimaryCtxGetState(self.handle, flags, active)
+        if err:
+            raise CU.error("cuDevicePrimaryCtxGetState", err)
+        return int(flags[0]), bool(active[0])
+
+    def can_access_peer(self, peer):
+        """Returns True if this device can access memory of the peer.
+
+        Parameters:
+            peer: Device instance or it's handle.
+        """
+        if int(peer) == self.handle:
+            return True
+        n = cu.ffi.new("int *")
+        err = self._lib.cuDeviceCanAccessPeer(n, self.handle, peer)
+        if err:
+            raise CU.error("cuDeviceCanAccessPeer", err)
+        return bool(n[0])
+
+    def get_p2p_attribute(self, peer, attrib):
+        """Returns value of CU_DEVICE_P2P_ATTRIBUTE_* for the link
+        from this device to the peer.
+        """
+        n = cu.ffi.new("int *")
+        err = self._lib.cuDeviceGetP2PAttribute(n, attrib, self.handle, peer)
+        if err:
+            raise CU.error("cuDeviceGetP2PAttribute", err)
+        return int(n[0])
 
     def create_context(self, flags=0):
         """Creates the context with the current Device.
@@ -1031,7 +2849,7 @@ class Device(CU):
 
     @property
     def integrated(self):
-        return bool(self._get_attr(cu.CU_DEVICE_ATTRIBUTE_KERNEL_EXEC_TIMEOUT))
+        return bool(self._get_attr(cu.CU_DEVICE_ATTRIBUTE_INTEGRATED))
 
     @property
     def can_map_host_memory(self):
@@ -1116,10 +2934,15 @@ class Device(CU):
         return self._get_attr(cu.CU_DEVICE_ATTRIBUTE_MEMORY_CLOCK_RATE)
 
     def _get_attr(self, attr):
+        attrs = self._attrs
+        if attrs is None:
+            attrs = self.refresh()
+        if attr < len(attrs) and attrs[attr] is not None:
+            return attrs[attr]
         n = cu.ffi.new("int *")
         err = self._lib.cuDeviceGetAttribute(n, attr, self.handle)
         if err:
-            CU.raise_error("cuDeviceGetAttribute", err)
+            raise CU.error("cuDeviceGetAttribute", err)
         return int(n[0])
 
 
@@ -1165,6 +2988,38 @@ class Devices(CU):
                  device.compute_capability + (device.pci_bus_id,)))
         return "\n".join(lines)
 
+    @property
+    def peer_access_matrix(self):
+        """Returns list of lists, where [i][j] is True if device i
+        can access memory of device j directly (True on the diagonal).
+        """
+        return [[src.can_access_peer(dst) for dst in self.devices]
+                for src in self.devices]
+
+    def dump_topology(self):
+        """Returns string with peer-to-peer capabilities
+        for each pair of CUDA devices.
+        """
+        lines = []
+        for i, src in enumerate(self.devices):
+            for j, dst in enumerate(self.devices):
+                if i == j:
+                    continue
+                if not src.can_access_peer(dst):
+                    lines.append("\t%d -> %d: no peer access" % (i, j))
+                    continue
+                lines.append(
+                    "\t%d -> %d: peer access (performance rank %d%s)" % (
+                        i, j, src.get_p2p_attribute(
+                            dst, cu.CU_DEVICE_P2P_ATTRIBUTE_PERFORMANCE_RANK),
+                        ", native atomics" if src.get_p2p_attribute(
+                            dst,
+                            cu.CU_DEVICE_P2P_ATTRIBUTE_NATIVE_ATOMIC_SUPPORTED)
+                        else ""))
+        if not lines:
+            return "No peer devices available."
+        return "\n".join(lines)
+
     def create_some_context(self):
         """Returns Context object with some CUDA device attached.
 
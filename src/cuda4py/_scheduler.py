@@ -0,0 +1,314 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+Scheduling of the tasks over multiple CUDA devices.
+"""
+import collections
+import os
+import threading
+import time
+
+
+def parse_cpulist(text):
+    """Parses cpu list in sysfs format (e.g. "0-3,8,10-11").
+
+    Returns:
+        set of cpu numbers.
+    """
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def numa_cpus(pci_bus_id, sysfs="/sys"):
+    """Returns set of cpus local to the PCI device or None if unknown.
+
+    Parameters:
+        pci_bus_id: PCI bus id of the device (as returned by
+                    Device.pci_bus_id, e.g. "0000:3B:00.0").
+        sysfs: sysfs mount point.
+    """
+    domain, rest = pci_bus_id.lower().split(":", 1)
+    bus_id = "%04x:%s" % (int(domain, 16), rest)
+    try:
+        with open(os.path.join(sysfs, "bus/pci/devices", bus_id,
+                               "numa_node")) as fin:
+            node = int(fin.read())
+        if node < 0:
+            return None
+        with open(os.path.join(sysfs, "devices/system/node",
+                               "node%d" % node, "cpulist")) as fin:
+            return parse_cpulist(fin.read())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class DeviceWorker(object):
+    """Worker thread owning the context on one device.
+
+    Attributes:
+        index: index of the worker.
+        device: Device instance.
+        context: Context instance (created in the worker thread).
+        state: value returned by the scheduler initializer.
+        throughput: measured number of tasks per second.
+        completed: number of completed tasks.
+        cpus: set of cpus the thread was pinned to (None - not pinned).
+    """
+    def __init__(self, scheduler, index, device):
+        self._scheduler = scheduler
+        self.index = index
+        self.device = device
+        self.context = None
+        self.state = None
+        self.throughput = None
+        self.completed = 0
+        self.cpus = None
+        self._thread = threading.Thread(
+            target=self._run, name="cuda4py-worker-%d" % index)
+        self._thread.daemon = True
+
+    def _run(self):
+        scheduler = self._scheduler
+        try:
+            if scheduler.numa_affinity:
+                self._pin()
+            self.context = self.device.create_context(scheduler.context_flags)
+            if scheduler.initializer is not None:
+                with self.context:
+                    self.state = scheduler.initializer(self)
+        except Exception as e:
+            scheduler._started(self, e)
+            return
+        scheduler._started(self, None)
+        try:
+            while True:
+                tasks = scheduler._take(self)
+                if tasks is None:
+                    break
+                start = time.time()
+                with self.context:
+                    for future, fn, args, kwargs in tasks:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        try:
+                            result = fn(self, *args, **kwargs)
+                        except Exception as e:
+                            future.set_exception(e)
+                        else:
+                            future.set_result(result)
+                self._update_throughput(len(tasks), time.time() - start)
+        finally:
+            self.state = None
+            self.context = None
+
+    def _pin(self):
+        if not hasattr(os, "sched_setaffinity"):
+            return
+        cpus = numa_cpus(self.device.pci_bus_id)
+        if cpus:
+            cpus &= os.sched_getaffinity(0)
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+            self.cpus = cpus
+
+    def _update_throughput(self, n, elapsed):
+        self.completed += n
+        value = n / max(elapsed, 1.0e-6)
+        if self.throughput is None:
+            self.throughput = value
+        else:
+            alpha = self._scheduler.smoothing
+            self.throughput = alpha * value + (1 - alpha) * self.throughput
+
+
+class MultiDeviceScheduler(object):
+    """Runs tasks on multiple devices, one context and thread per device.
+
+    Tasks are taken from the shared queue: each worker takes the number
+    of tasks proportional to its measured throughput relative
+    to the other workers, so faster devices get larger shards and
+    idle workers take the remaining tasks (no device waits for a slower
+    one while there is work left).
+
+    Usage:
+        with MultiDeviceScheduler() as scheduler:
+            futures = scheduler.map(process, items)
+            results = [f.result() for f in futures]
+
+    where process(worker, item) is called with the worker's context
+    being current, see DeviceWorker for the available attributes.
+
+    Attributes:
+        workers: list of DeviceWorker instances.
+        initializer: function(worker) called in each worker thread
+                     after the context is created, its result is
+                     stored in worker.state (e.g. compiled modules).
+        numa_affinity: pin worker threads to cpus of the device NUMA node.
+        context_flags: flags for the contexts creation.
+        chunk_size: base number of tasks taken by the worker at once.
+        smoothing: weight of the last measurement in the throughput.
+    """
+    def __init__(self, devices=None, initializer=None, numa_affinity=False,
+                 context_flags=0, chunk_size=1, smoothing=0.3):
+        """Starts the workers.
+
+        Parameters:
+            devices: list of Device instances or Devices
+                     (None - all available devices).
+        """
+        if devices is None:
+            from cuda4py._py import Devices
+            devices = Devices()
+        devices = list(devices)
+        if not devices:
+            raise ValueError("No CUDA devices available")
+        self.initializer = initializer
+        self.numa_affinity = numa_affinity
+        self.context_flags = context_flags
+        self.chunk_size = chunk_size
+        self.smoothing = smoothing
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._n_started = 0
+        self._errors = []
+        self.workers = [DeviceWorker(self, i, device)
+                        for i, device in enumerate(devices)]
+        for worker in self.workers:
+            worker._thread.start()
+        with self._cond:
+            while self._n_started < len(self.workers):
+                self._cond.wait()
+        if self._errors:
+            self.shutdown()
+            raise self._errors[0]
+
+    def _started(self, worker, error):
+        with self._cond:
+            self._n_started += 1
+            if error is not None:
+                self._errors.append(error)
+            self._cond.notify_all()
+
+    def _share(self, worker):
+        """Returns the number of tasks the worker should take at once.
+        """
+        measured = [w.throughput for w in self.workers
+                    if w.throughput is not None]
+        if worker.throughput is None or not measured:
+            return self.chunk_size
+        mean = sum(measured) / len(measured)
+        return max(1, int(round(self.chunk_size * worker.throughput / mean)))
+
+    def _take(self, worker):
+        """Returns list of tasks for the worker or None on shutdown.
+        """
+        with self._cond:
+            while not self._queue:
+                if self._shutdown:
+                    return None
+                self._cond.wait()
+            n = min(self._share(worker), len(self._queue))
+            # leave some work for the others when the queue runs low
+            n = min(n, max(1, len(self._queue) // len(self.workers)))
+            return [self._queue.popleft() for _ in range(n)]
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules fn(worker, *args, **kwargs) on some device.
+
+        Returns:
+            concurrent.futures.Future.
+        """
+        return self._enqueue(((fn, args, kwargs),))[0]
+
+    def map(self, fn, iterable):
+        """Schedules fn(worker, item) for each item.
+
+        Returns:
+            list of concurrent.futures.Future in the order of items.
+        """
+        return self._enqueue((fn, (item,), {}) for item in iterable)
+
+    def _enqueue(self, tasks):
+        import concurrent.futures
+        futures = []
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Cannot schedule after shutdown")
+            for fn, args, kwargs in tasks:
+                future = concurrent.futures.Future()
+                futures.append(future)
+                self._queue.append((future, fn, args, kwargs))
+            self._cond.notify_all()
+        return futures
+
+    @property
+    def throughput(self):
+        """Returns list of the measured tasks per second for each device.
+        """
+        return [worker.throughput for worker in self.workers]
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """Stops the workers after the queued tasks are done.
+
+        Parameters:
+            wait: wait for the worker threads to finish.
+            cancel_pending: cancel the tasks which have not started yet.
+        """
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                while self._queue:
+                    self._queue.popleft()[0].cancel()
+            self._cond.notify_all()
+        if wait:
+            for worker in self.workers:
+                worker._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -0,0 +1,2487 @@
+/*
+ * Stub implementation of the CUDA driver, cuBLAS, cuFFT, NVRTC and cuDNN
+ * entry points bound by cuda4py, working over host memory.
+ *
+ * Device memory is allocated with malloc, so memory copies and sets
+ * do work, kernel launches, FFTs and cuDNN computations are no-ops,
+ * cuBLAS gemm has a reference implementation.
+ *
+ * Built with cffi (see _ffi_build.py) and loaded by the bindings
+ * in place of the real libraries when CUDA4PY_STUB environment variable
+ * is set (see get_backends() in _cffi.py).
+ */
+#include <ctype.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef _WIN32
+#include <windows.h>
+#define STUB_API __declspec(dllexport)
+#define STUB_TLS __declspec(thread)
+#else
+#include <time.h>
+#define STUB_API
+#define STUB_TLS __thread
+#endif
+
+
+/* Driver API */
+
+typedef int CUresult;
+typedef int CUdevice;
+typedef size_t CUcontext;
+typedef size_t CUmodule;
+typedef size_t CUfunction;
+typedef size_t CUstream;
+typedef size_t CUevent;
+typedef size_t CUdeviceptr;
+typedef int CUdevice_attribute;
+typedef size_t (*CUoccupancyB2DSize)(int blockSize);
+typedef int CUmemorytype;
+typedef size_t CUarray;
+typedef size_t CUgraph;
+typedef size_t CUgraphExec;
+typedef size_t CUgraphNode;
+typedef int CUdevice_P2PAttribute;
+typedef int CUstreamCaptureMode;
+typedef int CUstreamCaptureStatus;
+typedef int CUgraphNodeType;
+
+typedef struct CUDA_KERNEL_NODE_PARAMS_st {
+    CUfunction func;
+    unsigned int gridDimX;
+    unsigned int gridDimY;
+    unsigned int gridDimZ;
+    unsigned int blockDimX;
+    unsigned int blockDimY;
+    unsigned int blockDimZ;
+    unsigned int sharedMemBytes;
+    void **kernelParams;
+    void **extra;
+} CUDA_KERNEL_NODE_PARAMS;
+
+typedef struct CUDA_MEMCPY3D_st {
+    size_t srcXInBytes;
+    size_t srcY;
+    size_t srcZ;
+    size_t srcLOD;
+    CUmemorytype srcMemoryType;
+    size_t srcHost;
+    CUdeviceptr srcDevice;
+    CUarray srcArray;
+    void *reserved0;
+    size_t srcPitch;
+    size_t srcHeight;
+
+    size_t dstXInBytes;
+    size_t dstY;
+    size_t dstZ;
+    size_t dstLOD;
+    CUmemorytype dstMemoryType;
+    size_t dstHost;
+    CUdeviceptr dstDevice;
+    CUarray dstArray;
+    void *reserved1;
+    size_t dstPitch;
+    size_t dstHeight;
+
+    size_t WidthInBytes;
+    size_t Height;
+    size_t Depth;
+} CUDA_MEMCPY3D;
+
+#define CUDA_SUCCESS 0
+#define CUDA_ERROR_INVALID_VALUE 1
+#define CUDA_ERROR_OUT_OF_MEMORY 2
+#define CUDA_ERROR_NOT_INITIALIZED 3
+#define CUDA_ERROR_INVALID_DEVICE 101
+#define CUDA_ERROR_INVALID_CONTEXT 201
+#define CUDA_ERROR_INVALID_HANDLE 400
+#define CUDA_ERROR_NOT_FOUND 500
+#define CUDA_ERROR_NOT_READY 600
+#define CUDA_ERROR_PEER_ACCESS_ALREADY_ENABLED 704
+#define CUDA_ERROR_PEER_ACCESS_NOT_ENABLED 705
+#define CUDA_ERROR_NOT_SUPPORTED 801
+
+#define CU_EVENT_DISABLE_TIMING 0x2
+#define CU_MEMORYTYPE_HOST 0x01
+#define CU_MEMORYTYPE_ARRAY 0x03
+
+#define CU_GRAPH_NODE_TYPE_KERNEL 0
+#define CU_GRAPH_NODE_TYPE_MEMCPY 1
+#define CU_GRAPH_NODE_TYPE_MEMSET 2
+
+#define STUB_MAX_DEVICES 16
+#define STUB_MAX_CONTEXT_STACK 64
+#define STUB_NAME_SIZE 256
+#define STUB_GLOBAL_SIZE 4096
+#define STUB_ALIGNMENT 256
+
+
+static int g_initialized = 0;
+static int g_device_count = 1;
+static size_t g_allocated = 0;
+static unsigned long long g_launches = 0;
+
+static STUB_TLS size_t t_ctx_stack[STUB_MAX_CONTEXT_STACK];
+static STUB_TLS int t_ctx_depth = 0;
+
+
+typedef struct stub_context {
+    CUdevice device;
+    unsigned int flags;
+    int primary;
+    int refs;
+    unsigned char peers[STUB_MAX_DEVICES];
+} stub_context;
+
+static stub_context g_primary[STUB_MAX_DEVICES];
+
+
+typedef struct stub_symbol {
+    char name[STUB_NAME_SIZE];
+    void *ptr;
+    size_t size;
+    struct stub_symbol *next;
+} stub_symbol;
+
+typedef struct stub_module {
+    stub_symbol *symbols;
+    char *image;  /* text of the image to look up the declarations in */
+} stub_module;
+
+
+typedef struct stub_node {
+    CUgraphNodeType type;
+    CUDA_KERNEL_NODE_PARAMS kernel;
+    CUDA_MEMCPY3D copy;
+    size_t dst;
+    size_t src;
+    size_t size;
+    unsigned int value;
+} stub_node;
+
+typedef struct stub_graph {
+    stub_node **nodes;
+    size_t n_nodes;
+} stub_graph;
+
+typedef struct stub_graph_exec {
+    stub_node **keys;  /* nodes of the source graph */
+    stub_node *nodes;  /* copies of them */
+    size_t n_nodes;
+} stub_graph_exec;
+
+
+typedef struct stub_stream {
+    unsigned int flags;
+    int priority;
+    stub_graph *capture;
+} stub_stream;
+
+
+typedef struct stub_event {
+    unsigned int flags;
+    int recorded;
+    double ms;
+} stub_event;
+
+
+static double now_ms(void) {
+#ifdef _WIN32
+    LARGE_INTEGER freq, t;
+    QueryPerformanceFrequency(&freq);
+    QueryPerformanceCounter(&t);
+    return (double)t.QuadPart * 1000.0 / (double)freq.QuadPart;
+#else
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return (double)t.tv_sec * 1000.0 + (double)t.tv_nsec * 1.0e-6;
+#endif
+}
+
+
+/* Allocations keep their size in front of the returned pointer,
+   so the number of allocated bytes can be tracked. */
+static void *stub_alloc(size_t size) {
+    unsigned char *p = (unsigned char*)malloc(size + STUB_ALIGNMENT);
+    if (p == NULL) {
+        return NULL;
+    }
+    memset(p + STUB_ALIGNMENT, 0, size);
+    *(size_t*)p = size;
+    g_allocated += size;
+    return p + STUB_ALIGNMENT;
+}
+
+static void stub_free(void *ptr) {
+    unsigned char *p;
+    if (ptr == NULL) {
+        return;
+    }
+    p = (unsigned char*)ptr - STUB_ALIGNMENT;
+    g_allocated -= *(size_t*)p;
+    free(p);
+}
+
+
+static CUresult check_current(void) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (t_ctx_depth <= 0 || t_ctx_stack[t_ctx_depth - 1] == 0) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    return CUDA_SUCCESS;
+}
+
+static CUresult check_device(CUdevice dev) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (dev < 0 || dev >= g_device_count) {
+        return CUDA_ERROR_INVALID_DEVICE;
+    }
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuInit(unsigned int Flags) {
+    const char *env = getenv("CUDA4PY_STUB_DEVICES");
+    (void)Flags;
+    if (!g_initialized && env != NULL && atoi(env) > 0) {
+        g_device_count = atoi(env);
+        if (g_device_count > STUB_MAX_DEVICES) {
+            g_device_count = STUB_MAX_DEVICES;
+        }
+    }
+    g_initialized = 1;
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuDeviceGetCount(int *count) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    *count = g_device_count;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGet(CUdevice *device, int ordinal) {
+    CUresult err = check_device(ordinal);
+    if (err) {
+        return err;
+    }
+    *device = ordinal;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGetAttribute(int *pi, CUdevice_attribute attrib,
+                                       CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    switch (attrib) {
+    case 1: *pi = 1024; break;  /* MAX_THREADS_PER_BLOCK */
+    case 2: case 3: *pi = 1024; break;  /* MAX_BLOCK_DIM_X, Y */
+    case 4: *pi = 64; break;  /* MAX_BLOCK_DIM_Z */
+    case 5: *pi = 2147483647; break;  /* MAX_GRID_DIM_X */
+    case 6: case 7: *pi = 65535; break;  /* MAX_GRID_DIM_Y, Z */
+    case 8: *pi = 49152; break;  /* MAX_SHARED_MEMORY_PER_BLOCK */
+    case 9: *pi = 65536; break;  /* TOTAL_CONSTANT_MEMORY */
+    case 10: *pi = 32; break;  /* WARP_SIZE */
+    case 11: *pi = 2147483647; break;  /* MAX_PITCH */
+    case 12: *pi = 65536; break;  /* MAX_REGISTERS_PER_BLOCK */
+    case 13: *pi = 1000000; break;  /* CLOCK_RATE */
+    case 16: *pi = 8; break;  /* MULTIPROCESSOR_COUNT */
+    case 19: *pi = 1; break;  /* CAN_MAP_HOST_MEMORY */
+    case 31: *pi = 1; break;  /* CONCURRENT_KERNELS */
+    case 33: *pi = dev + 1; break;  /* PCI_BUS_ID */
+    case 36: *pi = 1000000; break;  /* MEMORY_CLOCK_RATE */
+    case 37: *pi = 256; break;  /* GLOBAL_MEMORY_BUS_WIDTH */
+    case 38: *pi = 4194304; break;  /* L2_CACHE_SIZE */
+    case 39: *pi = 2048; break;  /* MAX_THREADS_PER_MULTIPROCESSOR */
+    case 40: *pi = 2; break;  /* ASYNC_ENGINE_COUNT */
+    case 41: *pi = 1; break;  /* UNIFIED_ADDRESSING */
+    case 75: *pi = 7; break;  /* COMPUTE_CAPABILITY_MAJOR */
+    case 76: *pi = 0; break;  /* COMPUTE_CAPABILITY_MINOR */
+    case 78: case 79: case 80: *pi = 1; break;  /* STREAM_PRIORITIES, L1 */
+    case 81: *pi = 98304; break;  /* MAX_SHARED_MEMORY_PER_MULTIPROCESSOR */
+    case 82: *pi = 65536; break;  /* MAX_REGISTERS_PER_MULTIPROCESSOR */
+    case 83: *pi = 1; break;  /* MANAGED_MEMORY */
+    default:
+        if (attrib < 1 || attrib > 85) {
+            return CUDA_ERROR_INVALID_VALUE;
+        }
+        *pi = 0;
+    }
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGetName(char *name, int len, CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    snprintf(name, len, "cuda4py stub device %d", dev);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceTotalMem_v2(size_t *bytes, CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    *bytes = (size_t)1 << 32;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGetPCIBusId(char *pciBusId, int len,
+                                      CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    snprintf(pciBusId, len, "0000:%02x:00.0", dev + 1);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGetByPCIBusId(CUdevice *dev,
+                                        const char *pciBusId) {
+    unsigned int domain = 0, bus = 0;
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (sscanf(pciBusId, "%x:%x", &domain, &bus) != 2 ||
+            (int)bus < 1 || (int)bus > g_device_count) {
+        return CUDA_ERROR_INVALID_DEVICE;
+    }
+    *dev = (CUdevice)bus - 1;
+    return CUDA_SUCCESS;
+}
+
+
+static CUresult push_context(size_t ctx) {
+    if (t_ctx_depth >= STUB_MAX_CONTEXT_STACK) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    t_ctx_stack[t_ctx_depth++] = ctx;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxCreate_v2(CUcontext *pctx, unsigned int flags,
+                                 CUdevice dev) {
+    stub_context *ctx;
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    ctx = (stub_context*)calloc(1, sizeof(stub_context));
+    if (ctx == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    ctx->device = dev;
+    ctx->flags = flags;
+    err = push_context((size_t)ctx);
+    if (err) {
+        free(ctx);
+        return err;
+    }
+    *pctx = (size_t)ctx;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxDestroy_v2(CUcontext ctx) {
+    int i, j;
+    if (ctx == 0 || ((stub_context*)ctx)->primary) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    /* remove it from the current thread stack */
+    for (i = 0, j = 0; i < t_ctx_depth; i++) {
+        if (t_ctx_stack[i] != ctx) {
+            t_ctx_stack[j++] = t_ctx_stack[i];
+        }
+    }
+    t_ctx_depth = j;
+    free((void*)ctx);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxPushCurrent_v2(CUcontext ctx) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (ctx == 0) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    return push_context(ctx);
+}
+
+STUB_API CUresult cuCtxPopCurrent_v2(CUcontext *pctx) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (t_ctx_depth <= 0) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    t_ctx_depth--;
+    if (pctx != NULL) {
+        *pctx = t_ctx_stack[t_ctx_depth];
+    }
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxSetCurrent(CUcontext ctx) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    if (t_ctx_depth > 0) {
+        if (ctx == 0) {
+            t_ctx_depth--;
+        } else {
+            t_ctx_stack[t_ctx_depth - 1] = ctx;
+        }
+        return CUDA_SUCCESS;
+    }
+    return ctx == 0 ? CUDA_SUCCESS : push_context(ctx);
+}
+
+STUB_API CUresult cuCtxGetCurrent(CUcontext *pctx) {
+    if (!g_initialized) {
+        return CUDA_ERROR_NOT_INITIALIZED;
+    }
+    *pctx = t_ctx_depth > 0 ? t_ctx_stack[t_ctx_depth - 1] : 0;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxSynchronize(void) {
+    return check_current();
+}
+
+STUB_API CUresult cuDevicePrimaryCtxRetain(CUcontext *pctx, CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    g_primary[dev].device = dev;
+    g_primary[dev].primary = 1;
+    g_primary[dev].refs++;
+    *pctx = (size_t)&g_primary[dev];
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDevicePrimaryCtxRelease_v2(CUdevice dev) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    if (g_primary[dev].refs <= 0) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    g_primary[dev].refs--;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDevicePrimaryCtxSetFlags_v2(CUdevice dev,
+                                                unsigned int flags) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    g_primary[dev].flags = flags;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDevicePrimaryCtxGetState(CUdevice dev,
+                                             unsigned int *flags,
+                                             int *active) {
+    CUresult err = check_device(dev);
+    if (err) {
+        return err;
+    }
+    *flags = g_primary[dev].flags;
+    *active = g_primary[dev].refs > 0;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxEnablePeerAccess(CUcontext peerContext,
+                                        unsigned int Flags) {
+    stub_context *ctx;
+    CUresult err = check_current();
+    (void)Flags;
+    if (err) {
+        return err;
+    }
+    if (peerContext == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    ctx = (stub_context*)t_ctx_stack[t_ctx_depth - 1];
+    if (ctx->peers[((stub_context*)peerContext)->device]) {
+        return CUDA_ERROR_PEER_ACCESS_ALREADY_ENABLED;
+    }
+    ctx->peers[((stub_context*)peerContext)->device] = 1;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuCtxDisablePeerAccess(CUcontext peerContext) {
+    stub_context *ctx;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (peerContext == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    ctx = (stub_context*)t_ctx_stack[t_ctx_depth - 1];
+    if (!ctx->peers[((stub_context*)peerContext)->device]) {
+        return CUDA_ERROR_PEER_ACCESS_NOT_ENABLED;
+    }
+    ctx->peers[((stub_context*)peerContext)->device] = 0;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceCanAccessPeer(int *canAccessPeer, CUdevice dev,
+                                        CUdevice peerDev) {
+    CUresult err = check_device(dev);
+    if (err || (err = check_device(peerDev))) {
+        return err;
+    }
+    *canAccessPeer = dev != peerDev;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuDeviceGetP2PAttribute(int *value,
+                                          CUdevice_P2PAttribute attrib,
+                                          CUdevice srcDevice,
+                                          CUdevice dstDevice) {
+    CUresult err = check_device(srcDevice);
+    if (err || (err = check_device(dstDevice))) {
+        return err;
+    }
+    if (attrib < 1 || attrib > 4) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    *value = attrib == 1 ? 0 : srcDevice != dstDevice;
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuModuleLoadData(CUmodule *module, const void *image) {
+    stub_module *mod;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (image == NULL) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    mod = (stub_module*)calloc(1, sizeof(stub_module));
+    if (mod == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    mod->image = (char*)malloc(strlen((const char*)image) + 1);
+    if (mod->image == NULL) {
+        free(mod);
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    strcpy(mod->image, (const char*)image);
+    *module = (size_t)mod;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuModuleUnload(CUmodule hmod) {
+    stub_module *mod = (stub_module*)hmod;
+    stub_symbol *sym, *next;
+    if (mod == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    for (sym = mod->symbols; sym != NULL; sym = next) {
+        next = sym->next;
+        stub_free(sym->ptr);
+        free(sym);
+    }
+    free(mod->image);
+    free(mod);
+    return CUDA_SUCCESS;
+}
+
+/* Returns the symbol of the module by name, adds it if necessary. */
+static stub_symbol *get_symbol(stub_module *mod, const char *name,
+                               size_t size) {
+    stub_symbol *sym;
+    for (sym = mod->symbols; sym != NULL; sym = sym->next) {
+        if (!strcmp(sym->name, name)) {
+            return sym;
+        }
+    }
+    sym = (stub_symbol*)calloc(1, sizeof(stub_symbol));
+    if (sym == NULL) {
+        return NULL;
+    }
+    strncpy(sym->name, name, STUB_NAME_SIZE - 1);
+    sym->size = size;
+    sym->ptr = size ? stub_alloc(size) : NULL;
+    if (size && sym->ptr == NULL) {
+        free(sym);
+        return NULL;
+    }
+    sym->next = mod->symbols;
+    mod->symbols = sym;
+    return sym;
+}
+
+static int is_ident(char c) {
+    return isalnum((unsigned char)c) || c == '_';
+}
+
+/* Returns the size of the global variable declared in the image
+   (CUDA C for the stub NVRTC or PTX) as "<type> name" or "<type> name[n]",
+   0 if the declaration was not found. */
+static size_t declared_size(const char *image, const char *name) {
+    static const struct {
+        const char *type;
+        size_t size;
+    } types[] = {
+        {"char", 1}, {"short", 2}, {"half", 2}, {"__half", 2},
+        {"int", 4}, {"float", 4}, {"long", 8}, {"double", 8},
+        {"size_t", 8},
+        {".b8", 1}, {".u8", 1}, {".s8", 1},
+        {".b16", 2}, {".u16", 2}, {".s16", 2}, {".f16", 2},
+        {".b32", 4}, {".u32", 4}, {".s32", 4}, {".f32", 4},
+        {".b64", 8}, {".u64", 8}, {".s64", 8}, {".f64", 8}};
+    size_t len = strlen(name), i, n;
+    const char *p, *start, *end;
+    if (image == NULL || len == 0) {
+        return 0;
+    }
+    for (p = strstr(image, name); p != NULL; p = strstr(p + 1, name)) {
+        if ((p > image && is_ident(p[-1])) || is_ident(p[len])) {
+            continue;
+        }
+        end = p;
+        while (end > image && isspace((unsigned char)end[-1])) {
+            end--;
+        }
+        start = end;
+        while (start > image && (is_ident(start[-1]) || start[-1] == '.')) {
+            start--;
+        }
+        for (i = 0; i < sizeof(types) / sizeof(types[0]); i++) {
+            if (strlen(types[i].type) == (size_t)(end - start) &&
+                    !strncmp(types[i].type, start, end - start)) {
+                break;
+            }
+        }
+        if (i == sizeof(types) / sizeof(types[0])) {
+            continue;
+        }
+        end = p + len;
+        while (isspace((unsigned char)*end)) {
+            end++;
+        }
+        n = *end == '[' ? (size_t)strtoul(end + 1, NULL, 0) : 1;
+        return types[i].size * (n ? n : 1);
+    }
+    return 0;
+}
+
+STUB_API CUresult cuModuleGetFunction(CUfunction *hfunc, CUmodule hmod,
+                                      const char *name) {
+    stub_symbol *sym;
+    if (hmod == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    sym = get_symbol((stub_module*)hmod, name, 0);
+    if (sym == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    *hfunc = (size_t)sym;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuModuleGetGlobal_v2(CUdeviceptr *dptr, size_t *bytes,
+                                       CUmodule hmod, const char *name) {
+    stub_module *mod = (stub_module*)hmod;
+    stub_symbol *sym;
+    size_t size;
+    if (mod == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    size = declared_size(mod->image, name);
+    sym = get_symbol(mod, name, size ? size : STUB_GLOBAL_SIZE);
+    if (sym == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    if (dptr != NULL) {
+        *dptr = (size_t)sym->ptr;
+    }
+    if (bytes != NULL) {
+        *bytes = sym->size;
+    }
+    return CUDA_SUCCESS;
+}
+
+
+/* Appends the node to the graph, returns NULL on failure. */
+static stub_node *add_node(stub_graph *graph, CUgraphNodeType type) {
+    stub_node **nodes;
+    stub_node *node = (stub_node*)calloc(1, sizeof(stub_node));
+    if (node == NULL) {
+        return NULL;
+    }
+    nodes = (stub_node**)realloc(
+        graph->nodes, (graph->n_nodes + 1) * sizeof(stub_node*));
+    if (nodes == NULL) {
+        free(node);
+        return NULL;
+    }
+    node->type = type;
+    graph->nodes = nodes;
+    graph->nodes[graph->n_nodes++] = node;
+    return node;
+}
+
+static stub_graph *capturing(CUstream hStream) {
+    return hStream ? ((stub_stream*)hStream)->capture : NULL;
+}
+
+STUB_API CUresult cuLaunchKernel(CUfunction f,
+                                 unsigned int gridDimX,
+                                 unsigned int gridDimY,
+                                 unsigned int gridDimZ,
+                                 unsigned int blockDimX,
+                                 unsigned int blockDimY,
+                                 unsigned int blockDimZ,
+                                 unsigned int sharedMemBytes,
+                                 CUstream hStream,
+                                 void **kernelParams,
+                                 void **extra) {
+    stub_graph *graph = capturing(hStream);
+    stub_node *node;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (f == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    if (!gridDimX || !gridDimY || !gridDimZ ||
+            !blockDimX || !blockDimY || !blockDimZ ||
+            blockDimX * blockDimY * blockDimZ > 1024) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    if (graph == NULL) {
+        g_launches++;
+        return CUDA_SUCCESS;
+    }
+    node = add_node(graph, CU_GRAPH_NODE_TYPE_KERNEL);
+    if (node == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    node->kernel.func = f;
+    node->kernel.gridDimX = gridDimX;
+    node->kernel.gridDimY = gridDimY;
+    node->kernel.gridDimZ = gridDimZ;
+    node->kernel.blockDimX = blockDimX;
+    node->kernel.blockDimY = blockDimY;
+    node->kernel.blockDimZ = blockDimZ;
+    node->kernel.sharedMemBytes = sharedMemBytes;
+    node->kernel.kernelParams = kernelParams;
+    node->kernel.extra = extra;
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuMemAlloc_v2(CUdeviceptr *dptr, size_t bytesize) {
+    void *ptr;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (!bytesize) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    ptr = stub_alloc(bytesize);
+    if (ptr == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    *dptr = (size_t)ptr;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuMemFree_v2(CUdeviceptr dptr) {
+    stub_free((void*)dptr);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuMemAllocManaged(CUdeviceptr *dptr, size_t bytesize,
+                                    unsigned int flags) {
+    (void)flags;
+    return cuMemAlloc_v2(dptr, bytesize);
+}
+
+STUB_API CUresult cuMemHostAlloc(size_t *pp, size_t bytesize,
+                                 unsigned int Flags) {
+    (void)Flags;
+    return cuMemAlloc_v2(pp, bytesize);
+}
+
+STUB_API CUresult cuMemFreeHost(size_t p) {
+    return cuMemFree_v2(p);
+}
+
+STUB_API CUresult cuMemHostRegister_v2(size_t p, size_t bytesize,
+                                       unsigned int Flags) {
+    CUresult err = check_current();
+    (void)Flags;
+    if (err) {
+        return err;
+    }
+    return p && bytesize ? CUDA_SUCCESS : CUDA_ERROR_INVALID_VALUE;
+}
+
+STUB_API CUresult cuMemHostUnregister(size_t p) {
+    return p ? CUDA_SUCCESS : CUDA_ERROR_INVALID_VALUE;
+}
+
+STUB_API CUresult cuMemHostGetDevicePointer_v2(CUdeviceptr *pdptr, size_t p,
+                                               unsigned int Flags) {
+    (void)Flags;
+    *pdptr = p;
+    return CUDA_SUCCESS;
+}
+
+
+static CUresult copy_async(size_t dst, size_t src, size_t size,
+                           CUstream hStream) {
+    stub_graph *graph = capturing(hStream);
+    stub_node *node;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (graph == NULL) {
+        memmove((void*)dst, (const void*)src, size);
+        return CUDA_SUCCESS;
+    }
+    node = add_node(graph, CU_GRAPH_NODE_TYPE_MEMCPY);
+    if (node == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    node->dst = dst;
+    node->src = src;
+    node->size = size;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuMemcpyDtoH_v2(size_t dstHost, CUdeviceptr srcDevice,
+                                  size_t ByteCount) {
+    return copy_async(dstHost, srcDevice, ByteCount, 0);
+}
+
+STUB_API CUresult cuMemcpyHtoD_v2(CUdeviceptr dstDevice, size_t srcHost,
+                                  size_t ByteCount) {
+    return copy_async(dstDevice, srcHost, ByteCount, 0);
+}
+
+STUB_API CUresult cuMemcpyDtoHAsync_v2(size_t dstHost, CUdeviceptr srcDevice,
+                                       size_t ByteCount, CUstream hStream) {
+    return copy_async(dstHost, srcDevice, ByteCount, hStream);
+}
+
+STUB_API CUresult cuMemcpyHtoDAsync_v2(CUdeviceptr dstDevice, size_t srcHost,
+                                       size_t ByteCount, CUstream hStream) {
+    return copy_async(dstDevice, srcHost, ByteCount, hStream);
+}
+
+STUB_API CUresult cuMemcpyDtoDAsync_v2(CUdeviceptr dstDevice,
+                                       CUdeviceptr srcDevice,
+                                       size_t ByteCount, CUstream hStream) {
+    return copy_async(dstDevice, srcDevice, ByteCount, hStream);
+}
+
+STUB_API CUresult cuMemcpyPeerAsync(CUdeviceptr dstDevice,
+                                    CUcontext dstContext,
+                                    CUdeviceptr srcDevice,
+                                    CUcontext srcContext,
+                                    size_t ByteCount, CUstream hStream) {
+    if (dstContext == 0 || srcContext == 0) {
+        return CUDA_ERROR_INVALID_CONTEXT;
+    }
+    return copy_async(dstDevice, srcDevice, ByteCount, hStream);
+}
+
+static void memset_d32(size_t dst, unsigned int value, size_t n) {
+    unsigned int *p = (unsigned int*)dst;
+    size_t i;
+    for (i = 0; i < n; i++) {
+        p[i] = value;
+    }
+}
+
+STUB_API CUresult cuMemsetD32Async(CUdeviceptr dstDevice, unsigned int ui,
+                                   size_t N, CUstream hStream) {
+    stub_graph *graph = capturing(hStream);
+    stub_node *node;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (dstDevice & 3) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    if (graph == NULL) {
+        memset_d32(dstDevice, ui, N);
+        return CUDA_SUCCESS;
+    }
+    node = add_node(graph, CU_GRAPH_NODE_TYPE_MEMSET);
+    if (node == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    node->dst = dstDevice;
+    node->value = ui;
+    node->size = N;
+    return CUDA_SUCCESS;
+}
+
+static void memcpy_3d(const CUDA_MEMCPY3D *p) {
+    const unsigned char *src = (const unsigned char*)(
+        p->srcMemoryType == CU_MEMORYTYPE_HOST ? p->srcHost : p->srcDevice);
+    unsigned char *dst = (unsigned char*)(
+        p->dstMemoryType == CU_MEMORYTYPE_HOST ? p->dstHost : p->dstDevice);
+    size_t y, z;
+    for (z = 0; z < (p->Depth ? p->Depth : 1); z++) {
+        for (y = 0; y < (p->Height ? p->Height : 1); y++) {
+            memmove(
+                dst + ((p->dstZ + z) * p->dstHeight + p->dstY + y) *
+                p->dstPitch + p->dstXInBytes,
+                src + ((p->srcZ + z) * p->srcHeight + p->srcY + y) *
+                p->srcPitch + p->srcXInBytes,
+                p->WidthInBytes);
+        }
+    }
+}
+
+STUB_API CUresult cuMemcpy3DAsync_v2(const CUDA_MEMCPY3D *pCopy,
+                                     CUstream hStream) {
+    stub_graph *graph = capturing(hStream);
+    stub_node *node;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (pCopy->srcMemoryType == CU_MEMORYTYPE_ARRAY ||
+            pCopy->dstMemoryType == CU_MEMORYTYPE_ARRAY) {
+        return CUDA_ERROR_NOT_SUPPORTED;
+    }
+    if (graph == NULL) {
+        memcpy_3d(pCopy);
+        return CUDA_SUCCESS;
+    }
+    node = add_node(graph, CU_GRAPH_NODE_TYPE_MEMCPY);
+    if (node == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    node->copy = *pCopy;
+    node->size = 0;  /* marks the 3D copy */
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuCtxGetStreamPriorityRange(int *leastPriority,
+                                              int *greatestPriority) {
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    if (leastPriority != NULL) {
+        *leastPriority = 0;
+    }
+    if (greatestPriority != NULL) {
+        *greatestPriority = -5;
+    }
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamCreateWithPriority(CUstream *phStream,
+                                             unsigned int flags,
+                                             int priority) {
+    stub_stream *stream;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    stream = (stub_stream*)calloc(1, sizeof(stub_stream));
+    if (stream == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    stream->flags = flags;
+    stream->priority = priority > 0 ? 0 : priority < -5 ? -5 : priority;
+    *phStream = (size_t)stream;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamCreate(CUstream *phStream, unsigned int Flags) {
+    return cuStreamCreateWithPriority(phStream, Flags, 0);
+}
+
+STUB_API CUresult cuStreamGetPriority(CUstream hStream, int *priority) {
+    *priority = hStream ? ((stub_stream*)hStream)->priority : 0;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamGetFlags(CUstream hStream, unsigned int *flags) {
+    *flags = hStream ? ((stub_stream*)hStream)->flags : 0;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamQuery(CUstream hStream) {
+    (void)hStream;
+    return check_current();
+}
+
+STUB_API CUresult cuStreamSynchronize(CUstream hStream) {
+    (void)hStream;
+    return check_current();
+}
+
+STUB_API CUresult cuStreamWaitEvent(CUstream hStream, CUevent hEvent,
+                                    unsigned int Flags) {
+    (void)hStream;
+    (void)Flags;
+    return hEvent ? CUDA_SUCCESS : CUDA_ERROR_INVALID_HANDLE;
+}
+
+
+STUB_API CUresult cuEventCreate(CUevent *phEvent, unsigned int Flags) {
+    stub_event *event;
+    CUresult err = check_current();
+    if (err) {
+        return err;
+    }
+    event = (stub_event*)calloc(1, sizeof(stub_event));
+    if (event == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    event->flags = Flags;
+    *phEvent = (size_t)event;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuEventRecord(CUevent hEvent, CUstream hStream) {
+    stub_event *event = (stub_event*)hEvent;
+    (void)hStream;
+    if (event == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    event->recorded = 1;
+    event->ms = now_ms();
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuEventQuery(CUevent hEvent) {
+    return hEvent ? CUDA_SUCCESS : CUDA_ERROR_INVALID_HANDLE;
+}
+
+STUB_API CUresult cuEventSynchronize(CUevent hEvent) {
+    return hEvent ? CUDA_SUCCESS : CUDA_ERROR_INVALID_HANDLE;
+}
+
+STUB_API CUresult cuEventElapsedTime(float *pMilliseconds, CUevent hStart,
+                                     CUevent hEnd) {
+    stub_event *start = (stub_event*)hStart, *end = (stub_event*)hEnd;
+    if (start == NULL || end == NULL ||
+            ((start->flags | end->flags) & CU_EVENT_DISABLE_TIMING)) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    if (!start->recorded || !end->recorded) {
+        return CUDA_ERROR_NOT_READY;
+    }
+    *pMilliseconds = (float)(end->ms - start->ms);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuEventDestroy_v2(CUevent hEvent) {
+    if (hEvent == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    free((void*)hEvent);
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuGraphCreate(CUgraph *phGraph, unsigned int flags) {
+    stub_graph *graph = (stub_graph*)calloc(1, sizeof(stub_graph));
+    (void)flags;
+    if (graph == NULL) {
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    *phGraph = (size_t)graph;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphDestroy(CUgraph hGraph) {
+    stub_graph *graph = (stub_graph*)hGraph;
+    size_t i;
+    if (graph == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    for (i = 0; i < graph->n_nodes; i++) {
+        free(graph->nodes[i]);
+    }
+    free(graph->nodes);
+    free(graph);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamBeginCapture_v2(CUstream hStream,
+                                          CUstreamCaptureMode mode) {
+    stub_stream *stream = (stub_stream*)hStream;
+    CUgraph graph;
+    CUresult err;
+    (void)mode;
+    if (stream == NULL || stream->capture != NULL) {
+        return CUDA_ERROR_INVALID_VALUE;  /* legacy stream or capturing */
+    }
+    err = cuGraphCreate(&graph, 0);
+    if (err) {
+        return err;
+    }
+    stream->capture = (stub_graph*)graph;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamEndCapture(CUstream hStream, CUgraph *phGraph) {
+    stub_stream *stream = (stub_stream*)hStream;
+    if (stream == NULL || stream->capture == NULL) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    *phGraph = (size_t)stream->capture;
+    stream->capture = NULL;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamIsCapturing(CUstream hStream,
+                                      CUstreamCaptureStatus *captureStatus) {
+    *captureStatus = capturing(hStream) != NULL;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuStreamDestroy_v2(CUstream hStream) {
+    stub_stream *stream = (stub_stream*)hStream;
+    if (stream == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    if (stream->capture != NULL) {
+        cuGraphDestroy((size_t)stream->capture);
+    }
+    free(stream);
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphGetNodes(CUgraph hGraph, CUgraphNode *nodes,
+                                  size_t *numNodes) {
+    stub_graph *graph = (stub_graph*)hGraph;
+    size_t i;
+    if (graph == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    if (nodes == NULL) {
+        *numNodes = graph->n_nodes;
+        return CUDA_SUCCESS;
+    }
+    if (*numNodes > graph->n_nodes) {
+        *numNodes = graph->n_nodes;
+    }
+    for (i = 0; i < *numNodes; i++) {
+        nodes[i] = (size_t)graph->nodes[i];
+    }
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphNodeGetType(CUgraphNode hNode,
+                                     CUgraphNodeType *type) {
+    if (hNode == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    *type = ((stub_node*)hNode)->type;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphKernelNodeGetParams(
+        CUgraphNode hNode, CUDA_KERNEL_NODE_PARAMS *nodeParams) {
+    stub_node *node = (stub_node*)hNode;
+    if (node == NULL || node->type != CU_GRAPH_NODE_TYPE_KERNEL) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    *nodeParams = node->kernel;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphInstantiateWithFlags(CUgraphExec *phGraphExec,
+                                              CUgraph hGraph,
+                                              unsigned long long flags) {
+    stub_graph *graph = (stub_graph*)hGraph;
+    stub_graph_exec *exec;
+    size_t i, n;
+    (void)flags;
+    if (graph == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    n = graph->n_nodes ? graph->n_nodes : 1;
+    exec = (stub_graph_exec*)calloc(1, sizeof(stub_graph_exec));
+    if (exec != NULL) {
+        exec->keys = (stub_node**)calloc(n, sizeof(stub_node*));
+        exec->nodes = (stub_node*)calloc(n, sizeof(stub_node));
+    }
+    if (exec == NULL || exec->keys == NULL || exec->nodes == NULL) {
+        if (exec != NULL) {
+            free(exec->keys);
+            free(exec->nodes);
+            free(exec);
+        }
+        return CUDA_ERROR_OUT_OF_MEMORY;
+    }
+    exec->n_nodes = graph->n_nodes;
+    for (i = 0; i < graph->n_nodes; i++) {
+        exec->keys[i] = graph->nodes[i];
+        exec->nodes[i] = *graph->nodes[i];
+    }
+    *phGraphExec = (size_t)exec;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphExecKernelNodeSetParams(
+        CUgraphExec hGraphExec, CUgraphNode hNode,
+        const CUDA_KERNEL_NODE_PARAMS *nodeParams) {
+    stub_graph_exec *exec = (stub_graph_exec*)hGraphExec;
+    size_t i;
+    if (exec == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    for (i = 0; i < exec->n_nodes; i++) {
+        if (exec->keys[i] == (stub_node*)hNode &&
+                exec->nodes[i].type == CU_GRAPH_NODE_TYPE_KERNEL) {
+            exec->nodes[i].kernel = *nodeParams;
+            return CUDA_SUCCESS;
+        }
+    }
+    return CUDA_ERROR_INVALID_VALUE;
+}
+
+STUB_API CUresult cuGraphLaunch(CUgraphExec hGraphExec, CUstream hStream) {
+    stub_graph_exec *exec = (stub_graph_exec*)hGraphExec;
+    stub_node *node;
+    size_t i;
+    CUresult err = check_current();
+    (void)hStream;
+    if (err) {
+        return err;
+    }
+    if (exec == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    for (i = 0; i < exec->n_nodes; i++) {
+        node = &exec->nodes[i];
+        switch (node->type) {
+        case CU_GRAPH_NODE_TYPE_KERNEL:
+            g_launches++;
+            break;
+        case CU_GRAPH_NODE_TYPE_MEMCPY:
+            if (node->size) {
+                memmove((void*)node->dst, (const void*)node->src,
+                        node->size);
+            } else {
+                memcpy_3d(&node->copy);
+            }
+            break;
+        case CU_GRAPH_NODE_TYPE_MEMSET:
+            memset_d32(node->dst, node->value, node->size);
+            break;
+        }
+    }
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuGraphExecDestroy(CUgraphExec hGraphExec) {
+    stub_graph_exec *exec = (stub_graph_exec*)hGraphExec;
+    if (exec == NULL) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    free(exec->keys);
+    free(exec->nodes);
+    free(exec);
+    return CUDA_SUCCESS;
+}
+
+
+STUB_API CUresult cuOccupancyMaxActiveBlocksPerMultiprocessor(
+        int *numBlocks, CUfunction func, int blockSize,
+        size_t dynamicSMemSize) {
+    (void)dynamicSMemSize;
+    if (func == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    if (blockSize <= 0 || blockSize > 1024) {
+        return CUDA_ERROR_INVALID_VALUE;
+    }
+    *numBlocks = 2048 / blockSize < 32 ? 2048 / blockSize : 32;
+    return CUDA_SUCCESS;
+}
+
+STUB_API CUresult cuOccupancyMaxPotentialBlockSize(
+        int *minGridSize, int *blockSize, CUfunction func,
+        CUoccupancyB2DSize blockSizeToDynamicSMemSize,
+        size_t dynamicSMemSize, int blockSizeLimit) {
+    (void)blockSizeToDynamicSMemSize;
+    (void)dynamicSMemSize;
+    if (func == 0) {
+        return CUDA_ERROR_INVALID_HANDLE;
+    }
+    *blockSize = blockSizeLimit > 0 && blockSizeLimit < 1024 ?
+        blockSizeLimit : 1024;
+    *minGridSize = 8 * (2048 / *blockSize);
+    return CUDA_SUCCESS;
+}
+
+
+/* cuBLAS */
+
+typedef int cublasStatus_t;
+typedef void *cublasHandle_t;
+typedef int cublasOperation_t;
+typedef int cublasPointerMode_t;
+typedef int cublasDataType_t;
+
+#define CUBLAS_STATUS_SUCCESS 0
+#define CUBLAS_STATUS_NOT_INITIALIZED 1
+#define CUBLAS_STATUS_ALLOC_FAILED 3
+#define CUBLAS_STATUS_INVALID_VALUE 7
+#define CUBLAS_STATUS_NOT_SUPPORTED 15
+
+#define CUBLAS_OP_N 0
+#define CUBLAS_DATA_FLOAT 0
+#define CUBLAS_DATA_HALF 2
+
+typedef struct stub_cublas {
+    cublasPointerMode_t pointer_mode;
+    size_t stream;
+} stub_cublas;
+
+STUB_API cublasStatus_t cublasCreate_v2(cublasHandle_t *handle) {
+    if (check_current()) {
+        return CUBLAS_STATUS_NOT_INITIALIZED;
+    }
+    *handle = calloc(1, sizeof(stub_cublas));
+    return *handle ? CUBLAS_STATUS_SUCCESS : CUBLAS_STATUS_ALLOC_FAILED;
+}
+
+STUB_API cublasStatus_t cublasDestroy_v2(cublasHandle_t handle) {
+    if (handle == NULL) {
+        return CUBLAS_STATUS_NOT_INITIALIZED;
+    }
+    free(handle);
+    return CUBLAS_STATUS_SUCCESS;
+}
+
+STUB_API cublasStatus_t cublasSetPointerMode_v2(cublasHandle_t handle,
+                                                cublasPointerMode_t mode) {
+    if (handle == NULL) {
+        return CUBLAS_STATUS_NOT_INITIALIZED;
+    }
+    ((stub_cublas*)handle)->pointer_mode = mode;
+    return CUBLAS_STATUS_SUCCESS;
+}
+
+STUB_API cublasStatus_t cublasSetStream_v2(cublasHandle_t handle,
+                                           size_t streamId) {
+    if (handle == NULL) {
+        return CUBLAS_STATUS_NOT_INITIALIZED;
+    }
+    ((stub_cublas*)handle)->stream = streamId;
+    return CUBLAS_STATUS_SUCCESS;
+}
+
+static float half_to_float(uint16_t h) {
+    uint32_t sign = (uint32_t)(h & 0x8000) << 16;
+    uint32_t exp = (h >> 10) & 0x1f, mant = h & 0x3ff, bits;
+    float f;
+    if (exp == 0x1f) {
+        bits = sign | 0x7f800000 | (mant << 13);
+    } else if (exp) {
+        bits = sign | ((exp + 112) << 23) | (mant << 13);
+    } else if (mant) {
+        exp = 113;
+        while (!(mant & 0x400)) {
+            mant <<= 1;
+            exp--;
+        }
+        bits = sign | (exp << 23) | ((mant & 0x3ff) << 13);
+    } else {
+        bits = sign;
+    }
+    memcpy(&f, &bits, sizeof(f));
+    return f;
+}
+
+static uint16_t float_to_half(float f) {
+    uint32_t bits, mant;
+    uint16_t sign;
+    int exp;
+    memcpy(&bits, &f, sizeof(bits));
+    sign = (uint16_t)((bits >> 16) & 0x8000);
+    exp = (int)((bits >> 23) & 0xff) - 112;
+    mant = bits & 0x7fffff;
+    if (((bits >> 23) & 0xff) == 0xff) {
+        return sign | 0x7c00 | (mant ? 0x200 : 0);
+    }
+    if (exp >= 0x1f) {
+        return sign | 0x7c00;
+    }
+    if (exp <= 0) {
+        if (exp < -10) {
+            return sign;
+        }
+        mant = (mant | 0x800000) >> (1 - exp);
+        return sign | (uint16_t)((mant + 0x1000) >> 13);
+    }
+    bits = ((uint32_t)exp << 10) | (mant >> 13);
+    bits += (mant >> 12) & 1;  /* round */
+    return sign | (uint16_t)bits;
+}
+
+static double load(const void *p, size_t i, cublasDataType_t type) {
+    switch (type) {
+    case CUBLAS_DATA_FLOAT:
+        return ((const float*)p)[i];
+    case CUBLAS_DATA_HALF:
+        return half_to_float(((const uint16_t*)p)[i]);
+    default:
+        return ((const double*)p)[i];
+    }
+}
+
+static void store(void *p, size_t i, cublasDataType_t type, double v) {
+    switch (type) {
+    case CUBLAS_DATA_FLOAT:
+        ((float*)p)[i] = (float)v;
+        break;
+    case CUBLAS_DATA_HALF:
+        ((uint16_t*)p)[i] = float_to_half((float)v);
+        break;
+    default:
+        ((double*)p)[i] = v;
+    }
+}
+
+/* Reference column-major gemm: C = alpha * op(A) * op(B) + beta * C. */
+static cublasStatus_t gemm(
+        cublasHandle_t handle, cublasOperation_t transa,
+        cublasOperation_t transb, int m, int n, int k,
+        double alpha, const void *A, cublasDataType_t Atype, int lda,
+        const void *B, cublasDataType_t Btype, int ldb,
+        double beta, void *C, cublasDataType_t Ctype, int ldc) {
+    int i, j, l;
+    double sum;
+    if (handle == NULL) {
+        return CUBLAS_STATUS_NOT_INITIALIZED;
+    }
+    if (m < 0 || n < 0 || k < 0 ||
+            lda < (transa == CUBLAS_OP_N ? m : k) ||
+            ldb < (transb == CUBLAS_OP_N ? k : n) || ldc < m) {
+        return CUBLAS_STATUS_INVALID_VALUE;
+    }
+    for (j = 0; j < n; j++) {
+        for (i = 0; i < m; i++) {
+            sum = 0;
+            for (l = 0; l < k; l++) {
+                sum += load(A, transa == CUBLAS_OP_N ?
+                            (size_t)l * lda + i : (size_t)i * lda + l,
+                            Atype) *
+                       load(B, transb == CUBLAS_OP_N ?
+                            (size_t)j * ldb + l : (size_t)l * ldb + j,
+                            Btype);
+            }
+            sum *= alpha;
+            if (beta != 0) {
+                sum += beta * load(C, (size_t)j * ldc + i, Ctype);
+            }
+            store(C, (size_t)j * ldc + i, Ctype, sum);
+        }
+    }
+    return CUBLAS_STATUS_SUCCESS;
+}
+
+STUB_API cublasStatus_t cublasSgemm_v2(
+        cublasHandle_t handle, cublasOperation_t transa,
+        cublasOperation_t transb, int m, int n, int k,
+        size_t alpha, size_t A, int lda, size_t B, int ldb,
+        size_t beta, size_t C, int ldc) {
+    return gemm(handle, transa, transb, m, n, k,
+                *(const float*)alpha, (const void*)A, CUBLAS_DATA_FLOAT, lda,
+                (const void*)B, CUBLAS_DATA_FLOAT, ldb,
+                *(const float*)beta, (void*)C, CUBLAS_DATA_FLOAT, ldc);
+}
+
+STUB_API cublasStatus_t cublasDgemm_v2(
+        cublasHandle_t handle, cublasOperation_t transa,
+        cublasOperation_t transb, int m, int n, int k,
+        size_t alpha, size_t A, int lda, size_t B, int ldb,
+        size_t beta, size_t C, int ldc) {
+    return gemm(handle, transa, transb, m, n, k,
+                *(const double*)alpha, (const void*)A, 1, lda,
+                (const void*)B, 1, ldb,
+                *(const double*)beta, (void*)C, 1, ldc);
+}
+
+STUB_API cublasStatus_t cublasSgemmEx(
+        cublasHandle_t handle, cublasOperation_t transa,
+        cublasOperation_t transb, int m, int n, int k,
+        size_t alpha, size_t A, cublasDataType_t Atype, int lda,
+        size_t B, cublasDataType_t Btype, int ldb,
+        size_t beta, size_t C, cublasDataType_t Ctype, int ldc) {
+    if ((Atype != CUBLAS_DATA_FLOAT && Atype != CUBLAS_DATA_HALF) ||
+            (Btype != CUBLAS_DATA_FLOAT && Btype != CUBLAS_DATA_HALF) ||
+            (Ctype != CUBLAS_DATA_FLOAT && Ctype != CUBLAS_DATA_HALF)) {
+        return CUBLAS_STATUS_NOT_SUPPORTED;
+    }
+    return gemm(handle, transa, transb, m, n, k,
+                *(const float*)alpha, (const void*)A, Atype, lda,
+                (const void*)B, Btype, ldb,
+                *(const float*)beta, (void*)C, Ctype, ldc);
+}
+
+
+/* cuFFT (plans only, transforms are no-ops) */
+
+typedef int cufftResult;
+typedef int cufftHandle;
+typedef int cufftType;
+
+#define CUFFT_SUCCESS 0
+#define CUFFT_INVALID_PLAN 1
+#define CUFFT_ALLOC_FAILED 2
+#define CUFFT_INVALID_VALUE 4
+
+/* Work area sizes of the plans, the plan handle is index + 1 */
+static size_t *g_fft_sizes = NULL;
+static int g_fft_plans = 0;
+
+static int valid_plan(cufftHandle plan) {
+    return plan > 0 && plan <= g_fft_plans;
+}
+
+STUB_API cufftResult cufftCreate(cufftHandle *plan) {
+    size_t *sizes = (size_t*)realloc(
+        g_fft_sizes, (g_fft_plans + 1) * sizeof(size_t));
+    if (sizes == NULL) {
+        return CUFFT_ALLOC_FAILED;
+    }
+    g_fft_sizes = sizes;
+    g_fft_sizes[g_fft_plans] = 0;
+    *plan = ++g_fft_plans;
+    return CUFFT_SUCCESS;
+}
+
+STUB_API cufftResult cufftDestroy(cufftHandle plan) {
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+STUB_API cufftResult cufftSetAutoAllocation(cufftHandle plan,
+                                            int autoAllocate) {
+    (void)autoAllocate;
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+STUB_API cufftResult cufftMakePlanMany(
+        cufftHandle plan, int rank, int *n,
+        int *inembed, int istride, int idist,
+        int *onembed, int ostride, int odist,
+        cufftType type, int batch, size_t *workSize) {
+    size_t size = (size_t)batch;
+    int i;
+    (void)inembed; (void)istride; (void)idist;
+    (void)onembed; (void)ostride; (void)odist; (void)type;
+    if (!valid_plan(plan)) {
+        return CUFFT_INVALID_PLAN;
+    }
+    if (rank < 1 || rank > 3 || n == NULL || batch < 1) {
+        return CUFFT_INVALID_VALUE;
+    }
+    for (i = 0; i < rank; i++) {
+        size *= n[i];
+    }
+    /* room for a double complex copy of the data */
+    g_fft_sizes[plan - 1] = size * 16;
+    if (workSize != NULL) {
+        *workSize = g_fft_sizes[plan - 1];
+    }
+    return CUFFT_SUCCESS;
+}
+
+STUB_API cufftResult cufftGetSize(cufftHandle handle, size_t *workSize) {
+    if (!valid_plan(handle)) {
+        return CUFFT_INVALID_PLAN;
+    }
+    *workSize = g_fft_sizes[handle - 1];
+    return CUFFT_SUCCESS;
+}
+
+STUB_API cufftResult cufftSetWorkArea(cufftHandle plan, size_t workArea) {
+    (void)workArea;
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+#define STUB_FFT_EXEC(name) \
+    STUB_API cufftResult name(cufftHandle plan, size_t idata, \
+                              size_t odata) { \
+        (void)idata; (void)odata; \
+        return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN; \
+    }
+
+STUB_FFT_EXEC(cufftExecR2C)
+STUB_FFT_EXEC(cufftExecD2Z)
+STUB_FFT_EXEC(cufftExecC2R)
+STUB_FFT_EXEC(cufftExecZ2D)
+
+STUB_API cufftResult cufftExecC2C(cufftHandle plan, size_t idata,
+                                  size_t odata, int direction) {
+    (void)idata; (void)odata; (void)direction;
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+STUB_API cufftResult cufftExecZ2Z(cufftHandle plan, size_t idata,
+                                  size_t odata, int direction) {
+    (void)idata; (void)odata; (void)direction;
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+STUB_API cufftResult cufftSetStream(cufftHandle plan, size_t stream) {
+    (void)stream;
+    return valid_plan(plan) ? CUFFT_SUCCESS : CUFFT_INVALID_PLAN;
+}
+
+STUB_API cufftResult cufftGetVersion(int *version) {
+    *version = 10000;
+    return CUFFT_SUCCESS;
+}
+
+
+/* NVRTC (the "PTX" is the source with the includes expanded,
+   "#error" directives and the missing includes fail the compilation) */
+
+typedef int nvrtcResult;
+typedef size_t nvrtcProgram;
+
+#define NVRTC_SUCCESS 0
+#define NVRTC_ERROR_OUT_OF_MEMORY 1
+#define NVRTC_ERROR_INVALID_INPUT 3
+#define NVRTC_ERROR_INVALID_PROGRAM 4
+#define NVRTC_ERROR_COMPILATION 6
+
+#define STUB_MAX_INCLUDE_DEPTH 16
+
+typedef struct stub_program {
+    char *src;
+    char *ptx;
+    char *log;
+    int n_headers;
+    char **headers;
+    char **include_names;
+} stub_program;
+
+typedef struct stub_text {
+    char *data;
+    size_t size;
+    size_t capacity;
+} stub_text;
+
+#define PROG(p) ((stub_program*)(p))
+
+static char *copy_string(const char *s) {
+    char *copy = (char*)malloc(strlen(s) + 1);
+    if (copy != NULL) {
+        strcpy(copy, s);
+    }
+    return copy;
+}
+
+static int append_text(stub_text *text, const char *s, size_t n) {
+    char *data;
+    size_t capacity = text->capacity ? text->capacity : 4096;
+    while (capacity < text->size + n + 1) {
+        capacity *= 2;
+    }
+    if (capacity != text->capacity) {
+        data = (char*)realloc(text->data, capacity);
+        if (data == NULL) {
+            return 0;
+        }
+        text->data = data;
+        text->capacity = capacity;
+    }
+    memcpy(text->data + text->size, s, n);
+    text->size += n;
+    text->data[text->size] = 0;
+    return 1;
+}
+
+static int append_string(stub_text *text, const char *s) {
+    return append_text(text, s, strlen(s));
+}
+
+static char *read_file(const char *dir, const char *name) {
+    char path[4096];
+    FILE *fin;
+    long size;
+    char *data = NULL;
+    if (snprintf(path, sizeof(path), "%s/%s", dir, name) >=
+            (int)sizeof(path)) {
+        return NULL;
+    }
+    fin = fopen(path, "rb");
+    if (fin == NULL) {
+        return NULL;
+    }
+    if (!fseek(fin, 0, SEEK_END) && (size = ftell(fin)) >= 0 &&
+            !fseek(fin, 0, SEEK_SET)) {
+        data = (char*)malloc(size + 1);
+        if (data != NULL) {
+            data[fread(data, 1, size, fin)] = 0;
+        }
+    }
+    fclose(fin);
+    return data;
+}
+
+/* Returns the source of the include from the program headers
+   or from the include paths passed with -I/--include-path. */
+static char *find_include(stub_program *prog, const char *name,
+                          int numOptions, const char * const *options) {
+    const char *dir;
+    char *data;
+    int i;
+    for (i = 0; i < prog->n_headers; i++) {
+        if (!strcmp(prog->include_names[i], name)) {
+            return copy_string(prog->headers[i]);
+        }
+    }
+    for (i = 0; i < numOptions; i++) {
+        if (!strncmp(options[i], "--include-path=", 15)) {
+            dir = options[i] + 15;
+        } else if (!strcmp(options[i], "-I") && i + 1 < numOptions) {
+            dir = options[++i];
+        } else if (!strncmp(options[i], "-I", 2)) {
+            dir = options[i] + 2;
+        } else {
+            continue;
+        }
+        data = read_file(dir, name);
+        if (data != NULL) {
+            return data;
+        }
+    }
+    return NULL;
+}
+
+/* Appends src to out expanding #include "..." directives,
+   returns NVRTC_ERROR_COMPILATION with the message in log on failure. */
+static nvrtcResult preprocess(stub_program *prog, const char *src,
+                              int depth, int numOptions,
+                              const char * const *options,
+                              stub_text *out, stub_text *log) {
+    const char *line, *next, *p, *q;
+    char name[STUB_NAME_SIZE];
+    char *include;
+    nvrtcResult err;
+    for (line = src; *line; line = next) {
+        next = strchr(line, '\n');
+        next = next != NULL ? next + 1 : line + strlen(line);
+        for (p = line; *p == ' ' || *p == '\t'; p++);
+        if (*p == '#') {
+            for (p++; *p == ' ' || *p == '\t'; p++);
+            if (!strncmp(p, "error", 5) && !is_ident(p[5])) {
+                append_string(log, "error: ");
+                append_text(log, line, next - line);
+                return NVRTC_ERROR_COMPILATION;
+            }
+            if (!strncmp(p, "include", 7)) {
+                for (p += 7; *p == ' ' || *p == '\t'; p++);
+                q = *p == '"' || *p == '<' ?
+                    strchr(p + 1, *p == '"' ? '"' : '>') : NULL;
+                if (q != NULL && q < next &&
+                        (size_t)(q - p - 1) < sizeof(name)) {
+                    memcpy(name, p + 1, q - p - 1);
+                    name[q - p - 1] = 0;
+                    if (depth >= STUB_MAX_INCLUDE_DEPTH) {
+                        append_string(log, "error: #include nested "
+                                      "too deeply\n");
+                        return NVRTC_ERROR_COMPILATION;
+                    }
+                    include = find_include(prog, name, numOptions, options);
+                    if (include == NULL) {
+                        append_string(log, "error: cannot open source "
+                                      "file \"");
+                        append_string(log, name);
+                        append_string(log, "\"\n");
+                        return NVRTC_ERROR_COMPILATION;
+                    }
+                    err = preprocess(prog, include, depth + 1, numOptions,
+                                     options, out, log);
+                    free(include);
+                    if (err) {
+                        return err;
+                    }
+                    append_text(out, "\n", 1);
+                    continue;
+                }
+            }
+        }
+        if (!append_text(out, line, next - line)) {
+            return NVRTC_ERROR_OUT_OF_MEMORY;
+        }
+    }
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcVersion(int *major, int *minor) {
+    *major = 12;
+    *minor = 0;
+    return NVRTC_SUCCESS;
+}
+
+static void free_program(stub_program *prog) {
+    int i;
+    for (i = 0; i < prog->n_headers; i++) {
+        free(prog->headers[i]);
+        free(prog->include_names[i]);
+    }
+    free(prog->headers);
+    free(prog->include_names);
+    free(prog->src);
+    free(prog->ptx);
+    free(prog->log);
+    free(prog);
+}
+
+STUB_API nvrtcResult nvrtcCreateProgram(nvrtcProgram *prog, const char *src,
+                                        const char *name, int numHeaders,
+                                        const char * const *headers,
+                                        const char * const *includeNames) {
+    stub_program *p;
+    int i;
+    (void)name;
+    if (prog == NULL || src == NULL || numHeaders < 0) {
+        return NVRTC_ERROR_INVALID_INPUT;
+    }
+    p = (stub_program*)calloc(1, sizeof(stub_program));
+    if (p == NULL) {
+        return NVRTC_ERROR_OUT_OF_MEMORY;
+    }
+    p->src = copy_string(src);
+    p->headers = (char**)calloc(numHeaders + 1, sizeof(char*));
+    p->include_names = (char**)calloc(numHeaders + 1, sizeof(char*));
+    if (p->src == NULL || p->headers == NULL || p->include_names == NULL) {
+        free_program(p);
+        return NVRTC_ERROR_OUT_OF_MEMORY;
+    }
+    for (i = 0; i < numHeaders; i++) {
+        p->headers[i] = copy_string(headers[i]);
+        p->include_names[i] = copy_string(includeNames[i]);
+        p->n_headers = i + 1;
+        if (p->headers[i] == NULL || p->include_names[i] == NULL) {
+            free_program(p);
+            return NVRTC_ERROR_OUT_OF_MEMORY;
+        }
+    }
+    *prog = (size_t)p;
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcDestroyProgram(nvrtcProgram *prog) {
+    if (prog == NULL || *prog == 0) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    free_program(PROG(*prog));
+    *prog = 0;
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcCompileProgram(nvrtcProgram prog, int numOptions,
+                                         const char * const *options) {
+    stub_program *p = PROG(prog);
+    stub_text out = {NULL, 0, 0}, log = {NULL, 0, 0};
+    nvrtcResult err;
+    if (p == NULL) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    free(p->ptx);
+    free(p->log);
+    p->ptx = NULL;
+    p->log = NULL;
+    err = preprocess(p, p->src, 0, numOptions, options, &out, &log);
+    if (!append_text(&out, "", 0) || !append_text(&log, "", 0)) {
+        err = NVRTC_ERROR_OUT_OF_MEMORY;
+    }
+    if (err) {
+        free(out.data);
+        p->log = log.data;
+        return err;
+    }
+    p->ptx = out.data;
+    p->log = log.data;
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcGetPTXSize(nvrtcProgram prog, size_t *ptxSizeRet) {
+    if (prog == 0 || PROG(prog)->ptx == NULL) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    *ptxSizeRet = strlen(PROG(prog)->ptx) + 1;
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcGetPTX(nvrtcProgram prog, char *ptx) {
+    if (prog == 0 || PROG(prog)->ptx == NULL) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    strcpy(ptx, PROG(prog)->ptx);
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcGetProgramLogSize(nvrtcProgram prog,
+                                            size_t *logSizeRet) {
+    if (prog == 0) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    *logSizeRet = PROG(prog)->log ? strlen(PROG(prog)->log) + 1 : 1;
+    return NVRTC_SUCCESS;
+}
+
+STUB_API nvrtcResult nvrtcGetProgramLog(nvrtcProgram prog, char *log) {
+    if (prog == 0) {
+        return NVRTC_ERROR_INVALID_PROGRAM;
+    }
+    strcpy(log, PROG(prog)->log ? PROG(prog)->log : "");
+    return NVRTC_SUCCESS;
+}
+
+
+/* cuDNN (descriptors keep their values, computations are no-ops) */
+
+typedef int cudnnStatus_t;
+typedef size_t cudnnHandle_t;
+typedef size_t cudnnTensorDescriptor_t;
+typedef size_t cudnnConvolutionDescriptor_t;
+typedef size_t cudnnFilterDescriptor_t;
+typedef size_t cudnnPoolingDescriptor_t;
+typedef size_t cudnnRNNDescriptor_t;
+typedef size_t cudnnDropoutDescriptor_t;
+typedef int cudnnTensorFormat_t;
+typedef int cudnnDataType_t;
+
+#define CUDNN_STATUS_SUCCESS 0
+#define CUDNN_STATUS_NOT_INITIALIZED 1
+#define CUDNN_STATUS_ALLOC_FAILED 2
+#define CUDNN_STATUS_BAD_PARAM 3
+#define CUDNN_STATUS_NOT_SUPPORTED 9
+
+#define CUDNN_TENSOR_NCHW 0
+#define CUDNN_DATA_DOUBLE 1
+#define CUDNN_DATA_HALF 2
+#define CUDNN_LSTM 2
+#define CUDNN_GRU 3
+#define CUDNN_BIDIRECTIONAL 1
+
+#define STUB_MAX_DIMS 8
+
+typedef struct stub_cudnn_desc {
+    cudnnDataType_t data_type;
+    cudnnTensorFormat_t format;
+    int n_dims;
+    int dims[STUB_MAX_DIMS];
+    int strides[STUB_MAX_DIMS];
+    int params[8];  /* convolution, pooling or RNN parameters */
+} stub_cudnn_desc;
+
+#define DESC(d) ((stub_cudnn_desc*)(d))
+
+static cudnnStatus_t create_desc(size_t *desc) {
+    *desc = (size_t)calloc(1, sizeof(stub_cudnn_desc));
+    return *desc ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_ALLOC_FAILED;
+}
+
+static cudnnStatus_t destroy_desc(size_t desc) {
+    free((void*)desc);
+    return CUDNN_STATUS_SUCCESS;
+}
+
+static int data_type_size(cudnnDataType_t data_type) {
+    return data_type == CUDNN_DATA_DOUBLE ? 8 :
+        data_type == CUDNN_DATA_HALF ? 2 : 4;
+}
+
+STUB_API size_t cudnnGetVersion(void) {
+    return 5005;
+}
+
+STUB_API cudnnStatus_t cudnnCreate(cudnnHandle_t *handle) {
+    if (check_current()) {
+        return CUDNN_STATUS_NOT_INITIALIZED;
+    }
+    return create_desc(handle);
+}
+
+STUB_API cudnnStatus_t cudnnDestroy(cudnnHandle_t handle) {
+    return destroy_desc(handle);
+}
+
+STUB_API cudnnStatus_t cudnnSetStream(cudnnHandle_t handle,
+                                      size_t streamId) {
+    (void)streamId;
+    return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM;
+}
+
+#define STUB_DESC_LIFETIME(kind) \
+    STUB_API cudnnStatus_t cudnnCreate##kind##Descriptor(size_t *desc) { \
+        return create_desc(desc); \
+    } \
+    STUB_API cudnnStatus_t cudnnDestroy##kind##Descriptor(size_t desc) { \
+        return destroy_desc(desc); \
+    }
+
+STUB_DESC_LIFETIME(Tensor)
+STUB_DESC_LIFETIME(Filter)
+STUB_DESC_LIFETIME(Convolution)
+STUB_DESC_LIFETIME(Pooling)
+STUB_DESC_LIFETIME(Dropout)
+STUB_DESC_LIFETIME(RNN)
+
+STUB_API cudnnStatus_t cudnnSetTensorNdDescriptor(
+        cudnnTensorDescriptor_t tensorDesc, cudnnDataType_t dataType,
+        int nbDims, const int *dimA, const int *strideA) {
+    stub_cudnn_desc *desc = DESC(tensorDesc);
+    int i;
+    if (desc == NULL || nbDims < 1 || nbDims > STUB_MAX_DIMS) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    desc->data_type = dataType;
+    desc->n_dims = nbDims;
+    for (i = 0; i < nbDims; i++) {
+        desc->dims[i] = dimA[i];
+        desc->strides[i] = strideA[i];
+    }
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnSetTensor4dDescriptor(
+        cudnnTensorDescriptor_t tensorDesc, cudnnTensorFormat_t format,
+        cudnnDataType_t dataType, int n, int c, int h, int w) {
+    int dims[4], strides[4];
+    dims[0] = n;
+    dims[1] = c;
+    dims[2] = h;
+    dims[3] = w;
+    if (format == CUDNN_TENSOR_NCHW) {
+        strides[3] = 1;
+        strides[2] = w;
+        strides[1] = h * w;
+        strides[0] = c * h * w;
+    } else {
+        strides[1] = 1;
+        strides[3] = c;
+        strides[2] = w * c;
+        strides[0] = h * w * c;
+    }
+    if (tensorDesc) {
+        DESC(tensorDesc)->format = format;
+    }
+    return cudnnSetTensorNdDescriptor(tensorDesc, dataType, 4, dims,
+                                      strides);
+}
+
+STUB_API cudnnStatus_t cudnnGetTensor4dDescriptor(
+        const cudnnTensorDescriptor_t tensorDesc, cudnnDataType_t *dataType,
+        int *n, int *c, int *h, int *w,
+        int *nStride, int *cStride, int *hStride, int *wStride) {
+    stub_cudnn_desc *desc = DESC(tensorDesc);
+    if (desc == NULL || desc->n_dims != 4) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *dataType = desc->data_type;
+    *n = desc->dims[0];
+    *c = desc->dims[1];
+    *h = desc->dims[2];
+    *w = desc->dims[3];
+    *nStride = desc->strides[0];
+    *cStride = desc->strides[1];
+    *hStride = desc->strides[2];
+    *wStride = desc->strides[3];
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetTensorNdDescriptor(
+        const cudnnTensorDescriptor_t tensorDesc, int nbDimsRequested,
+        cudnnDataType_t *dataType, int *nbDims, int *dimA, int *strideA) {
+    stub_cudnn_desc *desc = DESC(tensorDesc);
+    int i;
+    if (desc == NULL) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *dataType = desc->data_type;
+    *nbDims = desc->n_dims;
+    for (i = 0; i < nbDimsRequested && i < desc->n_dims; i++) {
+        dimA[i] = desc->dims[i];
+        strideA[i] = desc->strides[i];
+    }
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnTransformTensor(
+        cudnnHandle_t handle, const intptr_t alpha,
+        const cudnnTensorDescriptor_t xDesc, const intptr_t x,
+        const intptr_t beta,
+        const cudnnTensorDescriptor_t yDesc, intptr_t y) {
+    (void)alpha; (void)xDesc; (void)x; (void)beta; (void)yDesc; (void)y;
+    return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM;
+}
+
+STUB_API cudnnStatus_t cudnnSetFilterNdDescriptor(
+        cudnnFilterDescriptor_t filterDesc, cudnnDataType_t dataType,
+        cudnnTensorFormat_t format, int nbDims, const int *filterDimA) {
+    stub_cudnn_desc *desc = DESC(filterDesc);
+    int i;
+    if (desc == NULL || nbDims < 1 || nbDims > STUB_MAX_DIMS) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    desc->data_type = dataType;
+    desc->format = format;
+    desc->n_dims = nbDims;
+    for (i = 0; i < nbDims; i++) {
+        desc->dims[i] = filterDimA[i];
+    }
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnSetFilter4dDescriptor(
+        cudnnFilterDescriptor_t filterDesc, cudnnDataType_t dataType,
+        cudnnTensorFormat_t format, int k, int c, int h, int w) {
+    int dims[4];
+    dims[0] = k;
+    dims[1] = c;
+    dims[2] = h;
+    dims[3] = w;
+    return cudnnSetFilterNdDescriptor(filterDesc, dataType, format, 4, dims);
+}
+
+STUB_API cudnnStatus_t cudnnGetFilter4dDescriptor(
+        const cudnnFilterDescriptor_t filterDesc, cudnnDataType_t *dataType,
+        cudnnTensorFormat_t *format, int *k, int *c, int *h, int *w) {
+    stub_cudnn_desc *desc = DESC(filterDesc);
+    if (desc == NULL || desc->n_dims != 4) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *dataType = desc->data_type;
+    *format = desc->format;
+    *k = desc->dims[0];
+    *c = desc->dims[1];
+    *h = desc->dims[2];
+    *w = desc->dims[3];
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetFilterNdDescriptor(
+        const cudnnFilterDescriptor_t filterDesc, int nbDimsRequested,
+        cudnnDataType_t *dataType, cudnnTensorFormat_t *format,
+        int *nbDims, int *filterDimA) {
+    stub_cudnn_desc *desc = DESC(filterDesc);
+    int i;
+    if (desc == NULL) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *dataType = desc->data_type;
+    *format = desc->format;
+    *nbDims = desc->n_dims;
+    for (i = 0; i < nbDimsRequested && i < desc->n_dims; i++) {
+        filterDimA[i] = desc->dims[i];
+    }
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnSetConvolution2dDescriptor(
+        cudnnConvolutionDescriptor_t convDesc, int pad_h, int pad_w,
+        int u, int v, int upscalex, int upscaley, int mode) {
+    stub_cudnn_desc *desc = DESC(convDesc);
+    if (desc == NULL || u < 1 || v < 1) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    desc->params[0] = pad_h;
+    desc->params[1] = pad_w;
+    desc->params[2] = u;
+    desc->params[3] = v;
+    desc->params[4] = upscalex;
+    desc->params[5] = upscaley;
+    desc->params[6] = mode;
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetConvolution2dForwardOutputDim(
+        const cudnnConvolutionDescriptor_t convDesc,
+        const cudnnTensorDescriptor_t inputTensorDesc,
+        const cudnnFilterDescriptor_t filterDesc,
+        int *n, int *c, int *h, int *w) {
+    stub_cudnn_desc *conv = DESC(convDesc), *x = DESC(inputTensorDesc),
+        *f = DESC(filterDesc);
+    if (conv == NULL || x == NULL || f == NULL ||
+            x->n_dims != 4 || f->n_dims != 4) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *n = x->dims[0];
+    *c = f->dims[0];
+    *h = 1 + (x->dims[2] + 2 * conv->params[0] - f->dims[2]) /
+        conv->params[2];
+    *w = 1 + (x->dims[3] + 2 * conv->params[1] - f->dims[3]) /
+        conv->params[3];
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnSetPooling2dDescriptor(
+        cudnnPoolingDescriptor_t poolingDesc, int mode,
+        int maxpoolingNanOpt, int windowHeight, int windowWidth,
+        int verticalPadding, int horizontalPadding,
+        int verticalStride, int horizontalStride) {
+    stub_cudnn_desc *desc = DESC(poolingDesc);
+    if (desc == NULL || verticalStride < 1 || horizontalStride < 1) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    desc->params[0] = windowHeight;
+    desc->params[1] = windowWidth;
+    desc->params[2] = verticalPadding;
+    desc->params[3] = horizontalPadding;
+    desc->params[4] = verticalStride;
+    desc->params[5] = horizontalStride;
+    desc->params[6] = mode;
+    desc->params[7] = maxpoolingNanOpt;
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetPooling2dForwardOutputDim(
+        const cudnnPoolingDescriptor_t poolingDesc,
+        const cudnnTensorDescriptor_t inputTensorDesc,
+        int *n, int *c, int *h, int *w) {
+    stub_cudnn_desc *pool = DESC(poolingDesc), *x = DESC(inputTensorDesc);
+    if (pool == NULL || x == NULL || x->n_dims != 4) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *n = x->dims[0];
+    *c = x->dims[1];
+    *h = 1 + (x->dims[2] + 2 * pool->params[2] - pool->params[0]) /
+        pool->params[4];
+    *w = 1 + (x->dims[3] + 2 * pool->params[3] - pool->params[1]) /
+        pool->params[5];
+    return CUDNN_STATUS_SUCCESS;
+}
+
+/* Algorithm and workspace queries: algorithm 0 without workspace. */
+#define STUB_ALGO_QUERY(name) \
+    STUB_API cudnnStatus_t name(size_t handle, size_t a, size_t b, \
+                                size_t conv, size_t c, int preference, \
+                                size_t memoryLimitInBytes, int *algo) { \
+        (void)a; (void)b; (void)conv; (void)c; (void)preference; \
+        (void)memoryLimitInBytes; \
+        *algo = 0; \
+        return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM; \
+    }
+
+#define STUB_WORKSPACE_QUERY(name) \
+    STUB_API cudnnStatus_t name(size_t handle, size_t a, size_t b, \
+                                size_t conv, size_t c, int algo, \
+                                size_t *sizeInBytes) { \
+        (void)a; (void)b; (void)conv; (void)c; (void)algo; \
+        *sizeInBytes = 0; \
+        return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM; \
+    }
+
+STUB_ALGO_QUERY(cudnnGetConvolutionForwardAlgorithm)
+STUB_ALGO_QUERY(cudnnGetConvolutionBackwardFilterAlgorithm)
+STUB_ALGO_QUERY(cudnnGetConvolutionBackwardDataAlgorithm)
+STUB_WORKSPACE_QUERY(cudnnGetConvolutionForwardWorkspaceSize)
+STUB_WORKSPACE_QUERY(cudnnGetConvolutionBackwardFilterWorkspaceSize)
+STUB_WORKSPACE_QUERY(cudnnGetConvolutionBackwardDataWorkspaceSize)
+
+/* Computations: only the handle is checked, arguments are ignored. */
+#define STUB_NOOP(name) \
+    STUB_API cudnnStatus_t name(size_t handle, ...) { \
+        return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM; \
+    }
+
+STUB_NOOP(cudnnConvolutionForward)
+STUB_NOOP(cudnnConvolutionBackwardBias)
+STUB_NOOP(cudnnConvolutionBackwardFilter)
+STUB_NOOP(cudnnConvolutionBackwardData)
+STUB_NOOP(cudnnPoolingForward)
+STUB_NOOP(cudnnPoolingBackward)
+STUB_NOOP(cudnnSoftmaxForward)
+STUB_NOOP(cudnnSoftmaxBackward)
+STUB_NOOP(cudnnDropoutForward)
+STUB_NOOP(cudnnDropoutBackward)
+STUB_NOOP(cudnnRNNForwardInference)
+STUB_NOOP(cudnnRNNForwardTraining)
+STUB_NOOP(cudnnRNNBackwardData)
+STUB_NOOP(cudnnRNNBackwardWeights)
+
+STUB_API cudnnStatus_t cudnnDropoutGetStatesSize(cudnnHandle_t handle,
+                                                 size_t *sizeInBytes) {
+    *sizeInBytes = 1024;
+    return handle ? CUDNN_STATUS_SUCCESS : CUDNN_STATUS_BAD_PARAM;
+}
+
+STUB_API cudnnStatus_t cudnnDropoutGetReserveSpaceSize(
+        cudnnTensorDescriptor_t xdesc, size_t *sizeInBytes) {
+    stub_cudnn_desc *desc = DESC(xdesc);
+    size_t size = 1;
+    int i;
+    if (desc == NULL) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    for (i = 0; i < desc->n_dims; i++) {
+        size *= desc->dims[i];
+    }
+    *sizeInBytes = (size + 7) / 8 * 8;
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnSetDropoutDescriptor(
+        cudnnDropoutDescriptor_t dropoutDesc, cudnnHandle_t handle,
+        float dropout, intptr_t states, size_t stateSizeInBytes,
+        unsigned long long seed) {
+    (void)dropout; (void)states; (void)stateSizeInBytes; (void)seed;
+    return dropoutDesc && handle ? CUDNN_STATUS_SUCCESS :
+        CUDNN_STATUS_BAD_PARAM;
+}
+
+STUB_API cudnnStatus_t cudnnSetRNNDescriptor(
+        cudnnRNNDescriptor_t rnnDesc, int hiddenSize, int numLayers,
+        cudnnDropoutDescriptor_t dropoutDesc, int inputMode, int direction,
+        int mode, cudnnDataType_t dataType) {
+    stub_cudnn_desc *desc = DESC(rnnDesc);
+    (void)dropoutDesc;
+    if (desc == NULL || hiddenSize < 1 || numLayers < 1) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    desc->params[0] = hiddenSize;
+    desc->params[1] = numLayers;
+    desc->params[2] = inputMode;
+    desc->params[3] = direction;
+    desc->params[4] = mode;
+    desc->data_type = dataType;
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetRNNWorkspaceSize(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const int seqLength, const cudnnTensorDescriptor_t *xDesc,
+        size_t *sizeInBytes) {
+    (void)xDesc;
+    if (!handle || !rnnDesc || seqLength < 1) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    *sizeInBytes = 1024;
+    return CUDNN_STATUS_SUCCESS;
+}
+
+STUB_API cudnnStatus_t cudnnGetRNNTrainingReserveSize(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const int seqLength, const cudnnTensorDescriptor_t *xDesc,
+        size_t *sizeInBytes) {
+    return cudnnGetRNNWorkspaceSize(handle, rnnDesc, seqLength, xDesc,
+                                    sizeInBytes);
+}
+
+STUB_API cudnnStatus_t cudnnGetRNNParamsSize(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const cudnnTensorDescriptor_t xDesc, size_t *sizeInBytes,
+        cudnnDataType_t dataType) {
+    stub_cudnn_desc *rnn = DESC(rnnDesc), *x = DESC(xDesc);
+    size_t size = 0, hidden, input, gates, dirs;
+    int layer;
+    if (!handle || rnn == NULL || x == NULL || x->n_dims < 2) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    hidden = rnn->params[0];
+    gates = rnn->params[4] == CUDNN_LSTM ? 4 :
+        rnn->params[4] == CUDNN_GRU ? 3 : 1;
+    dirs = rnn->params[3] == CUDNN_BIDIRECTIONAL ? 2 : 1;
+    input = x->dims[1];
+    for (layer = 0; layer < rnn->params[1]; layer++) {
+        size += dirs * gates * hidden * (input + hidden + 2);
+        input = hidden * dirs;
+    }
+    *sizeInBytes = size * data_type_size(dataType);
+    return CUDNN_STATUS_SUCCESS;
+}
+
+static cudnnStatus_t lin_layer_params(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const cudnnTensorDescriptor_t xDesc, const intptr_t w,
+        cudnnFilterDescriptor_t linLayerDesc, intptr_t *linLayer,
+        int rows, int cols) {
+    int dims[3];
+    stub_cudnn_desc *rnn = DESC(rnnDesc);
+    if (!handle || rnn == NULL || !xDesc || !linLayerDesc) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    dims[0] = 1;
+    dims[1] = rows;
+    dims[2] = cols;
+    *linLayer = w;
+    return cudnnSetFilterNdDescriptor(linLayerDesc, rnn->data_type,
+                                      CUDNN_TENSOR_NCHW, 3, dims);
+}
+
+STUB_API cudnnStatus_t cudnnGetRNNLinLayerMatrixParams(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const int layer, const cudnnTensorDescriptor_t xDesc,
+        const cudnnFilterDescriptor_t wDesc, const intptr_t w,
+        const int linLayerID, cudnnFilterDescriptor_t linLayerMatDesc,
+        intptr_t *linLayerMat) {
+    stub_cudnn_desc *x = DESC(xDesc);
+    (void)wDesc; (void)linLayerID;
+    if (x == NULL || x->n_dims < 2 || rnnDesc == 0) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    return lin_layer_params(
+        handle, rnnDesc, xDesc, w, linLayerMatDesc, linLayerMat,
+        DESC(rnnDesc)->params[0], layer ? DESC(rnnDesc)->params[0] :
+        x->dims[1]);
+}
+
+STUB_API cudnnStatus_t cudnnGetRNNLinLayerBiasParams(
+        cudnnHandle_t handle, const cudnnRNNDescriptor_t rnnDesc,
+        const int layer, const cudnnTensorDescriptor_t xDesc,
+        const cudnnFilterDescriptor_t wDesc, const intptr_t w,
+        const int linLayerID, cudnnFilterDescriptor_t linLayerBiasDesc,
+        intptr_t *linLayerBias) {
+    (void)layer; (void)wDesc; (void)linLayerID;
+    if (rnnDesc == 0) {
+        return CUDNN_STATUS_BAD_PARAM;
+    }
+    return lin_layer_params(
+        handle, rnnDesc, xDesc, w, linLayerBiasDesc, linLayerBias,
+        DESC(rnnDesc)->params[0], 1);
+}
+
+
+/* Introspection helpers available from the cffi module (cuda4py._stub) */
+
+STUB_API size_t cuda4py_stub_allocated(void) {
+    return g_allocated;
+}
+
+STUB_API unsigned long long cuda4py_stub_launches(void) {
+    return g_launches;
+}
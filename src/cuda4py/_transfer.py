@@ -0,0 +1,219 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+Chunked double-buffered host-device transfers.
+"""
+import cuda4py._cffi as cu
+
+
+class TransferEngine(object):
+    """Streams large host arrays to and from the device in chunks.
+
+    Each chunk is copied by the host into one of the page-locked staging
+    buffers and transferred asynchronously on the stream bound to that
+    buffer, so the host copy of the next chunk, the transfer of the
+    current one and the optional per-chunk kernels overlap.
+
+    The streams are blocking, so the transfers start after the work
+    previously queued to the default (NULL) stream and the work queued
+    there later waits for them. Work on the other non-blocking streams
+    is not ordered with the transfers: synchronize such streams before
+    calling to_device() or to_host() and call synchronize() before
+    using the results on them.
+
+    Attributes:
+        context: Context instance.
+        chunk_size: size of the chunk in bytes (None - choose automatically).
+        num_buffers: number of staging buffers (and streams).
+        _buffers: page-locked staging buffers (MemHostAlloc).
+        _views: numpy uint8 arrays over _buffers.
+        _streams: streams bound to the staging buffers.
+        _events: events marking completion of the last transfer
+                 from/to the staging buffers.
+    """
+    #: Limits of the automatically chosen chunk size
+    MIN_CHUNK_SIZE = 1024 * 1024
+    MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+    #: Minimal number of chunks per buffer for the automatic chunk size
+    CHUNKS_PER_BUFFER = 4
+
+    def __init__(self, context, chunk_size=None, num_buffers=2):
+        if num_buffers < 1:
+            raise ValueError("num_buffers should be positive")
+        self._context = context
+        self.chunk_size = chunk_size
+        self._streams = [context.create_stream(cu.CU_STREAM_DEFAULT)
+                         for _ in range(num_buffers)]
+        self._events = [context.create_event(cu.CU_EVENT_DISABLE_TIMING)
+                        for _ in range(num_buffers)]
+        self._buffers = [None] * num_buffers
+        self._views = [None] * num_buffers
+        self._capacity = 0
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def num_buffers(self):
+        return len(self._streams)
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, value):
+        if value is not None and int(value) < 1:
+            raise ValueError("chunk_size should be positive")
+        self._chunk_size = value
+
+    def tune_chunk_size(self, nbytes):
+        """Returns chunk size for the transfer of nbytes.
+
+        When chunk_size is not set, the transfer is split into
+        at least CHUNKS_PER_BUFFER * num_buffers chunks to get the overlap,
+        chunks are kept within [MIN_CHUNK_SIZE, MAX_CHUNK_SIZE]
+        to amortize the launch overhead and bound the staging memory.
+        """
+        if self.chunk_size is not None:
+            return int(self.chunk_size)
+        chunk = nbytes // (TransferEngine.CHUNKS_PER_BUFFER *
+                           self.num_buffers)
+        chunk = max(TransferEngine.MIN_CHUNK_SIZE,
+                    min(TransferEngine.MAX_CHUNK_SIZE, chunk))
+        # round up to the whole page
+        return (chunk + 4095) & ~4095
+
+    def _reserve(self, chunk):
+        """Makes staging buffers at least chunk bytes long.
+        """
+        if chunk <= self._capacity:
+            return
+        self.synchronize()
+        for i in range(self.num_buffers):
+            self._views[i] = None
+            self._buffers[i] = None
+        for i in range(self.num_buffers):
+            self._buffers[i] = self.context.mem_host_alloc(chunk)
+            self._views[i] = self._buffers[i].as_ndarray(chunk)
+        self._capacity = chunk
+
+    @staticmethod
+    def _as_bytes(host_array):
+        """Returns flat uint8 view of the contiguous numpy array.
+        """
+        import numpy
+        if not host_array.flags["C_CONTIGUOUS"]:
+            raise ValueError("host_array should be C-contiguous")
+        return host_array.reshape(-1).view(numpy.uint8)
+
+    def to_device(self, mem, host_array, offs=0, callback=None):
+        """Copies host_array to the device memory.
+
+        The function returns as soon as the last chunk is staged,
+        host_array can be reused immediately, call synchronize()
+        before using mem outside of the engine streams.
+
+        Parameters:
+            mem: destination Memory instance.
+            host_array: C-contiguous numpy array.
+            offs: offset from the device memory base in bytes.
+            callback: function(mem, offs, size, stream) called after
+                      each chunk is enqueued, for example to launch
+                      the kernel processing the chunk on the stream.
+        """
+        src = TransferEngine._as_bytes(host_array)
+        nbytes = src.nbytes
+        chunk = self.tune_chunk_size(nbytes)
+        self._reserve(chunk)
+        for i, start in enumerate(range(0, nbytes, chunk)):
+            slot = i % self.num_buffers
+            size = min(chunk, nbytes - start)
+            # wait until the staging buffer is consumed by the previous copy
+            self._events[slot].synchronize()
+            self._views[slot][:size] = src[start:start + size]
+            stream = self._streams[slot]
+            mem.to_device_async(self._buffers[slot], offs + start, size,
+                                stream, self._events[slot])
+            if callback is not None:
+                callback(mem, offs + start, size, stream)
+
+    def to_host(self, mem, host_array, offs=0, callback=None):
+        """Copies device memory to host_array.
+
+        The function will block until completion.
+
+        Parameters:
+            mem: source Memory instance.
+            host_array: C-contiguous writable numpy array.
+            offs: offset from the device memory base in bytes.
+            callback: function(mem, offs, size, stream) called before
+                      each chunk is read back, for example to launch
+                      the kernel producing the chunk on the stream.
+        """
+        dst = TransferEngine._as_bytes(host_array)
+        nbytes = dst.nbytes
+        chunk = self.tune_chunk_size(nbytes)
+        self._reserve(chunk)
+        pending = []
+        for i, start in enumerate(range(0, nbytes, chunk)):
+            slot = i % self.num_buffers
+            if len(pending) == self.num_buffers:
+                self._drain(dst, *pending.pop(0))
+            size = min(chunk, nbytes - start)
+            stream = self._streams[slot]
+            if callback is not None:
+                callback(mem, offs + start, size, stream)
+            mem.to_host_async(self._buffers[slot], offs + start, size,
+                              stream, self._events[slot])
+            pending.append((slot, start, size))
+        for args in pending:
+            self._drain(dst, *args)
+
+    def _drain(self, dst, slot, start, size):
+        """Copies completed chunk from the staging buffer to dst.
+        """
+        self._events[slot].synchronize()
+        dst[start:start + size] = self._views[slot][:size]
+
+    def synchronize(self):
+        """Waits for all the transfers and chunk callbacks to complete.
+        """
+        for stream in self._streams:
+            stream.synchronize()
@@ -94,80 +94,85 @@ CUBLAS_POINTER_MODE_HOST = 0
 CUBLAS_POINTER_MODE_DEVICE = 1
 
 
+# C function definitions
+# size_t instead of void* is used
+# for convinience with python calls and numpy arrays.
+_SRC = """
+typedef int cublasStatus_t;
+typedef void *cublasHandle_t;
+typedef int cublasOperation_t;
+typedef int cublasPointerMode_t;
+typedef int cublasDataType_t;
+
+cublasStatus_t cublasCreate_v2(cublasHandle_t *handle);
+cublasStatus_t cublasDestroy_v2(cublasHandle_t handle);
+
+cublasStatus_t cublasSgemm_v2(
+    cublasHandle_t handle,
+    cublasOperation_t transa,
+    cublasOperation_t transb,
+    int m,
+    int n,
+    int k,
+    size_t alpha,
+    size_t A,
+    int lda,
+    size_t B,
+    int ldb,
+    size_t beta,
+    size_t C,
+    int ldc);
+cublasStatus_t cublasDgemm_v2(
+    cublasHandle_t handle,
+    cublasOperation_t transa,
+    cublasOperation_t transb,
+    int m,
+    int n,
+    int k,
+    size_t alpha,
+    size_t A,
+    int lda,
+    size_t B,
+    int ldb,
+    size_t beta,
+    size_t C,
+    int ldc);
+cublasStatus_t cublasSgemmEx(
+    cublasHandle_t handle,
+    cublasOperation_t transa,
+    cublasOperation_t transb,
+    int m,
+    int n,
+    int k,
+    size_t alpha,
+    size_t A,
+    cublasDataType_t Atype,
+    int lda,
+    size_t B,
+    cublasDataType_t Btype,
+    int ldb,
+    size_t beta,
+    size_t C,
+    cublasDataType_t Ctype,
+    int ldc);
+
+cublasStatus_t cublasSetPointerMode_v2(cublasHandle_t handle,
+                                       cublasPointerMode_t mode);
+cublasStatus_t cublasSetStream_v2(cublasHandle_t handle,
+                                  size_t streamId);
+"""
+
+
 def _initialize(backends):
     global lib
     if lib is not None:
         return
-    # C function definitions
-    # size_t instead of void* is used
-    # for convinience with python calls and numpy arrays.
-    src = """
-    typedef int cublasStatus_t;
-    typedef void *cublasHandle_t;
-    typedef int cublasOperation_t;
-    typedef int cublasPointerMode_t;
-    typedef int cublasDataType_t;
-
-    cublasStatus_t cublasCreate_v2(cublasHandle_t *handle);
-    cublasStatus_t cublasDestroy_v2(cublasHandle_t handle);
-
-    cublasStatus_t cublasSgemm_v2(
-        cublasHandle_t handle,
-        cublasOperation_t transa,
-        cublasOperation_t transb,
-        int m,
-        int n,
-        int k,
-        size_t alpha,
-        size_t A,
-        int lda,
-        size_t B,
-        int ldb,
-        size_t beta,
-        size_t C,
-        int ldc);
-    cublasStatus_t cublasDgemm_v2(
-        cublasHandle_t handle,
-        cublasOperation_t transa,
-        cublasOperation_t transb,
-        int m,
-        int n,
-        int k,
-        size_t alpha,
-        size_t A,
-        int lda,
-        size_t B,
-        int ldb,
-        size_t beta,
-        size_t C,
-        int ldc);
-    cublasStatus_t cublasSgemmEx(
-        cublasHandle_t handle,
-        cublasOperation_t transa,
-        cublasOperation_t transb,
-        int m,
-        int n,
-        int k,
-        size_t alpha,
-        size_t A,
-        cublasDataType_t Atype,
-        int lda,
-        size_t B,
-        cublasDataType_t Btype,
-        int ldb,
-        size_t beta,
-        size_t C,
-        cublasDataType_t Ctype,
-        int ldc);
-
-    cublasStatus_t cublasSetPointerMode_v2(cublasHandle_t handle,
-                                           cublasPointerMode_t mode);
-    """
-
     # Parse
     global ffi
-    ffi = cffi.FFI()
-    ffi.cdef(src)
+    ffi = cuffi.prebuilt_ffi("cuda4py.blas._cublas_ffi")
+    if ffi is None:
+        ffi = cffi.FFI()
+        ffi.cdef(_SRC)
 
     # Load library
     for libnme in backends:
@@ -179,6 +184,7 @@ def _initialize(backends):
     else:
         ffi = None
         raise OSError("Could not load cublas library")
+    lib = cuffi.instrumented(lib)
 
     global ERRORS
     for code, msg in ERRORS.items():
@@ -198,7 +204,7 @@ def initialize(backends=("libcublas.so", "cublas64_65.dll")):
     if lib is not None:
         return
     with cuffi.lock:
-        _initialize(backends)
+        _initialize(cuffi.get_backends(backends))
 
 
 class CUBLAS(object):
@@ -229,6 +235,19 @@ class CUBLAS(object):
     def context(self):
         return self._context
 
+    def set_stream(self, stream=None):
+        """Sets the stream used by the subsequent cuBLAS calls.
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle),
+                    None for the NULL stream.
+        """
+        err = self._lib.cublasSetStream_v2(
+            self.handle, 0 if stream is None else stream)
+        if err:
+            raise CU.error("cublasSetStream_v2", err)
+        self._stream = stream  # to hold the reference
+
     def set_pointer_mode(self, mode=CUBLAS_POINTER_MODE_DEVICE):
         """Sets the pointer mode used by the cuBLAS library.
 
@@ -98,58 +98,61 @@ CUFFT_FORWARD = -1
 CUFFT_INVERSE = 1
 
 
+# C function definitions
+# size_t instead of void* is used
+# for convinience with python calls and numpy arrays,
+# cffi automatically calls int() on objects also.
+_SRC = """
+typedef int cufftResult;
+typedef int cufftHandle;
+typedef int cufftType;
+
+cufftResult cufftCreate(cufftHandle *plan);
+cufftResult cufftDestroy(cufftHandle plan);
+
+cufftResult cufftSetAutoAllocation(cufftHandle plan, int autoAllocate);
+cufftResult cufftMakePlanMany(cufftHandle plan,
+                              int rank, int *n,
+                              int *inembed, int istride, int idist,
+                              int *onembed, int ostride, int odist,
+                              cufftType type, int batch, size_t *workSize);
+cufftResult cufftGetSize(cufftHandle handle, size_t *workSize);
+cufftResult cufftSetWorkArea(cufftHandle plan, size_t workArea);
+
+cufftResult cufftExecR2C(cufftHandle plan,
+                         size_t idata,
+                         size_t odata);
+cufftResult cufftExecD2Z(cufftHandle plan,
+                         size_t idata,
+                         size_t odata);
+
+cufftResult cufftExecC2R(cufftHandle plan,
+                         size_t idata,
+                         size_t odata);
+cufftResult cufftExecZ2D(cufftHandle plan,
+                         size_t idata,
+                         size_t odata);
+
+cufftResult cufftExecC2C(cufftHandle plan, size_t idata,
+                         size_t odata, int direction);
+cufftResult cufftExecZ2Z(cufftHandle plan, size_t idata,
+                         size_t odata, int direction);
+
+cufftResult cufftSetStream(cufftHandle plan, size_t stream);
+cufftResult cufftGetVersion(int *version);
+"""
+
+
 def _initialize(backends):
     global lib
     if lib is not None:
         return
-    # C function definitions
-    # size_t instead of void* is used
-    # for convinience with python calls and numpy arrays,
-    # cffi automatically calls int() on objects also.
-    src = """
-    typedef int cufftResult;
-    typedef int cufftHandle;
-    typedef int cufftType;
-
-    cufftResult cufftCreate(cufftHandle *plan);
-    cufftResult cufftDestroy(cufftHandle plan);
-
-    cufftResult cufftSetAutoAllocation(cufftHandle plan, int autoAllocate);
-    cufftResult cufftMakePlanMany(cufftHandle plan,
-                                  int rank, int *n,
-                                  int *inembed, int istride, int idist,
-                                  int *onembed, int ostride, int odist,
-                                  cufftType type, int batch, size_t *workSize);
-    cufftResult cufftGetSize(cufftHandle handle, size_t *workSize);
-    cufftResult cufftSetWorkArea(cufftHandle plan, size_t workArea);
-
-    cufftResult cufftExecR2C(cufftHandle plan,
-                             size_t idata,
-                             size_t odata);
-    cufftResult cufftExecD2Z(cufftHandle plan,
-                             size_t idata,
-                             size_t odata);
-
-    cufftResult cufftExecC2R(cufftHandle plan,
-                             size_t idata,
-                             size_t odata);
-    cufftResult cufftExecZ2D(cufftHandle plan,
-                             size_t idata,
-                             size_t odata);
-
-    cufftResult cufftExecC2C(cufftHandle plan, size_t idata,
-                             size_t odata, int direction);
-    cufftResult cufftExecZ2Z(cufftHandle plan, size_t idata,
-                             size_t odata, int direction);
-
-    cufftResult cufftSetStream(cufftHandle plan, size_t stream);
-    cufftResult cufftGetVersion(int *version);
-    """
-
     # Parse
     global ffi
-    ffi = cffi.FFI()
-    ffi.cdef(src)
+    ffi = cuffi.prebuilt_ffi("cuda4py.cufft._cufft_ffi")
+    if ffi is None:
+        ffi = cffi.FFI()
+        ffi.cdef(_SRC)
 
     # Load library
     for libnme in backends:
@@ -161,6 +164,7 @@ def _initialize(backends):
     else:
         ffi = None
         raise OSError("Could not load cufft library")
+    lib = cuffi.instrumented(lib)
 
     global ERRORS
     for code, msg in ERRORS.items():
@@ -180,7 +184,7 @@ def initialize(backends=("libcufft.so", "cufft64_65.dll")):
     if lib is not None:
         return
     with cuffi.lock:
-        _initialize(backends)
+        _initialize(cuffi.get_backends(backends))
 
 
 class CUFFT(object):
@@ -326,6 +330,19 @@ class CUFFT(object):
             raise CU.error("cufftSetWorkArea", err)
         self._workarea = value
 
+    def set_stream(self, stream=None):
+        """Sets the stream used by the subsequent plan executions.
+
+        Parameters:
+            stream: compute stream (Stream instance or it's handle),
+                    None for the NULL stream.
+        """
+        err = self._lib.cufftSetStream(
+            self.handle, 0 if stream is None else stream)
+        if err:
+            raise CU.error("cufftSetStream", err)
+        self._stream = stream  # to hold the reference
+
     def exec_r2c(self, idata, odata):
         """Executes a single-precision real-to-complex,
         implicitly forward, cuFFT transform plan.
@@ -0,0 +1,249 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+"""
+NVRTC cffi bindings and helper classes.
+"""
+import cffi
+import cuda4py._cffi as cuffi
+from cuda4py._py import CU
+
+
+#: ffi parser
+ffi = None
+
+
+#: Loaded shared library
+lib = None
+
+
+#: Error codes
+NVRTC_SUCCESS = 0
+NVRTC_ERROR_OUT_OF_MEMORY = 1
+NVRTC_ERROR_PROGRAM_CREATION_FAILURE = 2
+NVRTC_ERROR_INVALID_INPUT = 3
+NVRTC_ERROR_INVALID_PROGRAM = 4
+NVRTC_ERROR_INVALID_OPTION = 5
+NVRTC_ERROR_COMPILATION = 6
+NVRTC_ERROR_BUILTIN_OPERATION_FAILURE = 7
+NVRTC_ERROR_INTERNAL_ERROR = 11
+
+
+#: Error descriptions
+ERRORS = {
+    NVRTC_ERROR_OUT_OF_MEMORY: "NVRTC_ERROR_OUT_OF_MEMORY",
+    NVRTC_ERROR_PROGRAM_CREATION_FAILURE:
+    "NVRTC_ERROR_PROGRAM_CREATION_FAILURE",
+    NVRTC_ERROR_INVALID_INPUT: "NVRTC_ERROR_INVALID_INPUT",
+    NVRTC_ERROR_INVALID_PROGRAM: "NVRTC_ERROR_INVALID_PROGRAM",
+    NVRTC_ERROR_INVALID_OPTION: "NVRTC_ERROR_INVALID_OPTION",
+    NVRTC_ERROR_COMPILATION: "NVRTC_ERROR_COMPILATION",
+    NVRTC_ERROR_BUILTIN_OPERATION_FAILURE:
+    "NVRTC_ERROR_BUILTIN_OPERATION_FAILURE",
+    NVRTC_ERROR_INTERNAL_ERROR: "NVRTC_ERROR_INTERNAL_ERROR"
+}
+
+
+# C function definitions
+# size_t instead of void* is used
+# for convinience with python calls and numpy arrays.
+_SRC = """
+typedef int nvrtcResult;
+typedef size_t nvrtcProgram;
+
+nvrtcResult nvrtcVersion(int *major, int *minor);
+
+nvrtcResult nvrtcCreateProgram(nvrtcProgram *prog,
+                               const char *src,
+                               const char *name,
+                               int numHeaders,
+                               const char * const *headers,
+                               const char * const *includeNames);
+nvrtcResult nvrtcDestroyProgram(nvrtcProgram *prog);
+nvrtcResult nvrtcCompileProgram(nvrtcProgram prog,
+                                int numOptions,
+                                const char * const *options);
+nvrtcResult nvrtcGetPTXSize(nvrtcProgram prog, size_t *ptxSizeRet);
+nvrtcResult nvrtcGetPTX(nvrtcProgram prog, char *ptx);
+nvrtcResult nvrtcGetProgramLogSize(nvrtcProgram prog,
+                                   size_t *logSizeRet);
+nvrtcResult nvrtcGetProgramLog(nvrtcProgram prog, char *log);
+"""
+
+
+def _initialize(backends):
+    global lib
+    if lib is not None:
+        return
+    # Parse
+    global ffi
+    ffi = cuffi.prebuilt_ffi("cuda4py.nvrtc._nvrtc_ffi")
+    if ffi is None:
+        ffi = cffi.FFI()
+        ffi.cdef(_SRC)
+
+    # Load library
+    for libnme in backends:
+        try:
+            lib = ffi.dlopen(libnme)
+            break
+        except OSError:
+            pass
+    else:
+        ffi = None
+        raise OSError("Could not load nvrtc library")
+    lib = cuffi.instrumented(lib)
+
+    global ERRORS
+    for code, msg in ERRORS.items():
+        if code in CU.ERRORS:
+            s = " | " + msg
+            if s not in CU.ERRORS[code]:
+                CU.ERRORS[code] += s
+        else:
+            CU.ERRORS[code] = msg
+
+
+def initialize(backends=("libnvrtc.so", "libnvrtc.so.12", "libnvrtc.so.11.2",
+                         "nvrtc64_120_0.dll", "nvrtc64_112_0.dll")):
+    """Loads shared library.
+    """
+    global lib
+    if lib is not None:
+        return
+    with cuffi.lock:
+        _initialize(cuffi.get_backends(backends))
+
+
+def version():
+    """Returns tuple (major, minor) of the NVRTC version.
+    """
+    initialize()
+    major = ffi.new("int *")
+    minor = ffi.new("int *")
+    err = lib.nvrtcVersion(major, minor)
+    if err:
+        raise CU.error("nvrtcVersion", err)
+    return int(major[0]), int(minor[0])
+
+
+class Program(object):
+    """NVRTC program.
+
+    Attributes:
+        log: log of the last compilation (bytes).
+        ptx: PTX produced by the last successful compilation (bytes).
+    """
+    def __init__(self, source, name="source.cu", headers=None):
+        """Calls nvrtcCreateProgram.
+
+        Parameters:
+            source: CUDA C++ source code.
+            name: name of the program (used in the log).
+            headers: dictionary {include name: header source}.
+        """
+        self._lib = None
+        self._handle = None
+        initialize()
+        self.log = b""
+        self.ptx = None
+        headers = {} if headers is None else headers
+        n = len(headers)
+        strs = [ffi.new("char[]", x.encode("utf-8"))
+                for pair in headers.items() for x in pair]
+        srcs = ffi.new("char *[]", max(n, 1))
+        nmes = ffi.new("char *[]", max(n, 1))
+        srcs[0:n] = strs[1::2]
+        nmes[0:n] = strs[0::2]
+        prog = ffi.new("nvrtcProgram *")
+        err = lib.nvrtcCreateProgram(
+            prog, source.encode("utf-8"), name.encode("utf-8"),
+            n, srcs, nmes)
+        if err:
+            raise CU.error("nvrtcCreateProgram", err)
+        self._lib = lib  # to hold the reference
+        self._handle = int(prog[0])
+
+    def __int__(self):
+        return self.handle
+
+    @property
+    def handle(self):
+        return self._handle
+
+    def compile(self, options=()):
+        """Compiles the program.
+
+        Parameters:
+            options: sequence of NVRTC options.
+
+        Returns:
+            True on success, False on compilation error (see log).
+        """
+        opts = [ffi.new("char[]", opt.encode("utf-8")) for opt in options]
+        p_opts = ffi.new("char *[]", max(len(opts), 1))
+        p_opts[0:len(opts)] = opts
+        err = self._lib.nvrtcCompileProgram(self.handle, len(opts), p_opts)
+        sz = ffi.new("size_t *")
+        log_err = self._lib.nvrtcGetProgramLogSize(self.handle, sz)
+        if log_err:
+            raise CU.error("nvrtcGetProgramLogSize", log_err)
+        log = ffi.new("char[]", int(sz[0]) + 1)
+        log_err = self._lib.nvrtcGetProgramLog(self.handle, log)
+        if log_err:
+            raise CU.error("nvrtcGetProgramLog", log_err)
+        self.log = ffi.string(log)
+        if err == NVRTC_ERROR_COMPILATION:
+            return False
+        if err:
+            raise CU.error("nvrtcCompileProgram", err)
+        err = self._lib.nvrtcGetPTXSize(self.handle, sz)
+        if err:
+            raise CU.error("nvrtcGetPTXSize", err)
+        ptx = ffi.new("char[]", int(sz[0]) + 1)
+        err = self._lib.nvrtcGetPTX(self.handle, ptx)
+        if err:
+            raise CU.error("nvrtcGetPTX", err)
+        self.ptx = ffi.string(ptx)
+        return True
+
+    def _release(self):
+        if self._lib is not None and self.handle is not None:
+            self._lib.nvrtcDestroyProgram(
+                ffi.new("nvrtcProgram *", self.handle))
+            self._handle = None
+
+    def __del__(self):
+        self._release()
@@ -0,0 +1,382 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+Measures Python-side overhead of the hot paths in cuda4py
+in nanoseconds per call and compares it with the saved baseline.
+
+Runs against any backend, to measure the wrappers only,
+use the stub backend (see README), which does almost no work:
+
+    PYTHONPATH=src python tests/benchmark.py --stub -o baseline.json
+    ...
+    PYTHONPATH=src python tests/benchmark.py --stub -c baseline.json
+
+With -c the exit code is 1 when some benchmark became slower
+than the baseline more than --threshold times.
+"""
+import argparse
+import cuda4py as cu
+import gc
+import json
+import logging
+import numpy
+import os
+import platform
+import sys
+import time
+
+
+#: Kernel with the signature of the benchmarked Function (does nothing)
+PTX = """
+.version 4.0
+.target sm_30
+.address_size 64
+
+.visible .entry test(.param .u64 a, .param .u64 b, .param .f32 k)
+{
+    ret;
+}
+"""
+
+
+#: Timer with the best resolution available
+timer = getattr(time, "perf_counter", time.time)
+
+
+#: Number of kernel launches in the measured LaunchBatch
+BATCH_SIZE = 64
+
+
+#: Pairs (name, reference name) of the launch paths to compare:
+#: per-launch speedup of LaunchBatch and PreparedFunction
+#: over the plain Function call doing the same work
+SPEEDUPS = (("launch_batch", "function_call"),
+            ("prepared_call", "function_call_args"))
+
+
+#: List of (name, function), each function receives Benchmark instance
+#: and returns the callable to measure or None if it is not available
+BENCHMARKS = []
+
+
+def benchmark(name, launches=1):
+    """Registers the decorated function in BENCHMARKS.
+
+    Parameters:
+        name: name of the benchmark.
+        launches: number of operations done by the single call
+                  of the measured callable, the result is per operation.
+    """
+    def register(fn):
+        fn.launches = launches
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+@benchmark("function_set_args")
+def _set_args(bench):
+    f, args = bench.function
+    return lambda: f.set_args(*args)
+
+
+@benchmark("function_call")
+def _call(bench):
+    f, args = bench.function
+    f.set_args(*args)
+    return lambda: f((1, 1, 1))
+
+
+@benchmark("function_call_args")
+def _call_args(bench):
+    f, args = bench.function
+    return lambda: f((1, 1, 1), args_tuple=args)
+
+
+@benchmark("prepared_call")
+def _prepared_call(bench):
+    f, args = bench.function
+    f = f.prepare("PPf")
+    args = (args[0], args[1], 1.0)
+    return lambda: f((1, 1, 1), args_tuple=args)
+
+
+@benchmark("launch_batch", launches=BATCH_SIZE)
+def _launch_batch(bench):
+    f, args = bench.function
+    batch = cu.LaunchBatch()
+    for _ in range(BATCH_SIZE):
+        batch.add(f, (1, 1, 1), args_tuple=args)
+    return batch.submit
+
+
+@benchmark("memory_to_device")
+def _to_device(bench):
+    mem = bench.mem_alloc(bench.host.nbytes)
+    return lambda: mem.to_device(bench.host)
+
+
+@benchmark("memory_to_host")
+def _to_host(bench):
+    mem = bench.mem_alloc(bench.host.nbytes)
+    return lambda: mem.to_host(bench.host)
+
+
+@benchmark("memcpy_3d_async")
+def _memcpy_3d_async(bench):
+    sz = bench.host.itemsize
+    src = bench.mem_alloc(16 * 16 * 16 * sz)
+    dst = bench.mem_alloc(16 * 16 * 16 * sz)
+    return lambda: src.memcpy_3d_async(
+        (0, 0, 0), (sz, 1, 1), (4 * sz, 4, 4),
+        16 * sz, 16, 16 * sz, 16, dst=dst)
+
+
+@benchmark("mem_alloc")
+def _mem_alloc(bench):
+    ctx = bench.ctx
+    return lambda: cu.MemAlloc(ctx, 4096)
+
+
+@benchmark("cublas_sgemm")
+def _sgemm(bench):
+    try:
+        import cuda4py.blas as cublas
+        blas = cublas.CUBLAS(bench.ctx)
+    except OSError:
+        return None
+    one = numpy.ones(1, dtype=numpy.float32)
+    zero = numpy.zeros(1, dtype=numpy.float32)
+    a = bench.mem_alloc(numpy.ones((4, 4), dtype=numpy.float32))
+    c = bench.mem_alloc(a.size)
+    bench.keep(blas)
+    return lambda: blas.sgemm(cublas.CUBLAS_OP_N, cublas.CUBLAS_OP_N,
+                              4, 4, 4, one, a, a, zero, c)
+
+
+@benchmark("cufft_execute")
+def _cufft_execute(bench):
+    try:
+        import cuda4py.cufft as cufft
+        fft = cufft.CUFFT(bench.ctx)
+    except OSError:
+        return None
+    fft.make_plan_many((16, 16), 1, cufft.CUFFT_R2C)
+    x = bench.mem_alloc(16 * 16 * 4)
+    y = bench.mem_alloc(16 * (16 // 2 + 1) * 8)
+    bench.keep(fft)
+    return lambda: fft.execute(x, y)
+
+
+@benchmark("cudnn_set_4d")
+def _cudnn_set_4d(bench):
+    try:
+        import cuda4py.cudnn as cudnn
+        bench.keep(cudnn.CUDNN(bench.ctx))
+    except OSError:
+        return None
+    d = cudnn.TensorDescriptor()
+    bench.keep(d)
+    return lambda: d.set_4d(cudnn.CUDNN_TENSOR_NCHW, cudnn.CUDNN_DATA_FLOAT,
+                            1, 2, 3, 4)
+
+
+class Benchmark(object):
+    """Runs the registered benchmarks on the context.
+
+    Attributes:
+        ctx: Context instance.
+        host: small numpy array for the transfers.
+        function: (Function instance, tuple of it's arguments).
+    """
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.host = numpy.zeros(16, dtype=numpy.float32)
+        self._objects = []
+        self._function = None
+
+    def keep(self, obj):
+        """Holds the reference to obj until close() is called.
+        """
+        self._objects.append(obj)
+        return obj
+
+    def mem_alloc(self, size_or_ndarray):
+        return self.keep(cu.MemAlloc(self.ctx, size_or_ndarray))
+
+    @property
+    def function(self):
+        if self._function is None:
+            module = self.keep(cu.Module(self.ctx, ptx=PTX))
+            a = self.mem_alloc(self.host.nbytes)
+            self._function = (
+                module.create_function("test"),
+                (a, a, numpy.ones(1, dtype=numpy.float32)))
+        return self._function
+
+    def close(self):
+        self._function = None
+        del self._objects[:]
+        gc.collect()
+
+    def measure(self, fn, number, repeat):
+        """Returns the best time of number calls of fn over repeat runs
+        in nanoseconds per call.
+        """
+        best = None
+        for _ in range(repeat):
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                t0 = timer()
+                for _ in range(number):
+                    fn()
+                self.ctx.synchronize()
+                dt = timer() - t0
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            best = dt if best is None else min(best, dt)
+        return best * 1.0e9 / number
+
+    def run(self, names=None, number=10000, repeat=5):
+        """Runs the benchmarks.
+
+        Parameters:
+            names: names of the benchmarks to run (all if None).
+            number: number of calls in the single run.
+            repeat: number of runs.
+
+        Returns:
+            Dictionary name => nanoseconds per call
+            (per kernel launch for launch_batch), benchmarks
+            requiring unavailable libraries are skipped.
+        """
+        results = {}
+        try:
+            for name, setup in BENCHMARKS:
+                if names is not None and name not in names:
+                    continue
+                fn = setup(self)
+                if fn is None:
+                    logging.info("%s: skipped", name)
+                    continue
+                fn()  # warm up
+                results[name] = (self.measure(fn, number, repeat) /
+                                 setup.launches)
+                logging.info("%s: %.1f ns", name, results[name])
+        finally:
+            self.close()
+        return results
+
+
+def save(path, results, backend):
+    with open(path, "w") as fout:
+        json.dump({"backend": backend,
+                   "python": "%s %s" % (platform.python_implementation(),
+                                        platform.python_version()),
+                   "machine": platform.machine(),
+                   "results": results},
+                  fout, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """Returns the list of (name, ns, baseline ns) of the benchmarks
+    slower than baseline more than threshold times.
+    """
+    return [(name, ns, baseline[name])
+            for name, ns in sorted(results.items())
+            if name in baseline and ns > baseline[name] * threshold]
+
+
+def speedups(results):
+    """Returns the list of (name, reference name, speedup ratio)
+    for the pairs from SPEEDUPS present in results.
+    """
+    return [(name, ref, results[ref] / results[name])
+            for name, ref in SPEEDUPS
+            if name in results and ref in results]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-o", "--output",
+                        help="write results to the JSON file")
+    parser.add_argument("-c", "--compare",
+                        help="compare results with the JSON file")
+    parser.add_argument("-t", "--threshold", type=float, default=1.25,
+                        help="allowed slowdown ratio (default 1.25)")
+    parser.add_argument("-n", "--number", type=int, default=10000,
+                        help="number of calls in the single run")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="number of runs, the best one is taken")
+    parser.add_argument("--stub", action="store_true",
+                        help="use the stub backend")
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run (all by default): %s" %
+                        ", ".join(name for name, _fn in BENCHMARKS))
+    args = parser.parse_args(argv)
+    if args.stub:
+        os.environ["CUDA4PY_STUB"] = "1"
+    backend = "stub" if cu._cffi.stub_enabled() else "cuda"
+
+    ctx = cu.Devices().create_some_context()
+    results = Benchmark(ctx).run(args.names or None, args.number,
+                                 args.repeat)
+    for name, ns in sorted(results.items()):
+        print("%-24s %10.1f ns" % (name, ns))
+    for name, ref, ratio in speedups(results):
+        print("%s is x%.2f faster per launch than %s" % (name, ratio, ref))
+    if args.output:
+        save(args.output, results, backend)
+    if args.compare:
+        with open(args.compare) as fin:
+            baseline = json.load(fin)
+        if baseline.get("backend") != backend:
+            logging.warning("Baseline was measured with %s backend",
+                            baseline.get("backend"))
+        slower = compare(results, baseline["results"], args.threshold)
+        for name, ns, base_ns in slower:
+            print("%s: %.1f ns vs %.1f ns in the baseline (x%.2f)" %
+                  (name, ns, base_ns, ns / base_ns))
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
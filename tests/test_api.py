@@ -44,6 +44,10 @@ try:
 except ImportError:
     pass
 import os
+import platform
+import shutil
+import sys
+import tempfile
 import threading
 import unittest
 
@@ -128,6 +132,141 @@ class Test(unittest.TestCase):
         self.assertGreaterEqual(d.multi_gpu_board_group_id, 0)
         self.assertGreaterEqual(d.max_pitch, 0)
 
+        attrs = d.attributes
+        self.assertIs(d.attributes, attrs)
+        self.assertEqual(
+            attrs[cu._cffi.CU_DEVICE_ATTRIBUTE_WARP_SIZE], d.warp_size)
+        self.assertEqual(
+            attrs[cu._cffi.CU_DEVICE_ATTRIBUTE_INTEGRATED], int(d.integrated))
+        self.assertEqual(d.refresh(), attrs)
+        self.assertIsNot(d.attributes, attrs)
+
+    def test_prebuilt_ffi(self):
+        logging.debug("ENTER: test_prebuilt_ffi")
+        from cuda4py import _ffi_build
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = _ffi_build.build(tmpdir)
+            self.assertEqual(len(paths), len(_ffi_build.module_names()))
+            for path in paths:
+                self.assertTrue(os.path.isfile(path))
+        finally:
+            shutil.rmtree(tmpdir)
+        ffi = _ffi_build.make_ffi("cuda4py._cuda_ffi")
+        self.assertEqual(ffi.sizeof("CUDA_KERNEL_NODE_PARAMS"), 56)
+        logging.debug("EXIT: test_prebuilt_ffi")
+
+    def test_stub_backend(self):
+        logging.debug("ENTER: test_stub_backend")
+        import cffi
+        from cuda4py import _ffi_build
+        from cuda4py.blas import _cublas
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = _ffi_build.build_stub(tmpdir)
+            self.assertEqual(_ffi_build.build_stub(tmpdir), path)
+            # only the library is left after the build
+            self.assertEqual(os.listdir(os.path.dirname(path)),
+                             [os.path.basename(path)])
+            if hasattr(os, "getuid"):
+                os.chmod(tmpdir, 0o777)
+                self.assertRaises(OSError, _ffi_build.build_stub, tmpdir)
+                os.chmod(tmpdir, 0o700)
+            ffi = cffi.FFI()
+            ffi.cdef(cu._cffi._SRC)
+            ffi.cdef(_cublas._SRC)
+            lib = ffi.dlopen(path)
+            self.assertEqual(lib.cuInit(0), 0)
+            ctx = ffi.new("CUcontext *")
+            self.assertEqual(lib.cuCtxCreate_v2(ctx, 0, 0), 0)
+            a = numpy.arange(16, dtype=numpy.float32).reshape(4, 4)
+            b = numpy.ones_like(a)
+            c = numpy.zeros_like(a)
+            ptrs = ffi.new("CUdeviceptr[3]")
+            for i, x in enumerate((a, b, c)):
+                self.assertEqual(lib.cuMemAlloc_v2(ptrs + i, x.nbytes), 0)
+                self.assertEqual(lib.cuMemcpyHtoD_v2(
+                    ptrs[i], x.__array_interface__["data"][0], x.nbytes), 0)
+            handle = ffi.new("cublasHandle_t *")
+            self.assertEqual(lib.cublasCreate_v2(handle), 0)
+            alpha = numpy.ones(1, dtype=numpy.float32)
+            beta = numpy.zeros(1, dtype=numpy.float32)
+            self.assertEqual(lib.cublasSgemm_v2(
+                handle[0], 0, 0, 4, 4, 4,
+                alpha.__array_interface__["data"][0], ptrs[0], 4,
+                ptrs[1], 4, beta.__array_interface__["data"][0],
+                ptrs[2], 4), 0)
+            self.assertEqual(lib.cuMemcpyDtoH_v2(
+                c.__array_interface__["data"][0], ptrs[2], c.nbytes), 0)
+            self.assertEqual(numpy.fabs(c - numpy.dot(b, a)).max(), 0)
+            self.assertEqual(lib.cuMemsetD32Async(ptrs[2], 7, 16, 0), 0)
+            self.assertEqual(lib.cuMemcpyDtoH_v2(
+                c.__array_interface__["data"][0], ptrs[2], c.nbytes), 0)
+            self.assertEqual(c.view(numpy.uint32).min(), 7)
+            self.assertEqual(c.view(numpy.uint32).max(), 7)
+            self.assertEqual(lib.cublasDestroy_v2(handle[0]), 0)
+            for i in range(3):
+                self.assertEqual(lib.cuMemFree_v2(ptrs[i]), 0)
+            self.assertEqual(lib.cuCtxDestroy_v2(ctx[0]), 0)
+            del lib
+        finally:
+            shutil.rmtree(tmpdir)
+        old = os.environ.get("CUDA4PY_STUB")
+        try:
+            os.environ["CUDA4PY_STUB"] = "0"
+            self.assertEqual(cu._cffi.get_backends(("a",)), ("a",))
+        finally:
+            if old is None:
+                del os.environ["CUDA4PY_STUB"]
+            else:
+                os.environ["CUDA4PY_STUB"] = old
+        logging.debug("EXIT: test_stub_backend")
+
+    def test_stats(self):
+        logging.debug("ENTER: test_stats")
+        cu.initialize()
+        instrument = cu._cffi.instrument
+        cu.enable_stats()
+        try:
+            self.assertIsInstance(cu._cffi.lib, cu._cffi.InstrumentedLib)
+            cu.reset_stats()
+            ctx = cu.Devices().create_some_context()
+            a = numpy.arange(1000, dtype=numpy.float32)
+            b = numpy.zeros_like(a)
+            mem = cu.MemAlloc(ctx, a)
+            mem.to_host(b)
+            mem.to_host(b)
+
+            def to_host():
+                ctx.set_current()
+                mem.to_host(b)
+
+            n_threads = len(cu._cffi.api_stats)
+            thread = threading.Thread(target=to_host)
+            thread.start()
+            thread.join()
+            gc.collect()
+            # statistics of the finished thread are merged
+            self.assertEqual(len(cu._cffi.api_stats), n_threads)
+            stats = cu.stats()
+            self.assertEqual(stats["cuMemcpyHtoD_v2"]["calls"], 1)
+            self.assertEqual(stats["cuMemcpyHtoD_v2"]["bytes"], a.nbytes)
+            dtoh = stats["cuMemcpyDtoH_v2"]
+            self.assertEqual(dtoh["calls"], 3)
+            self.assertEqual(dtoh["bytes"], 3 * a.nbytes)
+            self.assertGreater(dtoh["time"], 0)
+            self.assertEqual(sum(dtoh["histogram"].values()), 3)
+            self.assertEqual(stats["cuMemAlloc_v2"]["bytes"], 0)
+            del mem
+            cu.reset_stats()
+            self.assertNotIn("cuMemcpyDtoH_v2", cu.stats())
+        finally:
+            cu.enable_stats(instrument)
+        if not instrument:
+            self.assertNotIsInstance(
+                cu._cffi.lib, cu._cffi.InstrumentedLib)
+        logging.debug("EXIT: test_stats")
+
     def test_extract_ptr(self):
         a = numpy.zeros(127, dtype=numpy.float32)
         ptr = cu.CU.extract_ptr(a)
@@ -147,6 +286,73 @@ class Test(unittest.TestCase):
                       cu.Devices().dump_devices())
         logging.debug("EXIT: test_dump_devices")
 
+    def test_peer_access(self):
+        logging.debug("ENTER: test_peer_access")
+        devices = cu.Devices()
+        logging.debug("Peer-to-peer topology:\n%s", devices.dump_topology())
+        matrix = devices.peer_access_matrix
+        self.assertEqual(len(matrix), len(devices))
+        for i in range(len(devices)):
+            self.assertTrue(matrix[i][i])
+        a = numpy.random.rand(4096).astype(numpy.float32)
+        contexts = [device.create_context() for device in devices[:2]]
+        if len(contexts) > 1 and matrix[1][0]:
+            contexts[1].enable_peer_access(contexts[0])
+            contexts[1].enable_peer_access(contexts[0])  # no error
+        src = cu.MemAlloc(contexts[0], a)
+        dst = cu.MemAlloc(contexts[-1], a.nbytes * 2)
+        dst.memset32_async()
+        dst.from_peer_async(src, a.nbytes, a.nbytes)
+        dst.from_peer_async(src, 0, 16, src_offs=a.nbytes - 16)
+        contexts[-1].synchronize()
+        b = numpy.zeros(a.size * 2, dtype=a.dtype)
+        dst.to_host(b)
+        self.assertEqual(numpy.fabs(b[a.size:] - a).max(), 0)
+        self.assertEqual(numpy.fabs(b[:4] - a[-4:]).max(), 0)
+        self.assertRaises(ValueError, dst.from_peer_async, int(src))
+        dst.from_peer_async(int(src), 0, 16, src_context=contexts[0])
+        contexts[-1].synchronize()
+        dst.to_host(b)
+        self.assertEqual(numpy.fabs(b[:4] - a[:4]).max(), 0)
+        if len(contexts) > 1 and matrix[1][0]:
+            contexts[1].disable_peer_access(contexts[0])
+        logging.debug("EXIT: test_peer_access")
+
+    def test_multi_device_scheduler(self):
+        logging.debug("ENTER: test_multi_device_scheduler")
+        from cuda4py._scheduler import parse_cpulist
+        self.assertEqual(parse_cpulist("0-2,8,10-11\n"),
+                         set((0, 1, 2, 8, 10, 11)))
+        path = self.path
+
+        def initialize(worker):
+            module = cu.Module(worker.context,
+                               source_file="%s/test.cu" % path)
+            return module.get_func("test").prepare("PPf")
+
+        def process(worker, x):
+            a = cu.MemAlloc(worker.context, x)
+            b = cu.MemAlloc(worker.context, x)
+            worker.state((x.size, 1, 1), args_tuple=(a, b, 1.0))
+            y = numpy.zeros_like(x)
+            a.to_host(y)
+            return y
+
+        items = [numpy.random.rand(256).astype(numpy.float32)
+                 for _ in range(32)]
+        with cu.MultiDeviceScheduler(initializer=initialize,
+                                     numa_affinity=True) as scheduler:
+            self.assertEqual(len(scheduler.workers), len(cu.Devices()))
+            futures = scheduler.map(process, items)
+            for x, future in zip(items, futures):
+                self.assertEqual(numpy.fabs(future.result() - x * 2).max(),
+                                 0)
+            self.assertEqual(scheduler.submit(
+                lambda worker, a, b=0: a + b, 1, b=2).result(), 3)
+            logging.debug("Throughput: %s", scheduler.throughput)
+        self.assertEqual(sum(w.completed for w in scheduler.workers), 33)
+        logging.debug("EXIT: test_multi_device_scheduler")
+
     def _fill_retval(self, retval, target, args):
         retval[0], retval[1] = target(*args)
 
@@ -200,6 +406,66 @@ class Test(unittest.TestCase):
         logging.debug("set_current succeeded")
         logging.debug("EXIT: test_context")
 
+    def test_context_tracking(self):
+        logging.debug("ENTER: test_context_tracking")
+        devices = cu.Devices()
+        ctx = devices.create_some_context()
+        ctx2 = devices[0].create_context()
+        self.assertEqual(cu.Context.get_current(), ctx2.handle)
+        with ctx2:  # already current, push/pop are skipped
+            self.assertEqual(cu.Context.get_current(), ctx2.handle)
+            with ctx:
+                self.assertEqual(cu.Context.get_current(), ctx.handle)
+                with ctx:
+                    self.assertEqual(cu.Context.get_current(), ctx.handle)
+                self.assertEqual(cu.Context.get_current(), ctx.handle)
+            self.assertEqual(cu.Context.get_current(), ctx2.handle)
+        self.assertEqual(cu.Context.get_current(), ctx2.handle)
+        ctx.set_current()
+        with ctx:
+            mem = cu.MemAlloc(ctx, 4096)
+        self.assertEqual(cu.Context.get_current(), ctx.handle)
+
+        # other threads are tracked separately
+        h, h0 = self._run_on_thread(self._check_with, (ctx,))
+        self.assertEqual(h, ctx.handle)
+        self.assertEqual(h0, 0)
+
+        ctx2.set_current()
+        del mem
+        del ctx2  # destroys current context
+        gc.collect()
+        with ctx:
+            self.assertEqual(cu.Context.get_current(), ctx.handle)
+        logging.debug("EXIT: test_context_tracking")
+
+    def test_primary_context(self):
+        logging.debug("ENTER: test_primary_context")
+        device = cu.Devices()[0]
+        ctx = device.retain_primary_context()
+        self.assertTrue(ctx.primary)
+        self.assertTrue(device.primary_context_state[1])
+        ctx2 = device.retain_primary_context()
+        self.assertEqual(ctx.handle, ctx2.handle)
+        with ctx:  # retain does not make the context current
+            self.assertEqual(cu.Context.get_current(), ctx.handle)
+            mem = cu.MemAlloc(ctx, 4096)
+            a = numpy.arange(1024, dtype=numpy.int32)
+            mem.to_device(a)
+            b = numpy.zeros_like(a)
+            mem.to_host(b)
+            self.assertEqual(numpy.count_nonzero(a - b), 0)
+        del mem
+        del ctx2
+        gc.collect()
+        self.assertTrue(device.primary_context_state[1])
+        flags = device.primary_context_state[0]
+        ctx = device.retain_primary_context(flags)
+        self.assertEqual(device.primary_context_state[0], flags)
+        del ctx
+        gc.collect()
+        logging.debug("EXIT: test_primary_context")
+
     def test_module(self):
         logging.debug("ENTER: test_module")
         ctx = cu.Devices().create_some_context()
@@ -236,6 +502,115 @@ class Test(unittest.TestCase):
         logging.debug("Succeeded")
         logging.debug("EXIT: test_module")
 
+    def test_module_nvrtc(self):
+        logging.debug("ENTER: test_module_nvrtc")
+        import cuda4py.nvrtc as nvrtc
+        try:
+            nvrtc.initialize()
+        except OSError:
+            logging.debug("libnvrtc was not found, skipping the test")
+            return
+        logging.debug("NVRTC version is %d.%d", *nvrtc.version())
+        ctx = cu.Devices().create_some_context()
+        module = ctx.create_module(source_file="%s/inc.cu" % self.path,
+                                   compiler="nvrtc")
+        self.assertIsNotNone(module.get_func("test"))
+        module = ctx.create_module(source="#include \"inc.cu\"",
+                                   include_dirs=(self.path,),
+                                   compiler="nvrtc")
+        self.assertIsNotNone(module.get_func("test"))
+        ptr, size = module.get_global("g_a")
+        self.assertEqual(size, 4)
+
+        prog = nvrtc.Program("#error broken\n__global__ void f() {}")
+        self.assertFalse(prog.compile())
+        self.assertGreater(len(prog.log), 0)
+        if cu._cffi.stub_enabled():
+            logging.debug("Stub NVRTC does not check the code, "
+                          "skipping the undefined call checks")
+        else:
+            prog = nvrtc.Program(
+                "__global__ void f() { undefined_call(); }")
+            self.assertFalse(prog.compile())
+            self.assertGreater(len(prog.log), 0)
+            self.assertRaises(RuntimeError, ctx.create_module,
+                              source="__global__ void f() { bad(); }",
+                              compiler="nvrtc")
+        # compilation errors are reported by NVRTC without trying nvcc
+        with self.assertRaises(RuntimeError) as cm:
+            ctx.create_module(source="#error broken", compiler="auto")
+        self.assertIn("NVRTC", str(cm.exception))
+
+        # compiler and cache are passed through create_modules_async
+        tmpdir = tempfile.mkdtemp()
+        default_cache = cu.Module.cache
+        cu.Module.cache = cu.CompilationCache(tmpdir)
+        try:
+            future, = ctx.create_modules_async(
+                ["#include \"inc.cu\""], include_dirs=(self.path,),
+                compiler="nvrtc", cache=False)
+            self.assertIsNotNone(future.result().get_func("test"))
+            self.assertEqual(cu.Module.cache.size, 0)
+            future, = ctx.create_modules_async(
+                ["#include \"inc.cu\""], include_dirs=(self.path,),
+                compiler="nvrtc")
+            self.assertIsNotNone(future.result().get_func("test"))
+            self.assertGreater(cu.Module.cache.size, 0)
+        finally:
+            cu.Module.cache = default_cache
+            shutil.rmtree(tmpdir)
+        logging.debug("EXIT: test_module_nvrtc")
+
+    def test_module_cache(self):
+        logging.debug("ENTER: test_module_cache")
+        ctx = cu.Devices().create_some_context()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = cu.CompilationCache(tmpdir)
+            self.assertEqual(cache.size, 0)
+            module = ctx.create_module(source="#include \"inc.cu\"",
+                                       include_dirs=(self.path,),
+                                       cache=cache)
+            self.assertIsNotNone(module.stderr)
+            self.assertGreater(cache.size, 0)
+            module2 = ctx.create_module(source="#include \"inc.cu\"",
+                                        include_dirs=(self.path,),
+                                        cache=cache)
+            self.assertIsNone(module2.stderr)  # nvcc was not invoked
+            self.assertEqual(module.ptx, module2.ptx)
+            self.assertIsNotNone(module2.get_func("test"))
+            module3 = ctx.create_module(source="#include \"inc.cu\"",
+                                        include_dirs=(self.path,),
+                                        nvcc_options=("-O2",),
+                                        cache=cache)
+            self.assertIsNotNone(module3.stderr)
+            cache.clear()
+            self.assertEqual(cache.size, 0)
+        finally:
+            shutil.rmtree(tmpdir)
+        logging.debug("EXIT: test_module_cache")
+
+    def test_create_modules_async(self):
+        logging.debug("ENTER: test_create_modules_async")
+        ctx = cu.Devices().create_some_context()
+        futures = ctx.create_modules_async(
+            ["#include \"inc.cu\"",
+             {"source_file": "%s/inc.cu" % self.path},
+             "__global__ void f() { bad(); }"],
+            include_dirs=(self.path,))
+        self.assertEqual(len(futures), 3)
+        for future in futures[:2]:
+            module = future.result()
+            self.assertIsInstance(module, cu.Module)
+            self.assertIsNotNone(module.get_func("test"))
+        self.assertRaises(RuntimeError, futures[2].result)
+        # linking is not supported by NVRTC, so nvcc must not be used
+        future, = ctx.create_modules_async(
+            ["#include \"inc.cu\""], include_dirs=(self.path,),
+            nvcc_options2=cu.Module.OPTIONS_CUBLAS, compiler="nvrtc")
+        self.assertRaises(ValueError, future.result)
+        logging.debug("EXIT: test_create_modules_async")
+
     def _test_alloc(self, alloc, test=None):
         mem = alloc(4096)
         self.assertEqual(mem.handle, int(mem.handle))
@@ -262,6 +637,36 @@ class Test(unittest.TestCase):
         logging.debug("MemAlloc succeeded")
         logging.debug("EXIT: test_mem_alloc")
 
+    def test_mem_pool(self):
+        logging.debug("ENTER: test_mem_pool")
+        ctx = cu.Devices().create_some_context()
+        pool = ctx.enable_mem_pool()
+        self.assertIs(ctx.mem_pool, pool)
+        self._test_alloc(ctx.mem_alloc)
+        mem = ctx.mem_alloc(1000)
+        self.assertIsInstance(mem, cu.PooledMemAlloc)
+        ptr = mem.handle
+        del mem
+        gc.collect()
+        mem = ctx.mem_alloc(1000)
+        self.assertEqual(mem.handle, ptr)
+        stats = pool.stats
+        self.assertGreater(stats["n_hits"], 0)
+        self.assertEqual(stats["allocated_bytes"],
+                         cu.MemoryPool.round_size(1000))
+        mems = [ctx.mem_alloc(cu.MemoryPool.SMALL_SIZE * 3)
+                for _ in range(3)]
+        del mems
+        gc.collect()
+        self.assertGreater(pool.stats["cached_bytes"], 0)
+        ctx.empty_cache()
+        stats = pool.stats
+        self.assertEqual(stats["cached_bytes"],
+                         stats["reserved_bytes"] - stats["allocated_bytes"])
+        self.assertLess(stats["reserved_bytes"],
+                        cu.MemoryPool.SMALL_SIZE * 3)
+        logging.debug("EXIT: test_mem_pool")
+
     def test_mem_alloc_managed(self):
         logging.debug("ENTER: test_mem_alloc_managed")
         ctx = cu.Devices().create_some_context()
@@ -287,6 +692,72 @@ class Test(unittest.TestCase):
         logging.debug("MemHostAlloc succeeded")
         logging.debug("EXIT: test_mem_host_alloc")
 
+    def test_host_registered(self):
+        logging.debug("ENTER: test_host_registered")
+        ctx = cu.Devices().create_some_context()
+        a = numpy.random.rand(1024 * 1024).astype(numpy.float32)
+        mem = ctx.mem_host_register(a)
+        self.assertIsInstance(mem, cu.HostRegistered)
+        self.assertIs(mem.array, a)
+        self.assertEqual(mem.handle, a.__array_interface__["data"][0])
+        self.assertEqual(mem.size, a.nbytes)
+        self.assertNotEqual(mem.device_pointer, 0)
+        dev = cu.MemAlloc(ctx, a.nbytes)
+        dev.to_device_async(mem)
+        b = numpy.zeros_like(a)
+        dev.to_host(b)
+        self.assertEqual(numpy.fabs(a - b).max(), 0)
+        dev.memset32_async()
+        dev.to_host_async(mem)
+        ctx.synchronize()
+        self.assertEqual(numpy.fabs(a).max(), 0)
+        del mem
+        # failed registration should be destroyed without errors
+        n_refs = ctx._n_refs
+        errors = []
+        unraisablehook = getattr(sys, "unraisablehook", None)
+        if unraisablehook is not None:
+            sys.unraisablehook = errors.append
+        try:
+            self.assertRaises(ValueError, cu.HostRegistered, ctx, b[::2])
+            gc.collect()
+        finally:
+            if unraisablehook is not None:
+                sys.unraisablehook = unraisablehook
+        self.assertEqual(errors, [])
+        self.assertEqual(ctx._n_refs, n_refs)
+        mem = cu.HostRegistered(ctx, bytearray(65536))
+        self.assertEqual(mem.size, 65536)
+        del mem
+        logging.debug("EXIT: test_host_registered")
+
+    def test_host_mem_pool(self):
+        logging.debug("ENTER: test_host_mem_pool")
+        ctx = cu.Devices().create_some_context()
+        pool = ctx.enable_host_mem_pool()
+        self.assertIs(ctx.host_mem_pool, pool)
+        mem = ctx.mem_host_alloc(4000)
+        self.assertIsInstance(mem, cu.PooledMemHostAlloc)
+        ptr = mem.handle
+        del mem
+        gc.collect()
+        a = ctx.pinned_empty((10, 100), numpy.float32)
+        self.assertEqual(a.shape, (10, 100))
+        self.assertEqual(a.__array_interface__["data"][0], ptr)
+        a[:] = numpy.random.rand(*a.shape)
+        mem = ctx.mem_alloc(a.nbytes)
+        mem.to_device_async(a)
+        b = ctx.pinned_empty(a.shape, a.dtype)
+        mem.to_host(b)
+        self.assertEqual(float(numpy.fabs(a - b).max()), 0.0)
+        self.assertEqual(pool.stats["n_hits"], 1)
+        del a, b
+        gc.collect()
+        self.assertGreater(pool.stats["cached_bytes"], 0)
+        pool.empty_cache()
+        self.assertEqual(pool.stats["cached_bytes"], 0)
+        logging.debug("EXIT: test_host_mem_pool")
+
     def test_launch_kernel(self):
         logging.debug("ENTER: test_launch_kernel")
         ctx = cu.Devices().create_some_context()
@@ -326,6 +797,67 @@ class Test(unittest.TestCase):
         logging.debug("test_launch_kernel() succeeded")
         logging.debug("EXIT: test_launch_kernel")
 
+    def test_prepared_function(self):
+        logging.debug("ENTER: test_prepared_function")
+        ctx = cu.Devices().create_some_context()
+        N = 1024
+        C = 0.75
+        a = cu.MemAlloc(ctx, N * 4)
+        b = cu.MemAlloc(ctx, N * 4)
+        module = cu.Module(ctx, source_file="%s/test.cu" % self.path)
+        f = module.get_func("test").prepare("PPf")
+        self.assertEqual(f.signature, "PPf")
+        self.assertRaises(ValueError, module.get_func("test").prepare, "PPx")
+        a_host = numpy.random.rand(N).astype(numpy.float32)
+        b_host = numpy.random.rand(N).astype(numpy.float32)
+        gold = a_host.copy()
+        for _ in range(10):
+            gold += b_host * C
+        gold += b_host * 2
+        a.to_device(a_host)
+        b.to_device(b_host)
+        f.set_args(a, b, C)
+        for _ in range(10):
+            f((N, 1, 1))
+        f((N, 1, 1), args_tuple=(cu.skip(2), 2.0))
+        c_host = numpy.zeros(N, dtype=numpy.float32)
+        a.to_host(c_host)
+        max_diff = numpy.fabs(c_host - gold).max()
+        self.assertLess(max_diff, 0.0001)
+        logging.debug("EXIT: test_prepared_function")
+
+    def test_launch_batch(self):
+        logging.debug("ENTER: test_launch_batch")
+        ctx = cu.Devices().create_some_context()
+        N = 1024
+        a = cu.MemAlloc(ctx, N * 4)
+        b = cu.MemAlloc(ctx, N * 4)
+        module = cu.Module(ctx, source_file="%s/test.cu" % self.path)
+        f = module.get_func("test")
+        pf = module.get_func("test").prepare("PPf")
+        stream = ctx.create_stream()
+        a_host = numpy.random.rand(N).astype(numpy.float32)
+        b_host = numpy.random.rand(N).astype(numpy.float32)
+        gold = a_host.copy()
+        batch = cu.LaunchBatch()
+        for i in range(10):
+            batch.add(f, (N, 1, 1), args_tuple=(
+                a, b, numpy.array([i], dtype=numpy.float32)), stream=stream)
+            batch.add(pf, (N, 1, 1), args_tuple=(a, b, 0.5), stream=stream)
+            gold += b_host * (i + 0.5)
+        self.assertEqual(len(batch), 20)
+        a.to_device(a_host)
+        b.to_device(b_host)
+        batch.submit()
+        stream.synchronize()
+        c_host = numpy.zeros(N, dtype=numpy.float32)
+        a.to_host(c_host)
+        self.assertLess(numpy.fabs(c_host - gold).max(), 0.0001)
+        batch.clear()
+        self.assertEqual(len(batch), 0)
+        batch.submit()
+        logging.debug("EXIT: test_launch_batch")
+
     def test_memset(self):
         logging.debug("ENTER: test_memset")
         ctx = cu.Devices().create_some_context()
@@ -343,6 +875,207 @@ class Test(unittest.TestCase):
             self.assertEqual(a[i], 456)
         logging.debug("EXIT: test_memset")
 
+    def test_stream(self):
+        logging.debug("ENTER: test_stream")
+        ctx = cu.Devices().create_some_context()
+        least, greatest = ctx.stream_priority_range
+        self.assertGreaterEqual(least, greatest)
+        stream = ctx.create_stream(cu.CU_STREAM_NON_BLOCKING, greatest)
+        self.assertEqual(stream.handle, int(stream))
+        self.assertEqual(stream.flags, cu.CU_STREAM_NON_BLOCKING)
+        self.assertEqual(stream.priority, greatest)
+        low = cu.Stream(ctx, priority=least)
+        self.assertEqual(low.priority, least)
+
+        a = numpy.random.rand(4096).astype(numpy.float32)
+        b = numpy.zeros_like(a)
+        mem = cu.MemAlloc(ctx, a.nbytes)
+        mem.memset32_async(stream=stream)
+        mem.to_device_async(a, stream=stream)
+        stream.synchronize()
+        self.assertTrue(stream.query())
+        mem.to_host(b)
+        self.assertEqual(float(numpy.fabs(a - b).max()), 0.0)
+        logging.debug("EXIT: test_stream")
+
+    def test_event(self):
+        logging.debug("ENTER: test_event")
+        ctx = cu.Devices().create_some_context()
+        s1 = ctx.create_stream(cu.CU_STREAM_NON_BLOCKING)
+        s2 = ctx.create_stream(cu.CU_STREAM_NON_BLOCKING)
+        a = numpy.random.rand(1024 * 1024).astype(numpy.float32)
+        b = numpy.zeros_like(a)
+        mem = cu.MemAlloc(ctx, a.nbytes)
+        mem2 = cu.MemAlloc(ctx, a.nbytes)
+
+        with cu.Event(ctx, stream=s1) as evt:
+            mem.to_device_async(a, stream=s1)
+        self.assertIsNotNone(evt.start)
+        dt = evt.elapsed_time()
+        self.assertGreaterEqual(dt, 0.0)
+        self.assertTrue(evt.query())
+        logging.debug("Upload took %.3f ms", dt)
+
+        done = ctx.create_event(cu.CU_EVENT_DISABLE_TIMING)
+        mem.memset32_async(stream=s1)
+        done.record(s1)
+        s2.wait_event(done)
+        mem2.from_device_async(mem, stream=s2)
+        end = cu.Event(ctx)
+        end.record(s2)
+        end.synchronize()
+        mem2.to_host(b)
+        self.assertEqual(float(numpy.fabs(b).max()), 0.0)
+        logging.debug("EXIT: test_event")
+
+    def test_graph(self):
+        logging.debug("ENTER: test_graph")
+        ctx = cu.Devices().create_some_context()
+        module = cu.Module(ctx, source_file="%s/test.cu" % self.path)
+        f = module.get_func("test")
+        N = 1024
+        a = numpy.random.rand(N).astype(numpy.float32)
+        b = numpy.random.rand(N).astype(numpy.float32)
+        mem_a = cu.MemAlloc(ctx, a)
+        mem_b = cu.MemAlloc(ctx, b)
+        stream = ctx.create_stream(cu.CU_STREAM_NON_BLOCKING)
+        self.assertEqual(stream.capture_status,
+                         cu.CU_STREAM_CAPTURE_STATUS_NONE)
+        stream.begin_capture()
+        self.assertEqual(stream.capture_status,
+                         cu.CU_STREAM_CAPTURE_STATUS_ACTIVE)
+        for _ in range(3):
+            f((N, 1, 1), args_tuple=(
+                mem_a, mem_b, numpy.array([0.5], dtype=numpy.float32)),
+              stream=stream)
+        graph = stream.end_capture()
+        self.assertEqual(len(graph.nodes), 3)
+        nodes = graph.kernel_nodes
+        self.assertEqual(len(nodes), 3)
+        func, grid, block, shared = graph.get_kernel_node_params(nodes[0])
+        self.assertEqual(func, f.handle)
+        self.assertEqual(tuple(grid), (N, 1, 1))
+        self.assertEqual(tuple(block), (1, 1, 1))
+
+        graph_exec = graph.instantiate()
+        graph_exec.launch(stream)
+        stream.synchronize()
+        c = numpy.zeros_like(a)
+        mem_a.to_host(c)
+        gold = a + b * 1.5
+        self.assertLess(numpy.fabs(c - gold).max(), 0.0001)
+
+        pf = module.get_func("test").prepare("PPf")
+        for node in nodes:
+            graph_exec.set_kernel_node_params(
+                node, pf, (N, 1, 1), args_tuple=(mem_a, mem_b, 1.0))
+        graph_exec.launch(stream)
+        stream.synchronize()
+        mem_a.to_host(c)
+        gold += b * 3
+        self.assertLess(numpy.fabs(c - gold).max(), 0.0001)
+
+        empty = cu.Graph(ctx)
+        self.assertEqual(empty.nodes, [])
+        del graph_exec
+        del graph
+        logging.debug("EXIT: test_graph")
+
+    def test_device_array(self):
+        logging.debug("ENTER: test_device_array")
+        ctx = cu.Devices().create_some_context()
+        a = numpy.arange(5 * 6 * 7, dtype=numpy.float32).reshape(5, 6, 7)
+        d = cu.DeviceArray.from_host(ctx, a)
+        self.assertEqual(d.shape, a.shape)
+        self.assertEqual(d.strides, a.strides)
+        self.assertEqual(d.dtype, a.dtype)
+        self.assertEqual(d.nbytes, a.nbytes)
+        self.assertEqual(len(d), 5)
+        self.assertTrue(d.is_contiguous)
+        self.assertEqual(numpy.fabs(d.get() - a).max(), 0)
+        for index in ((1,), (slice(1, 4), 2), (Ellipsis, slice(None, None, 2)),
+                      (slice(None), slice(1, 5, 2), slice(2, 6)),
+                      (slice(None, None, 2), slice(None, None, 3), 1),
+                      (2, 3, 4), (Ellipsis, 3)):
+            v = d[index]
+            self.assertEqual(v.shape, a[index].shape)
+            self.assertEqual(numpy.fabs(v.get() - a[index]).max(), 0)
+            v.set(-a[index])
+            b = a.copy()
+            b[index] *= -1
+            self.assertEqual(numpy.fabs(d.get() - b).max(), 0)
+            v.set(a[index])
+        self.assertRaises(ValueError, d.set, a.astype(numpy.float64))
+        self.assertRaises(ValueError, d.set, a[1:])
+        self.assertEqual(int(d[1]), int(d) + a.strides[0])
+        self.assertRaises(IndexError, d.__getitem__, (1, 2, 3, 4))
+        self.assertRaises(IndexError, d.__getitem__, slice(None, None, -1))
+
+        # pass to the kernel directly
+        module = cu.Module(ctx, source_file="%s/test.cu" % self.path)
+        f = module.get_func("test")
+        x = cu.DeviceArray.from_host(ctx, a[0])
+        y = cu.DeviceArray.from_host(ctx, a[1])
+        f((x.size, 1, 1), args_tuple=(
+            x, y, numpy.array([2], dtype=numpy.float32)))
+        self.assertEqual(numpy.fabs(x.get() - (a[0] + a[1] * 2)).max(), 0)
+        stream = ctx.create_stream()
+        out = ctx.pinned_empty(a[2].shape)
+        d[2].get(out, stream)
+        stream.synchronize()
+        self.assertEqual(numpy.fabs(out - a[2]).max(), 0)
+        logging.debug("EXIT: test_device_array")
+
+    def test_array_interop(self):
+        logging.debug("ENTER: test_array_interop")
+        ctx = cu.Devices().create_some_context()
+        a = numpy.arange(6 * 8, dtype=numpy.int32).reshape(6, 8)
+        d = cu.DeviceArray.from_host(ctx, a)
+        mem = cu.MemAlloc(ctx, 256)
+        interface = mem.__cuda_array_interface__
+        self.assertEqual(interface["shape"], (256,))
+        self.assertEqual(interface["data"][0], mem.handle)
+
+        v = d[1:5, ::2]
+        interface = v.__cuda_array_interface__
+        self.assertEqual(interface["shape"], (4, 4))
+        self.assertEqual(interface["strides"], (32, 8))
+        w = cu.DeviceArray.from_cuda_array_interface(ctx, v)
+        self.assertIs(w.mem.owner, v)
+        self.assertEqual(int(w), int(v))
+        self.assertEqual(numpy.fabs(w.get() - a[1:5, ::2]).max(), 0)
+        w = cu.DeviceArray.from_cuda_array_interface(ctx, mem)
+        self.assertEqual(w.shape, (256,))
+
+        self.assertEqual(d.__dlpack_device__(), (2, int(ctx.device)))
+        if platform.python_implementation() != "CPython":
+            self.assertRaises(NotImplementedError,
+                              cu.DeviceArray.from_dlpack, ctx, v)
+            logging.debug("EXIT: test_array_interop")
+            return
+        w = cu.DeviceArray.from_dlpack(ctx, v)
+        self.assertEqual(int(w), int(v))
+        self.assertEqual(w.strides, v.strides)
+        self.assertEqual(numpy.fabs(w.get() - a[1:5, ::2]).max(), 0)
+        capsule = d.__dlpack__()
+        w = cu.DeviceArray.from_dlpack(ctx, capsule)
+        self.assertRaises(ValueError, cu.DeviceArray.from_dlpack,
+                          ctx, capsule)
+        capsule = cu._dlpack.to_dlpack(
+            int(d), d.shape, d.strides, d.dtype, cu._dlpack.kDLCUDA,
+            int(ctx.device) + 1, d)
+        self.assertRaises(ValueError, cu.DeviceArray.from_dlpack,
+                          ctx, capsule)
+        del capsule
+        del d
+        del v
+        # w holds the reference through the DLPack deleter
+        self.assertEqual(numpy.fabs(w.get() - a).max(), 0)
+        if hasattr(a, "__dlpack__"):  # host tensors are not accepted
+            self.assertRaises(ValueError, cu.DeviceArray.from_dlpack,
+                              ctx, a.__dlpack__())
+        logging.debug("EXIT: test_array_interop")
+
     def test_memcpy(self):
         logging.debug("ENTER: test_memcpy")
         ctx = cu.Devices().create_some_context()
@@ -486,8 +1219,82 @@ class Test(unittest.TestCase):
         diff = numpy.fabs(c[8:28, 7:17, 6:11] - a[5:25, 4:14, 3:8]).max()
         self.assertEqual(diff, 0)
 
+        # Copy 3D rect from device buffer to page-locked host buffer
+        logging.debug("Testing device -> pinned host memcpy_3d_async")
+        pinned = cu.MemHostAlloc(ctx, c.nbytes)
+        pinned.memset32_async()
+        stream = ctx.create_stream()
+        event = a_.memcpy_3d_async(
+            (3 * sz, 4, 5), (6 * sz, 7, 8), (5 * sz, 10, 20),
+            a.shape[2] * sz, a.shape[1], b.shape[2] * sz, b.shape[1],
+            dst=pinned, stream=stream, event=ctx.create_event())
+        event.synchronize()
+        c = pinned.as_ndarray(b.shape, numpy.float32)
+        diff = numpy.fabs(c[8:28, 7:17, 6:11] - a[5:25, 4:14, 3:8]).max()
+        self.assertEqual(diff, 0)
+
         logging.debug("EXIT: test_memcpy_3d_async")
 
+    def test_to_host_async(self):
+        logging.debug("ENTER: test_to_host_async")
+        ctx = cu.Devices().create_some_context()
+        a = numpy.random.rand(4096).astype(numpy.float32)
+        mem = cu.MemAlloc(ctx, a)
+        host = ctx.pinned_empty(a.shape, a.dtype)
+        stream = ctx.create_stream()
+        event = ctx.create_event(cu.CU_EVENT_DISABLE_TIMING)
+        self.assertIs(mem.to_host_async(host, stream=stream, event=event),
+                      event)
+        event.synchronize()
+        self.assertEqual(numpy.fabs(host - a).max(), 0)
+        host[:] = 0
+        mem.to_host_async(host, offs=1024 * 4, size=1024 * 4)
+        ctx.synchronize()
+        self.assertEqual(numpy.fabs(host[:1024] - a[1024:2048]).max(), 0)
+        logging.debug("EXIT: test_to_host_async")
+
+    def test_transfer_engine(self):
+        logging.debug("ENTER: test_transfer_engine")
+        ctx = cu.Devices().create_some_context()
+        module = cu.Module(ctx, source_file="%s/test.cu" % self.path)
+        f = module.get_func("test").prepare("PPf")
+        N = 1024 * 1024 + 17
+        a = numpy.random.rand(N).astype(numpy.float32)
+        b = numpy.random.rand(N).astype(numpy.float32)
+        mem_a = cu.MemAlloc(ctx, a.nbytes)
+        mem_b = cu.MemAlloc(ctx, b)
+        engine = cu.TransferEngine(ctx, chunk_size=65536)
+        self.assertEqual(engine.num_buffers, 2)
+
+        def add_b(mem, offs, size, stream):
+            f((size // 4, 1, 1), args_tuple=(
+                int(mem) + offs, int(mem_b) + offs, 1.0), stream=stream)
+
+        engine.to_device(mem_a, a, callback=add_b)
+        engine.synchronize()
+        c = numpy.zeros_like(a)
+        mem_a.to_host(c)
+        self.assertLess(numpy.fabs(c - (a + b)).max(), 0.0001)
+        c[:] = 0
+        engine.to_host(mem_a, c)
+        self.assertLess(numpy.fabs(c - (a + b)).max(), 0.0001)
+        c[:] = 0
+        engine.to_host(mem_a, c, callback=add_b)
+        self.assertLess(numpy.fabs(c - (a + b * 2)).max(), 0.0001)
+        engine.chunk_size = None
+        self.assertGreaterEqual(engine.tune_chunk_size(a.nbytes),
+                                cu.TransferEngine.MIN_CHUNK_SIZE)
+        self.assertRaises(ValueError, setattr, engine, "chunk_size", 0)
+        self.assertRaises(ValueError, cu.TransferEngine, ctx, chunk_size=0)
+        engine.to_device(mem_a, a)
+        engine.to_host(mem_a, c)
+        self.assertEqual(numpy.fabs(c - a).max(), 0)
+        # transfers are ordered after the default stream
+        f((N, 1, 1), args_tuple=(mem_a, mem_b, 1.0))
+        engine.to_host(mem_a, c)
+        self.assertLess(numpy.fabs(c - (a + b)).max(), 0.0001)
+        logging.debug("EXIT: test_transfer_engine")
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
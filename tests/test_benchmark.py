@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2014, Samsung Electronics Co.,Ltd.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+(INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The views and conclusions contained in the software and documentation are those
+of the authors and should not be interpreted as representing official policies,
+either expressed or implied, of Samsung Electronics Co.,Ltd..
+"""
+
+"""
+cuda4py - CUDA cffi bindings and helper classes.
+URL: https://github.com/ajkxyz/cuda4py
+Original author: Alexey Kazantsev <a.kazantsev@samsung.com>
+"""
+
+
+"""
+Tests the wrapper overhead benchmark (benchmark.py).
+"""
+import benchmark
+import cuda4py as cu
+import gc
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.old_env = os.environ.get("CUDA_DEVICE")
+        if self.old_env is None:
+            os.environ["CUDA_DEVICE"] = "0"
+
+    def tearDown(self):
+        if self.old_env is None:
+            del os.environ["CUDA_DEVICE"]
+        else:
+            os.environ["CUDA_DEVICE"] = self.old_env
+        del self.old_env
+        gc.collect()
+
+    def test_run(self):
+        logging.debug("ENTER: test_run")
+        ctx = cu.Devices().create_some_context()
+        names = ("function_set_args", "function_call", "prepared_call",
+                 "launch_batch", "memory_to_device", "memcpy_3d_async",
+                 "mem_alloc")
+        results = benchmark.Benchmark(ctx).run(names, number=10, repeat=2)
+        self.assertEqual(sorted(results), sorted(names))
+        for ns in results.values():
+            self.assertGreater(ns, 0)
+        self.assertEqual(
+            [(name, ref) for name, ref, _ratio in
+             benchmark.speedups(results)],
+            [("launch_batch", "function_call")])
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "baseline.json")
+            benchmark.save(path, results, "cuda")
+            with open(path) as fin:
+                baseline = json.load(fin)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(baseline["results"], results)
+        self.assertEqual(
+            benchmark.compare(results, baseline["results"], 1.25), [])
+        slower = dict(results, mem_alloc=results["mem_alloc"] * 2)
+        self.assertEqual(
+            [name for name, _ns, _base_ns in
+             benchmark.compare(slower, baseline["results"], 1.25)],
+            ["mem_alloc"])
+        logging.debug("EXIT: test_run")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    unittest.main()
@@ -156,6 +156,26 @@ class Test(unittest.TestCase):
             self._test_gemm(self.blas.sgemm, numpy.float32)
         logging.debug("EXIT: test_sgemm")
 
+    def test_sgemm_device_array(self):
+        logging.debug("ENTER: test_sgemm_device_array")
+        a = numpy.random.rand(17, 33).astype(numpy.float32) - 0.5
+        b = numpy.random.rand(19, 33).astype(numpy.float32) - 0.5
+        gold_c = numpy.dot(a.astype(numpy.float64),
+                           b.transpose().astype(numpy.float64))
+        a_arr = cu.DeviceArray.from_host(self.ctx, a)
+        b_arr = cu.DeviceArray.from_host(self.ctx, b)
+        c_arr = cu.DeviceArray(self.ctx, gold_c.shape, numpy.float32)
+        alpha = numpy.ones(1, dtype=numpy.float32)
+        beta = numpy.zeros(1, dtype=numpy.float32)
+        with self.ctx:
+            self.blas.sgemm(blas.CUBLAS_OP_T, blas.CUBLAS_OP_N,
+                            b.shape[0], a.shape[0], a.shape[1],
+                            alpha, b_arr, a_arr, beta, c_arr)
+        max_diff = numpy.fabs(gold_c - c_arr.get()).max()
+        logging.debug("Maximum difference is %.6f", max_diff)
+        self.assertLess(max_diff, 1.0e-5)
+        logging.debug("EXIT: test_sgemm_device_array")
+
     def test_dgemm(self):
         logging.debug("ENTER: test_dgemm")
         with self.ctx:
@@ -168,6 +188,38 @@ class Test(unittest.TestCase):
             self._test_gemm(self.blas.sgemm_ex, numpy.float16)
         logging.debug("EXIT: test_sgemm_ex")
 
+    def test_graph_capture(self):
+        logging.debug("ENTER: test_graph_capture")
+        a = numpy.random.rand(64, 64).astype(numpy.float32)
+        b = numpy.random.rand(64, 64).astype(numpy.float32)
+        c = numpy.zeros_like(a)
+        gold_c = numpy.dot(a.astype(numpy.float64),
+                           b.transpose().astype(numpy.float64))
+        a_buf = cu.MemAlloc(self.ctx, a)
+        b_buf = cu.MemAlloc(self.ctx, b)
+        c_buf = cu.MemAlloc(self.ctx, c)
+        alpha = cu.MemAlloc(self.ctx, numpy.ones(1, dtype=numpy.float32))
+        beta = cu.MemAlloc(self.ctx, numpy.zeros(1, dtype=numpy.float32))
+        stream = self.ctx.create_stream(cu.CU_STREAM_NON_BLOCKING)
+        with self.ctx:
+            self.blas.set_pointer_mode(blas.CUBLAS_POINTER_MODE_DEVICE)
+            self.blas.set_stream(stream)
+            stream.begin_capture()
+            self.blas.sgemm(blas.CUBLAS_OP_T, blas.CUBLAS_OP_N,
+                            b.shape[0], a.shape[0], a.shape[1],
+                            alpha, b_buf, a_buf, beta, c_buf)
+            graph = stream.end_capture()
+            self.blas.set_stream(None)
+            graph_exec = graph.instantiate()
+            graph_exec.launch(stream)
+            stream.synchronize()
+        c_buf.to_host(c)
+        max_diff = numpy.fabs(gold_c - c.astype(numpy.float64)).max()
+        self.assertLess(max_diff, 1.0e-5)
+        del graph_exec
+        del graph
+        logging.debug("EXIT: test_graph_capture")
+
     def test_kernel(self):
         logging.debug("ENTER: test_kernel")
         if self.ctx.device.compute_capability < (3, 5):
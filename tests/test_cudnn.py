@@ -38,6 +38,7 @@ Tests some of the api in cuda4py.cudnn package.
 """
 import cuda4py as cu
 import cuda4py.cudnn as cudnn
+import cuda4py._impl.cudnn._cffi as cudnnffi
 import gc
 import logging
 import numpy
@@ -68,6 +69,16 @@ class Test(unittest.TestCase):
         del self.ctx
         gc.collect()
 
+    def _computed(self):
+        """Returns False for the stub backend, where cuDNN computations
+        are no-ops, so their results should not be checked.
+        """
+        if cu._cffi.stub_enabled():
+            logging.debug("Stub backend does not compute, "
+                          "skipping the check of the results")
+            return False
+        return True
+
     def test_constants(self):
         self.assertEqual(cudnn.CUDNN_STATUS_SUCCESS, 0)
         self.assertEqual(cudnn.CUDNN_STATUS_NOT_INITIALIZED, 1)
@@ -157,6 +168,29 @@ class Test(unittest.TestCase):
         logging.debug("CUDNN version is %d", self.cudnn.version)
         self.assertEqual(self.cudnn.version, int(self.cudnn.version))
 
+    def test_lazy_lib(self):
+        logging.debug("ENTER: test_lazy_lib")
+        prebuilt = cu._cffi.use_prebuilt
+        instrument = cu._cffi.instrument
+        ffi, lib = cudnnffi.ffi, cudnnffi.lib
+        try:
+            cu._cffi.use_prebuilt = False
+            cu._cffi.instrument = False
+            cudnnffi.lib = None
+            cudnnffi.initialize()
+            self.assertIsInstance(cudnnffi.lib, cu._cffi.LazyLib)
+            self.assertIn("cudnnPoolingForward", cudnnffi.lib._pending)
+            d = cudnn.PoolingDescriptor()
+            self.assertIsNotNone(d.handle)
+            self.assertNotIn("cudnnPoolingForward", cudnnffi.lib._pending)
+            self.assertIn("cudnnConvolutionForward", cudnnffi.lib._pending)
+            del d
+        finally:
+            cu._cffi.use_prebuilt = prebuilt
+            cu._cffi.instrument = instrument
+            cudnnffi.ffi, cudnnffi.lib = ffi, lib
+        logging.debug("EXIT: test_lazy_lib")
+
     def test_tensor_descriptor(self):
         logging.debug("ENTER: test_tensor_descriptor")
         d = cudnn.TensorDescriptor()
@@ -377,7 +411,8 @@ class Test(unittest.TestCase):
             algo, workspace, workspace.size, beta, out_desc, out_buf)
 
         out_buf.to_host(out_data)
-        self.assertEqual(numpy.count_nonzero(out_data), out_data.size)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(out_data), out_data.size)
 
         logging.debug("EXIT: test_convolution_forward")
 
@@ -403,7 +438,8 @@ class Test(unittest.TestCase):
                                              beta, gd_desc, gd_buf)
 
         gd_buf.to_host(gd_data)
-        self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
 
         logging.debug("EXIT: test_convolution_backward_bias")
 
@@ -445,7 +481,8 @@ class Test(unittest.TestCase):
             beta, gd_desc, gd_buf)
 
         gd_buf.to_host(gd_data)
-        self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
 
         if self.cudnn.version >= 4000:
             algo = self.cudnn.get_convolution_backward_filter_algorithm(
@@ -465,7 +502,8 @@ class Test(unittest.TestCase):
                 alpha, inp_desc, inp_buf, bperr_desc, bperr_buf, conv_desc,
                 beta, gd_desc, gd_buf, algo, workspace, workspace.size)
             gd_buf.to_host(gd_data)
-            self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
+            if self._computed():
+                self.assertEqual(numpy.count_nonzero(gd_data), gd_data.size)
 
         logging.debug("EXIT: test_convolution_backward_filter")
 
@@ -501,7 +539,8 @@ class Test(unittest.TestCase):
             beta, inp_desc, inp_buf)
 
         inp_buf.to_host(inp_data)
-        self.assertEqual(numpy.count_nonzero(inp_data), inp_data.size)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(inp_data), inp_data.size)
 
         if self.cudnn.version >= 4000:
             algo = self.cudnn.get_convolution_backward_data_algorithm(
@@ -522,7 +561,8 @@ class Test(unittest.TestCase):
                 conv_desc, beta, inp_desc, inp_buf,
                 algo, workspace, workspace.size)
             inp_buf.to_host(inp_data)
-            self.assertEqual(numpy.count_nonzero(inp_data), inp_data.size)
+            if self._computed():
+                self.assertEqual(numpy.count_nonzero(inp_data), inp_data.size)
 
         logging.debug("EXIT: test_convolution_backward_data")
 
@@ -552,7 +592,8 @@ class Test(unittest.TestCase):
         out_buf.to_host(out_data)
 
         max_diff = numpy.fabs(out_data - inp_data.transpose(0, 3, 1, 2)).max()
-        self.assertEqual(max_diff, 0.0)
+        if self._computed():
+            self.assertEqual(max_diff, 0.0)
 
         logging.debug("EXIT: test_transform_tensor")
 
@@ -591,7 +632,8 @@ class Test(unittest.TestCase):
             pooling_desc, np_one, input_desc, input_buf,
             np_zero, output_desc, output_buf)
         output_buf.to_host(output_data)
-        self.assertEqual(numpy.count_nonzero(numpy.isnan(output_data)), 0)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(numpy.isnan(output_data)), 0)
 
         diff_desc = output_desc
         diff_buf = cu.MemAlloc(self.ctx, output_data)
@@ -605,7 +647,8 @@ class Test(unittest.TestCase):
             diff_desc, diff_buf, input_desc, input_buf, np_zero,
             grad_desc, grad_buf)
         grad_buf.to_host(grad_data)
-        self.assertEqual(numpy.count_nonzero(numpy.isnan(grad_data)), 0)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(numpy.isnan(grad_data)), 0)
 
         logging.debug("EXIT: test_pooling")
 
@@ -650,15 +693,17 @@ class Test(unittest.TestCase):
                                    output_buf, reserve, reserve.size)
         output_data = numpy.ones_like(input_data)
         output_buf.to_host(output_data)
-        n_z = 0
-        for i, y in numpy.ndenumerate(output_data):
-            if not y:
-                n_z += 1
-                continue
-            x = input_data[i]
-            self.assertEqual(y, x * 2)
-        self.assertGreater(n_z, (input_data.size >> 1) -
-                           (input_data.size >> 5))
+        computed = self._computed()
+        if computed:
+            n_z = 0
+            for i, y in numpy.ndenumerate(output_data):
+                if not y:
+                    n_z += 1
+                    continue
+                x = input_data[i]
+                self.assertEqual(y, x * 2)
+            self.assertGreater(n_z, (input_data.size >> 1) -
+                               (input_data.size >> 5))
 
         err_data = numpy.ones_like(input_data)
         err_data[:] = numpy.random.rand(output_data.size).reshape(
@@ -667,19 +712,21 @@ class Test(unittest.TestCase):
         self.cudnn.dropout_backward(drop, input_desc, err_buf, input_desc,
                                     input_buf, reserve, reserve.size)
         input_buf.to_host(input_data)
-        n_z = 0
-        for i, x in numpy.ndenumerate(input_data):
-            if not output_data[i]:
-                self.assertEqual(x, 0.0)
-                n_z += 1
-                continue
-            y = err_data[i]
-            if self.cudnn.version == 5004:
-                self.assertEqual(x, y)  # strangely, it doesn't scale gradient
-            else:
-                self.assertEqual(x, y * 2)
-        self.assertGreater(n_z, (input_data.size >> 1) -
-                           (input_data.size >> 5))
+        if computed:
+            n_z = 0
+            for i, x in numpy.ndenumerate(input_data):
+                if not output_data[i]:
+                    self.assertEqual(x, 0.0)
+                    n_z += 1
+                    continue
+                y = err_data[i]
+                if self.cudnn.version == 5004:
+                    # strangely, it doesn't scale gradient
+                    self.assertEqual(x, y)
+                else:
+                    self.assertEqual(x, y * 2)
+            self.assertGreater(n_z, (input_data.size >> 1) -
+                               (input_data.size >> 5))
 
         logging.debug("EXIT: test_dropout")
 
@@ -901,7 +948,8 @@ class Test(unittest.TestCase):
         y.to_host(y_arr)
 
         max_diff = numpy.fabs(y_arr.ravel() - y_gold.ravel()).max()
-        self.assertLess(max_diff, 1.0e-5)
+        if self._computed():
+            self.assertLess(max_diff, 1.0e-5)
 
         # Backpropagtion test
         dy_arr = numpy.zeros_like(y_gold)
@@ -914,7 +962,8 @@ class Test(unittest.TestCase):
         self.cudnn.softmax_backward(np_one, x_desc, y, x_desc, dy,
                                     np_zero, x_desc, dx)
         dx.to_host(dx_arr)
-        self.assertEqual(numpy.count_nonzero(dx_arr), dx_arr.size)
+        if self._computed():
+            self.assertEqual(numpy.count_nonzero(dx_arr), dx_arr.size)
 
         # TODO(a.kazantsev): add test for gradient correctness.
 
@@ -65,6 +65,16 @@ class Test(unittest.TestCase):
         del self.ctx
         gc.collect()
 
+    def _computed(self):
+        """Returns False for the stub backend, where FFTs are no-ops,
+        so their results should not be checked.
+        """
+        if cu._cffi.stub_enabled():
+            logging.debug("Stub backend does not compute, "
+                          "skipping the check of the results")
+            return False
+        return True
+
     def test_constants(self):
         self.assertEqual(cufft.CUFFT_SUCCESS, 0)
         self.assertEqual(cufft.CUFFT_INVALID_PLAN, 1)
@@ -157,7 +167,8 @@ class Test(unittest.TestCase):
         fft.execute(xbuf, ybuf)
         ybuf.to_host(y)
 
-        if y_gold is not None:
+        computed = self._computed()
+        if y_gold is not None and computed:
             delta = y - y_gold
             max_diff = numpy.fabs(numpy.sqrt(delta.real * delta.real +
                                              delta.imag * delta.imag)).max()
@@ -184,8 +195,9 @@ class Test(unittest.TestCase):
 
         max_diff = numpy.fabs(x - x_gold).max()
         logging.debug("Inverse max_diff is %.6e", max_diff)
-        self.assertLess(max_diff, {numpy.float32: 1.0e-3,
-                                   numpy.float64: 1.0e-6}[dtype])
+        if computed:
+            self.assertLess(max_diff, {numpy.float32: 1.0e-3,
+                                       numpy.float64: 1.0e-6}[dtype])
 
     def test_exec_float(self):
         logging.debug("ENTER: test_exec_float")
@@ -225,7 +237,8 @@ class Test(unittest.TestCase):
         fft.execute(xbuf, ybuf, cufft.CUFFT_FORWARD)
         ybuf.to_host(y)
 
-        if y_gold is not None:
+        computed = self._computed()
+        if y_gold is not None and computed:
             delta = y - y_gold
             max_diff = numpy.fabs(numpy.sqrt(delta.real * delta.real +
                                              delta.imag * delta.imag)).max()
@@ -244,8 +257,9 @@ class Test(unittest.TestCase):
         max_diff = numpy.fabs(numpy.sqrt(delta.real * delta.real +
                                          delta.imag * delta.imag)).max()
         logging.debug("Inverse max_diff is %.6e", max_diff)
-        self.assertLess(max_diff, {numpy.complex64: 1.0e-3,
-                                   numpy.complex128: 1.0e-6}[dtype])
+        if computed:
+            self.assertLess(max_diff, {numpy.complex64: 1.0e-3,
+                                       numpy.complex128: 1.0e-6}[dtype])
 
     def test_exec_complex_float(self):
         logging.debug("ENTER: test_exec_complex_float")